@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Batch-vs-sequential benchmark for a running RAG agent.
+
+Sends the questions from test_queries.sh (or --queries-file, one per line) to the agent twice,
+clearing the response cache before each pass:
+  - sequential: one POST /query per question, like test_queries.sh does
+  - batch: a single POST /query/batch with all questions
+and prints a JSON report of wall time, HTTP round-trips and per-item success for both.
+
+Start the agent first, e.g. `python3 rag_agent.py`.
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import urllib.error
+import urllib.request
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_QUERIES = os.path.join(REPO_DIR, "test_queries.sh")
+
+
+def load_queries(path: str) -> list:
+    """Questions from the queries array of test_queries.sh, or one per line from any other file"""
+    with open(path, "r", encoding='utf-8') as f:
+        text = f.read()
+    if path.endswith(".sh"):
+        block = re.search(r"queries=\((.*?)\n\)", text, re.DOTALL).group(1)
+        return re.findall(r'^\s*"(.*)"\s*$', block, re.MULTILINE)
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def post(url: str, payload: dict, timeout: float) -> tuple:
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def run_sequential(base_url: str, queries: list, timeout: float) -> dict:
+    started = time.perf_counter()
+    statuses = [post(f"{base_url}/query", {"query": query}, timeout)[0] for query in queries]
+    return {
+        "seconds": time.perf_counter() - started,
+        "http_requests": len(queries),
+        "succeeded": sum(status == 200 for status in statuses),
+    }
+
+
+def run_batch(base_url: str, queries: list, timeout: float) -> dict:
+    started = time.perf_counter()
+    status, body = post(f"{base_url}/query/batch", {"queries": queries}, timeout)
+    results = body["results"] if body else []
+    return {
+        "seconds": time.perf_counter() - started,
+        "http_requests": 1,
+        "status": status,
+        "succeeded": sum(result["status_code"] == 200 for result in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare N sequential /query calls with one /query/batch call")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the Python RAG agent")
+    parser.add_argument("--queries-file", default=DEFAULT_QUERIES)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries_file)
+    post(f"{args.url}/cache/clear", {}, args.timeout)
+    sequential = run_sequential(args.url, queries, args.timeout)
+    post(f"{args.url}/cache/clear", {}, args.timeout)
+    batch = run_batch(args.url, queries, args.timeout)
+
+    report = {
+        "benchmark": "batch",
+        "queries": len(queries),
+        "sequential": sequential,
+        "batch": batch,
+        "speedup": sequential["seconds"] / batch["seconds"] if batch["seconds"] else None,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
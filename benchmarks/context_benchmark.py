@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Prompt-size regression benchmark for context assembly.
+
+Indexes the corpus into a temporary Chroma store (offline HashingEmbeddings by default) and, for the
+labelled queries in benchmarks/relevance_queries.json plus the questions in test_queries.sh, builds the
+GPT-4 prompt three ways:
+  - stuffed:       dense k=8, chunks pasted verbatim (the old RetrievalQA "stuff" behaviour)
+  - dense_packed:  dense k=8, merged per post, boilerplate stripped, packed to the token budget
+  - hybrid_packed: hybrid retrieval (k=5) + packing, as the agent now runs
+and reports prompt tokens per query, context assembly time and, for labelled queries, how many relevant
+posts reach the prompt. With --openai the prompts are also sent to GPT-4 to measure end-to-end latency.
+
+Each run appends one JSON record to benchmarks/results/context_history.jsonl.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from compensation_extractor import DATA_FILE  # noqa: E402
+from context_packing import TokenCounter, pack_context  # noqa: E402
+from hybrid_retrieval import HybridRetriever, KeywordIndex  # noqa: E402
+from ingest import ingest  # noqa: E402
+from rag_agent import prompt  # noqa: E402
+from batch_benchmark import load_queries  # noqa: E402
+from fakes import HashingEmbeddings  # noqa: E402
+from relevance_benchmark import QUERIES_FILE  # noqa: E402
+from startup_benchmark import git_commit  # noqa: E402
+
+HISTORY_FILE = os.path.join(REPO_DIR, "benchmarks", "results", "context_history.jsonl")
+
+
+def build_prompts(mode: str, queries: list, vectorstore, hybrid, embedding, counter: TokenCounter, budget: int) -> list:
+    """(query, prompt messages, topic ids in context, assembly seconds) for every query"""
+    prompts = []
+    for query in queries:
+        query_embedding = embedding.embed_query(query)
+        if mode == "hybrid_packed":
+            docs = hybrid.fuse_many([query], [query_embedding])[0]
+        else:
+            docs = vectorstore.similarity_search_by_vector(query_embedding, k=8)
+        started = time.perf_counter()
+        if mode == "stuffed":
+            context = "\n\n".join(doc.page_content for doc in docs)
+            topic_ids = {doc.metadata.get("topic_id") for doc in docs}
+        else:
+            packed = pack_context(docs, counter, budget)
+            context, topic_ids = packed["context"], set(packed["topic_ids"])
+        elapsed = time.perf_counter() - started
+        prompts.append((query, prompt.format_messages(context=context, question=query), topic_ids, elapsed))
+    return prompts
+
+
+async def measure_latency(prompts: list) -> list:
+    from langchain_openai import ChatOpenAI
+    llm = ChatOpenAI(model_name="gpt-4", temperature=0)
+    latencies = []
+    for _, messages, _, _ in prompts:
+        started = time.perf_counter()
+        await llm.ainvoke(messages)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prompt tokens before and after context packing")
+    parser.add_argument("--data", default=os.path.join(REPO_DIR, DATA_FILE))
+    parser.add_argument("--budget", type=int, default=int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1500")))
+    parser.add_argument("--openai", action="store_true", help="Use OpenAI embeddings and measure GPT-4 latency")
+    parser.add_argument("--no-history", action="store_true", help="Print the result without appending it to the history file")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)  # rag_agent configures INFO logging on import
+    with open(args.data, "r", encoding='utf-8') as f:
+        data = json.load(f)
+    with open(QUERIES_FILE, "r", encoding='utf-8') as f:
+        labelled = json.load(f)
+    relevant = {item["query"]: set(item["relevant_topic_ids"]) for item in labelled}
+    queries = [item["query"] for item in labelled] + load_queries(os.path.join(REPO_DIR, "test_queries.sh"))
+
+    if args.openai:
+        from langchain_openai import OpenAIEmbeddings
+        embedding = OpenAIEmbeddings()
+    else:
+        embedding = HashingEmbeddings()
+    counter = TokenCounter("gpt-4")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir, contextlib.chdir(workdir):
+        vectorstore = ingest(data, embedding, os.path.join(workdir, "chroma_db"))
+        hybrid = HybridRetriever(vectorstore=vectorstore, keyword_index=KeywordIndex.from_vectorstore(vectorstore), k=5)
+        for mode in ("stuffed", "dense_packed", "hybrid_packed"):
+            prompts = build_prompts(mode, queries, vectorstore, hybrid, embedding, counter, args.budget)
+            tokens = [sum(counter.count(message.content) for message in messages) for _, messages, _, _ in prompts]
+            kept = [len(topic_ids & relevant[query]) for query, _, topic_ids, _ in prompts if query in relevant]
+            results[mode] = {
+                "prompt_tokens_mean": statistics.mean(tokens),
+                "prompt_tokens_p95": percentile(tokens, 95),
+                "assembly_ms_mean": statistics.mean(elapsed for _, _, _, elapsed in prompts) * 1000,
+                "relevant_posts_in_context_mean": statistics.mean(kept),
+            }
+            if args.openai:
+                latencies = asyncio.run(measure_latency(prompts))
+                results[mode]["llm_seconds_mean"] = statistics.mean(latencies)
+                results[mode]["llm_seconds_p95"] = percentile(latencies, 95)
+
+    report = {
+        "benchmark": "context",
+        "timestamp": time.time(),
+        "commit": git_commit(),
+        "embedding": getattr(embedding, "model", type(embedding).__name__),
+        "exact_tokenizer": counter.encoding is not None,
+        "budget": args.budget,
+        "queries": len(queries),
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+
+    if not args.no_history:
+        os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+        with open(HISTORY_FILE, "a", encoding='utf-8') as f:
+            f.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate dedup benchmark: the same corpus indexed with and without the MinHash/LSH dedup stage.
+
+Indexes the corpus twice into temporary Chroma stores (offline HashingEmbeddings by default, OpenAI with
+--openai) and reports:
+  - the duplicate ratio, cluster count and dedup time
+  - index size: posts, chunks and bytes on disk, before and after
+  - hybrid retrieval latency per query (mean/p50/p95 over --rounds passes of the labelled queries)
+  - wasted retrieval slots: retrieved chunks whose post is a near-duplicate of a post already retrieved, over
+    the labelled queries plus the titles of the duplicated posts (questions that hit duplicated content)
+  - precision, recall and MRR on benchmarks/relevance_queries.json (a collapsed duplicate of a relevant
+    post counts as relevant)
+
+The JSON report is printed and appended to benchmarks/results/dedup_history.jsonl.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from compensation_extractor import DATA_FILE  # noqa: E402
+from dedup import DEDUP_THRESHOLD, canonical_index, deduplicate_posts, find_duplicate_clusters  # noqa: E402
+from hybrid_retrieval import HybridRetriever, KeywordIndex  # noqa: E402
+from ingest import ingest  # noqa: E402
+from fakes import HashingEmbeddings  # noqa: E402
+from load_benchmark import latency_summary  # noqa: E402
+from relevance_benchmark import QUERIES_FILE, score  # noqa: E402
+from startup_benchmark import git_commit  # noqa: E402
+
+HISTORY_FILE = os.path.join(REPO_DIR, "benchmarks", "results", "dedup_history.jsonl")
+
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def canonical_topics(data: list, threshold: float) -> dict:
+    """topic_id -> topic_id of the canonical post of its near-duplicate cluster (itself if it has none)"""
+    canonical = {str(post["topic_id"]): str(post["topic_id"]) for post in data}
+    for members in find_duplicate_clusters([post.get("content") or "" for post in data], threshold):
+        keep = str(data[canonical_index(data, members)]["topic_id"])
+        for i in members:
+            canonical[str(data[i]["topic_id"])] = keep
+    return canonical
+
+
+def measure(retriever, queries: list, probes: list, canonical: dict, rounds: int) -> dict:
+    latencies, wasted, slots = [], 0, 0
+    for _ in range(rounds):
+        for item in queries:
+            started = time.perf_counter()
+            retriever.invoke(item["query"])
+            latencies.append(time.perf_counter() - started)
+    for query in probes:
+        seen_posts, seen_clusters = set(), set()
+        for doc in retriever.invoke(query):
+            topic_id = doc.metadata.get("topic_id")
+            cluster = canonical.get(topic_id, topic_id)
+            slots += 1
+            # Another chunk of a post already retrieved is fine; a copy of that post is a wasted slot
+            if cluster in seen_clusters and topic_id not in seen_posts:
+                wasted += 1
+            seen_posts.add(topic_id)
+            seen_clusters.add(cluster)
+    # Relevance labels name the original posts; map them onto the canonical post that now stands for them
+    relabelled = [{**item, "relevant_topic_ids": sorted({canonical.get(t, t) for t in item["relevant_topic_ids"]})}
+                  for item in queries]
+    return {
+        "latency": latency_summary(latencies),
+        "wasted_slot_ratio": wasted / slots if slots else 0.0,
+        **score(retriever, relabelled),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare indexes built with and without near-duplicate dedup")
+    parser.add_argument("--data", default=os.path.join(REPO_DIR, DATA_FILE))
+    parser.add_argument("--queries", default=QUERIES_FILE)
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD, help="Dedup similarity threshold")
+    parser.add_argument("--k", type=int, default=8, help="Chunks retrieved per query")
+    parser.add_argument("--rounds", type=int, default=5, help="Passes over the queries for latency")
+    parser.add_argument("--openai", action="store_true", help="Use OpenAI embeddings instead of the offline fake")
+    parser.add_argument("--no-history", action="store_true", help="Print the result without appending it to the history file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with open(args.data, "r", encoding='utf-8') as f:
+        data = json.load(f)
+    with open(args.queries, "r", encoding='utf-8') as f:
+        queries = json.load(f)
+
+    if args.openai:
+        from langchain_openai import OpenAIEmbeddings
+        embedding = OpenAIEmbeddings()
+    else:
+        embedding = HashingEmbeddings()
+
+    _, dedup_report = deduplicate_posts(data, args.threshold)
+    canonical = canonical_topics(data, args.threshold)
+    probes = [item["query"] for item in queries] + list(dict.fromkeys(
+        post["title"] for post in data if canonical[str(post["topic_id"])] != str(post["topic_id"]) and post.get("title")
+    ))
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        # ingest() keeps its embedding cache in the working directory; keep it out of the repo
+        with contextlib.chdir(workdir):
+            for name, threshold in (("without_dedup", None), ("with_dedup", args.threshold)):
+                persist_dir = os.path.join(workdir, name)
+                vectorstore = ingest(data, embedding, persist_dir, dedup_threshold=threshold)
+                keyword_index = KeywordIndex.from_vectorstore(vectorstore)
+                retriever = HybridRetriever(vectorstore=vectorstore, keyword_index=keyword_index, k=args.k)
+                results[name] = {
+                    "posts": len({doc.metadata.get("topic_id") for doc in keyword_index.docs}),
+                    "chunks": vectorstore._collection.count(),
+                    "index_bytes": directory_bytes(persist_dir),
+                    **measure(retriever, queries, probes, canonical, args.rounds),
+                }
+
+    before, after = results["without_dedup"], results["with_dedup"]
+    report = {
+        "benchmark": "dedup",
+        "timestamp": time.time(),
+        "commit": git_commit(),
+        "embedding": getattr(embedding, "model", type(embedding).__name__),
+        "dedup": dedup_report,
+        "chunk_reduction": 1 - after["chunks"] / before["chunks"] if before["chunks"] else 0.0,
+        "index_bytes_reduction": 1 - after["index_bytes"] / before["index_bytes"] if before["index_bytes"] else 0.0,
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+
+    if not args.no_history:
+        os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+        with open(HISTORY_FILE, "a", encoding='utf-8') as f:
+            f.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
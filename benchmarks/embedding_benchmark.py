@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Query-embedding latency benchmark: remote provider vs. the persistent embedding cache vs. a local ONNX model.
+
+  remote       embed_query against the provider (OpenAI with --openai, otherwise the offline HashingEmbeddings
+               with --remote-latency-ms added per call, like an API round-trip)
+  cached_cold  the same through CachedEmbeddings with an empty cache (every query is a miss)
+  cached_warm  a second pass over the same queries (every query is read from the memory-mapped cache)
+  concurrent   --concurrency aembed_query calls at once, direct vs. through CachedEmbeddings, which batches
+               the misses into fewer provider calls
+  local        LocalOnnxEmbeddings from --local-model-path, per query and as a batch over the corpus chunks
+               (skipped when no model is found there)
+
+The JSON report is printed and appended to benchmarks/results/embedding_history.jsonl.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from compensation_extractor import DATA_FILE  # noqa: E402
+from embedding_providers import CachedEmbeddings, EmbeddingCache, LocalOnnxEmbeddings, embedding_identity  # noqa: E402
+from ingest import build_documents, chunk_documents  # noqa: E402
+from fakes import HashingEmbeddings  # noqa: E402
+from load_benchmark import latency_summary  # noqa: E402
+from relevance_benchmark import QUERIES_FILE  # noqa: E402
+from startup_benchmark import git_commit  # noqa: E402
+
+HISTORY_FILE = os.path.join(REPO_DIR, "benchmarks", "results", "embedding_history.jsonl")
+
+
+def time_queries(embedding, queries: list) -> list:
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        embedding.embed_query(query)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def time_concurrent(embedding, queries: list) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(embedding.aembed_query(query) for query in queries))
+    return time.perf_counter() - started
+
+
+def benchmark_local(model_path: str, queries: list, chunks: list) -> dict:
+    if not os.path.isdir(model_path):
+        return {"skipped": f"no model in {model_path}"}
+    started = time.perf_counter()
+    local = LocalOnnxEmbeddings(model_path)
+    load_seconds = time.perf_counter() - started
+    local.embed_query("warm up")
+    started = time.perf_counter()
+    local.embed_documents(chunks)
+    batch_seconds = time.perf_counter() - started
+    return {
+        "identity": embedding_identity(local),
+        "load_seconds": load_seconds,
+        "query": latency_summary(time_queries(local, queries)),
+        "chunks_per_second": len(chunks) / batch_seconds if batch_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark query-embedding latency per provider and cache mode")
+    parser.add_argument("--data", default=os.path.join(REPO_DIR, DATA_FILE), help="Corpus whose chunks the local model embeds")
+    parser.add_argument("--queries", type=int, default=200, help="Distinct queries per pass")
+    parser.add_argument("--remote-latency-ms", type=float, default=150, help="Simulated API round-trip of the offline provider")
+    parser.add_argument("--concurrency", type=int, default=32, help="Queries embedded at once in the concurrent mode")
+    parser.add_argument("--openai", action="store_true", help="Use OpenAI embeddings as the remote provider")
+    parser.add_argument("--local-model-path", default=os.environ.get("LOCAL_EMBEDDING_MODEL_PATH", "models/all-MiniLM-L6-v2"))
+    parser.add_argument("--no-history", action="store_true", help="Print the result without appending it to the history file")
+    args = parser.parse_args()
+
+    if args.openai:
+        from langchain_openai import OpenAIEmbeddings
+        remote = OpenAIEmbeddings()
+    else:
+        remote = HashingEmbeddings(latency=args.remote_latency_ms / 1000)
+
+    with open(QUERIES_FILE, "r", encoding='utf-8') as f:
+        labelled = [item["query"] for item in json.load(f)]
+    # Distinct questions, so the cold pass never hits the cache
+    queries = [f"{labelled[i % len(labelled)]} (variant {i})" for i in range(args.queries)]
+
+    with open(args.data, "r", encoding='utf-8') as f:
+        chunks = [chunk.page_content for chunk in chunk_documents(build_documents(json.load(f)))]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cached = CachedEmbeddings(remote, EmbeddingCache(cache_dir, embedding_identity(remote)))
+        remote_latencies = time_queries(remote, queries)
+        cold_latencies = time_queries(cached, queries)
+        warm_latencies = time_queries(cached, queries)
+
+        batch = queries[:args.concurrency]
+        direct_seconds = asyncio.run(time_concurrent(remote, batch))
+        batched = CachedEmbeddings(remote, EmbeddingCache(os.path.join(cache_dir, "concurrent"), embedding_identity(remote)))
+        batched_seconds = asyncio.run(time_concurrent(batched, batch))
+
+    report = {
+        "benchmark": "embedding",
+        "timestamp": time.time(),
+        "commit": git_commit(),
+        "config": {"provider": embedding_identity(remote), "queries": len(queries), "remote_latency_ms": args.remote_latency_ms},
+        "remote": latency_summary(remote_latencies),
+        "cached_cold": latency_summary(cold_latencies),
+        "cached_warm": latency_summary(warm_latencies),
+        "concurrent": {
+            "queries": len(batch),
+            "direct_seconds": direct_seconds,
+            "direct_provider_calls": len(batch),
+            "batched_seconds": batched_seconds,
+            "batched_provider_calls": batched.stats["provider_calls"],
+        },
+        "local": benchmark_local(args.local_model_path, queries, chunks),
+    }
+    print(json.dumps(report, indent=2))
+
+    if not args.no_history:
+        os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+        with open(HISTORY_FILE, "a", encoding='utf-8') as f:
+            f.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
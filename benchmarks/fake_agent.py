@@ -0,0 +1,62 @@
+"""
+rag_agent with its OpenAI models replaced by the offline stand-ins in fakes.py.
+
+Serve it from a directory holding leetcode_compensation_data.json (the index is built there on first start):
+
+    PYTHONPATH=<repo>/benchmarks uvicorn fake_agent:app --port 8000
+
+The fakes are configured from the environment:
+  FAKE_LLM_LATENCY_MS         time to the first token (default 300)
+  FAKE_LLM_TOKENS_PER_SECOND  generation speed after that (default 200)
+  FAKE_LLM_ANSWER             the canned reply (default: a valid JSON summary)
+  FAKE_EMBEDDING_LATENCY_MS   added to every embeddings call (default 20)
+The fast model of query routing (FAST_LLM_MODEL, any name but gpt-4) has its own settings:
+  FAKE_FAST_LLM_LATENCY_MS         time to the first token (default 100)
+  FAKE_FAST_LLM_TOKENS_PER_SECOND  generation speed after that (default 600)
+  FAKE_FAST_LLM_INVALID_RATE       share of prompts answered with text that fails validation (default 0.05)
+Everything else (MAX_CONCURRENT_LLM_CALLS, RETRIEVAL_MODE, ...) is read by rag_agent as usual.
+"""
+
+import os
+import sys
+import types
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+from fakes import DEFAULT_ANSWER, FakeChatModel, HashingEmbeddings  # noqa: E402
+
+
+def chat_model(model_name: str = "gpt-4", **kwargs) -> FakeChatModel:
+    """Stand-in for ChatOpenAI(model_name=..., temperature=...)"""
+    if model_name != "gpt-4":
+        return FakeChatModel(
+            answer=os.environ.get("FAKE_LLM_ANSWER", DEFAULT_ANSWER),
+            invalid_rate=float(os.environ.get("FAKE_FAST_LLM_INVALID_RATE", "0.05")),
+            first_token_latency=float(os.environ.get("FAKE_FAST_LLM_LATENCY_MS", "100")) / 1000,
+            tokens_per_second=float(os.environ.get("FAKE_FAST_LLM_TOKENS_PER_SECOND", "600")),
+            model_name=f"fake-{model_name}",
+            **kwargs
+        )
+    return FakeChatModel(
+        answer=os.environ.get("FAKE_LLM_ANSWER", DEFAULT_ANSWER),
+        first_token_latency=float(os.environ.get("FAKE_LLM_LATENCY_MS", "300")) / 1000,
+        tokens_per_second=float(os.environ.get("FAKE_LLM_TOKENS_PER_SECOND", "200")),
+        **kwargs
+    )
+
+
+def embeddings(**kwargs) -> HashingEmbeddings:
+    """Stand-in for OpenAIEmbeddings()"""
+    return HashingEmbeddings(latency=float(os.environ.get("FAKE_EMBEDDING_LATENCY_MS", "20")) / 1000)
+
+
+# rag_agent imports the OpenAI classes by name, so the fakes are installed as the langchain_openai module
+fake_openai = types.ModuleType("langchain_openai")
+fake_openai.ChatOpenAI = chat_model
+fake_openai.OpenAIEmbeddings = embeddings
+sys.modules["langchain_openai"] = fake_openai
+os.environ.setdefault("OPENAI_API_KEY", "fake")  # rag_agent refuses to start without one
+
+from rag_agent import app  # noqa: E402,F401
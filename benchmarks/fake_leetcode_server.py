@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the LeetCode GraphQL endpoint used by leetcode_scraper.py.
+
+Serves the two operations the scraper uses (discussPostItems and discussPostDetail)
+from the scraped corpus, with configurable latency and injected 429/5xx errors, so the
+scraper's concurrency, rate limiting and retry behaviour can be exercised offline.
+
+Run standalone:
+    python benchmarks/fake_leetcode_server.py --port 8765 --latency 0.2 --error-rate 0.1
+and point the scraper at it:
+    python leetcode_scraper.py --base-url http://127.0.0.1:8765/graphql/
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+from aiohttp import web
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS = os.path.join(REPO_DIR, "leetcode_compensation_data.json")
+
+
+def load_posts(corpus_path: str = DEFAULT_CORPUS, count: int = 0) -> List[Dict]:
+    """Load corpus posts to serve; with count > len(corpus) the corpus is repeated under new topic ids"""
+    with open(corpus_path, "r", encoding='utf-8') as f:
+        corpus = json.load(f)
+    count = count or len(corpus)
+    posts = []
+    for i in range(count):
+        post = dict(corpus[i % len(corpus)])
+        if i >= len(corpus):
+            post["topic_id"] = int(post["topic_id"]) * 10 + i // len(corpus)
+        posts.append(post)
+    return posts
+
+
+def to_node(post: Dict, with_content: bool) -> Dict:
+    """Render a corpus post in the shape of the GraphQL article node"""
+    node = {
+        "uuid": str(post["topic_id"]),
+        "title": post["title"],
+        "slug": str(post["topic_id"]),
+        "summary": post.get("summary", ""),
+        "author": {"userName": post["author"]} if post.get("author") else None,
+        "createdAt": post.get("created_at"),
+        "updatedAt": post.get("updated_at"),
+        "topicId": post["topic_id"],
+        "hitCount": post.get("hit_count", 0),
+        "tags": [{"name": tag, "slug": tag.lower(), "tagType": ""} for tag in post.get("tags", [])],
+        "topic": {"id": post["topic_id"], "topLevelCommentCount": 0},
+    }
+    if with_content:
+        node["content"] = post.get("content", "")
+    return node
+
+
+def create_app(posts: List[Dict], latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+               error_status: int = 429, retry_after: float = 0.0, seed: int = 0) -> web.Application:
+    """Build the stand-in app. Every request sleeps latency +/- jitter seconds; a fraction error_rate of
+    requests fails with error_status (with a Retry-After header when retry_after > 0)."""
+    rng = random.Random(seed)
+    stats = {"requests": 0, "topics_requests": 0, "detail_requests": 0, "errors_injected": 0,
+             "in_flight": 0, "max_in_flight": 0}
+    by_id = {str(post["topic_id"]): post for post in posts}
+
+    async def graphql(request: web.Request) -> web.Response:
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            await asyncio.sleep(max(0.0, latency + rng.uniform(-jitter, jitter)))
+            if rng.random() < error_rate:
+                stats["errors_injected"] += 1
+                headers = {"Retry-After": str(retry_after)} if retry_after > 0 else {}
+                return web.Response(status=error_status, headers=headers, text="injected error")
+
+            payload = await request.json()
+            variables = payload.get("variables", {})
+            if payload.get("operationName") == "discussPostItems":
+                stats["topics_requests"] += 1
+                skip, first = variables.get("skip", 0), variables.get("first", 50)
+                page = app["posts"][skip:skip + first]
+                return web.json_response({"data": {"ugcArticleDiscussionArticles": {
+                    "totalNum": len(app["posts"]),
+                    "pageInfo": {"hasNextPage": skip + first < len(app["posts"])},
+                    "edges": [{"node": to_node(post, with_content=False)} for post in page],
+                }}})
+            if payload.get("operationName") == "discussPostDetail":
+                stats["detail_requests"] += 1
+                post = by_id.get(str(variables.get("topicId")))
+                return web.json_response({"data": {
+                    "ugcArticleDiscussionArticle": to_node(post, with_content=True) if post else None
+                }})
+            return web.json_response({"errors": [{"message": "unknown operation"}]}, status=400)
+        finally:
+            stats["in_flight"] -= 1
+
+    app = web.Application()
+    app["posts"] = posts
+    app["stats"] = stats
+    app.router.add_post("/graphql/", graphql)
+    return app
+
+
+@asynccontextmanager
+async def running_server(app: web.Application, host: str = "127.0.0.1", port: int = 0):
+    """Run the app in the current event loop and yield its GraphQL URL"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://{host}:{bound_port}/graphql/"
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the LeetCode GraphQL API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--posts", type=int, default=0, help="Number of posts to serve (default: whole corpus)")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--retry-after", type=float, default=0.0, help="Retry-After seconds sent with errors")
+    args = parser.parse_args()
+
+    app = create_app(load_posts(args.corpus, args.posts), args.latency, args.jitter,
+                     args.error_rate, args.error_status, args.retry_after)
+    web.run_app(app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Offline stand-ins for the OpenAI models, so benchmarks run without network access or API cost.
+
+HashingEmbeddings is a deterministic hashed bag-of-words embedding: texts that share words get
+similar vectors, which is enough for retrieval benchmarks to behave like a (weak) real model.
+FakeChatModel replays a canned answer with configurable time-to-first-token and generation speed,
+through both ainvoke and astream, so latency benchmarks see GPT-4-like timing without calling it.
+It can also answer a fixed share of prompts with output that breaks the JSON schema, like a small model does.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import re
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+DEFAULT_ANSWER = json.dumps({
+    "off_topic": False,
+    "summary": (
+        "Based on the retrieved posts, total compensation for this role typically ranges from 35 to 60 lakhs "
+        "per annum (INR 3.5M to 6M), with base salaries between 25 and 40 lakhs and the rest in stock and bonus. "
+        "Larger product companies report the higher end of the range."
+    )
+})
+
+# What a weaker model sometimes returns instead of the JSON object
+INVALID_ANSWER = (
+    "Sure! Based on the posts, total compensation for this role is usually between 35 and 60 LPA, "
+    "with 25 to 40 LPA as base."
+)
+
+
+class HashingEmbeddings(Embeddings):
+    """Hash each word into one of `size` buckets and L2-normalize the counts.
+
+    `latency` seconds are added to every call (not every text), like one round-trip to the embeddings API.
+    """
+
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.model = f"hashing-{size}"  # Namespace for the embedding cache
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in WORD_PATTERN.findall(text.lower()):
+            bucket = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:4], "little") % self.size
+            vector[bucket] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self._embed(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers every prompt with `answer` after `first_token_latency` seconds, then
+    emits it at `tokens_per_second` (about 4 characters per token), reporting token usage like the API does.
+
+    A share `invalid_rate` of prompts (chosen by a hash of the prompt, so a given question always gets the
+    same treatment) is answered with `invalid_answer` instead.
+    """
+
+    answer: str = DEFAULT_ANSWER
+    invalid_answer: str = INVALID_ANSWER
+    invalid_rate: float = 0.0
+    first_token_latency: float = 0.3
+    tokens_per_second: float = 200.0
+    model_name: str = "fake-gpt-4"
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _answer_for(self, messages: List[BaseMessage]) -> str:
+        if self.invalid_rate <= 0:
+            return self.answer
+        prompt = "\n".join(str(message.content) for message in messages)
+        draw = int.from_bytes(hashlib.md5(prompt.encode("utf-8")).digest()[:4], "little") / 2 ** 32
+        return self.invalid_answer if draw < self.invalid_rate else self.answer
+
+    @staticmethod
+    def _pieces(answer: str) -> List[str]:
+        return [answer[i:i + 4] for i in range(0, len(answer), 4)]
+
+    def _generation_seconds(self, answer: str) -> float:
+        return self.first_token_latency + len(self._pieces(answer)) / self.tokens_per_second
+
+    def _result(self, messages: List[BaseMessage], answer: str) -> ChatResult:
+        prompt_tokens = sum(math.ceil(len(str(message.content)) / 4) for message in messages)
+        completion_tokens = len(self._pieces(answer))
+        message = AIMessage(content=answer, usage_metadata={
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        answer = self._answer_for(messages)
+        time.sleep(self._generation_seconds(answer))
+        return self._result(messages, answer)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        answer = self._answer_for(messages)
+        await asyncio.sleep(self._generation_seconds(answer))
+        return self._result(messages, answer)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        for i, piece in enumerate(self._pieces(self._answer_for(messages))):
+            if i:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Offline load and latency benchmark for the RAG agent.
+
+Boots rag_agent:app against the OpenAI stand-ins (benchmarks/fake_agent.py) in a temporary directory, so no
+API key, network access or spend is needed, and measures:
+  - cold start: seconds until /ready when the Chroma index is built from scratch, and when it is loaded
+  - per-stage latency (stats, embed, cache, retrieve, pack, llm, parse) from each response's Server-Timing header
+  - end-to-end p50/p95/p99 latency and throughput at each --concurrency level (closed loop)
+  - max sustainable QPS: the best throughput among levels with no errors and p95 within --slo-ms
+both directly against the agent and, when Go is installed, through the gateway in main.go.
+
+Questions come from test_queries.sh and benchmarks/relevance_queries.json. Unless --cache is given, each
+request gets a unique suffix and near-duplicate cache hits are disabled, so every request runs the pipeline.
+Fake latencies are set with --llm-latency-ms, --tokens-per-second and --embedding-latency-ms; agent settings
+(MAX_CONCURRENT_LLM_CALLS, RETRIEVAL_MODE, ...) are passed through from the environment.
+
+The JSON report is printed and appended to benchmarks/results/load_history.jsonl. With --baseline (a report,
+or a history file whose last record is used) the run exits non-zero if it regressed by more than --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+import aiohttp
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from compensation_extractor import DATA_FILE  # noqa: E402
+from batch_benchmark import load_queries  # noqa: E402
+from relevance_benchmark import QUERIES_FILE  # noqa: E402
+from startup_benchmark import free_port, git_commit  # noqa: E402
+
+HISTORY_FILE = os.path.join(REPO_DIR, "benchmarks", "results", "load_history.jsonl")
+
+# /metrics counters copied into the report, so parsing and token regressions show up next to latency
+REPORTED_METRICS = (
+    "rag_llm_prompt_tokens_total",
+    "rag_llm_completion_tokens_total",
+    "rag_llm_cost_usd_total",
+    "rag_answer_parse_fallbacks_total",
+)
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def latency_summary(seconds: list) -> dict:
+    if not seconds:
+        return {}
+    return {
+        "mean_ms": statistics.mean(seconds) * 1000,
+        "p50_ms": percentile(seconds, 50) * 1000,
+        "p95_ms": percentile(seconds, 95) * 1000,
+        "p99_ms": percentile(seconds, 99) * 1000,
+    }
+
+
+def parse_server_timing(header: str) -> dict:
+    """{"llm": 412.3, ...} from "llm;dur=412.3, ..." """
+    stages = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, params = entry.partition(";")
+        if params.startswith("dur="):
+            stages[name] = float(params[4:])
+    return stages
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float) -> float:
+    """Seconds from now until GET url returns 200"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[0]} exited with code {process.returncode} before becoming ready")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def start_agent(workdir: str, port: int, env: dict, timeout: float) -> tuple:
+    """Launch the fake-backed agent in workdir; returns the process and its cold-start seconds"""
+    started = time.perf_counter()
+    with open(os.path.join(workdir, "agent.log"), "a", encoding='utf-8') as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "fake_agent:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning"],
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    wait_ready(f"http://127.0.0.1:{port}/ready", process, timeout)
+    return process, time.perf_counter() - started
+
+
+def start_gateway(workdir: str, port: int, agent_url: str, timeout: float) -> subprocess.Popen:
+    """Build main.go and run it in front of the agent"""
+    binary = os.path.join(workdir, "gateway")
+    subprocess.run(["go", "build", "-o", binary, "main.go"], cwd=REPO_DIR, check=True)
+    env = {**os.environ, "AGENT_URL": agent_url, "GATEWAY_ADDR": f"127.0.0.1:{port}"}
+    with open(os.path.join(workdir, "gateway.log"), "a", encoding='utf-8') as log:
+        process = subprocess.Popen([binary], env=env, stdout=log, stderr=subprocess.STDOUT)
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return process
+        time.sleep(0.05)
+    process.terminate()
+    raise TimeoutError(f"Gateway not listening after {timeout}s")
+
+
+def stop(process: subprocess.Popen) -> None:
+    process.terminate()
+    process.wait()
+
+
+async def run_level(url: str, queries: list, concurrency: int, requests: int, unique: bool,
+                    timeout: float, label: str) -> dict:
+    """`requests` POST /query calls from `concurrency` closed-loop clients"""
+    latencies, statuses, stages = [], Counter(), {}
+    next_request = 0
+
+    async def client(session: aiohttp.ClientSession):
+        nonlocal next_request
+        while next_request < requests:
+            i = next_request
+            next_request += 1
+            query = queries[i % len(queries)] + (f" #{i}" if unique else "")
+            started = time.perf_counter()
+            try:
+                async with session.post(f"{url}/query", json={"query": query},
+                                        headers={"X-Request-ID": f"{label}-{i}"}) as response:
+                    await response.read()
+                    status = response.status
+                    timing = response.headers.get("Server-Timing", "")
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status, timing = "error", ""
+            statuses[str(status)] += 1
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+                for stage, ms in parse_server_timing(timing).items():
+                    stages.setdefault(stage, []).append(ms / 1000)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "seconds": elapsed,
+        "qps": len(latencies) / elapsed,
+        "statuses": dict(statuses),
+        "error_rate": 1 - len(latencies) / requests,
+        "latency": latency_summary(latencies),
+        "stages": {stage: latency_summary(seconds) for stage, seconds in stages.items()},
+    }
+
+
+def scrape_metrics(url: str) -> dict:
+    """Totals of the REPORTED_METRICS counters, summed over labels"""
+    with urllib.request.urlopen(f"{url}/metrics", timeout=10) as response:
+        text = response.read().decode("utf-8")
+    totals = dict.fromkeys(REPORTED_METRICS, 0.0)
+    for line in text.splitlines():
+        name = line.split("{")[0].split(" ")[0]
+        if name in totals:
+            totals[name] += float(line.rsplit(" ", 1)[1])
+    return totals
+
+
+def clear_cache(url: str) -> None:
+    request = urllib.request.Request(f"{url}/cache/clear", data=b"", method="POST")
+    urllib.request.urlopen(request, timeout=10).close()
+
+
+def benchmark_target(url: str, agent_url: str, queries: list, args, label: str) -> dict:
+    levels = []
+    for concurrency in args.concurrency:
+        clear_cache(agent_url)
+        levels.append(asyncio.run(run_level(
+            url, queries, concurrency, max(args.requests, concurrency), not args.cache, args.timeout,
+            f"{label}-c{concurrency}"
+        )))
+    sustainable = [level["qps"] for level in levels
+                   if level["error_rate"] == 0 and level["latency"].get("p95_ms", float("inf")) <= args.slo_ms]
+    return {"levels": levels, "max_sustainable_qps": max(sustainable, default=0.0)}
+
+
+def load_baseline(path: str) -> dict:
+    with open(path, "r", encoding='utf-8') as f:
+        lines = [line for line in f.read().splitlines() if line.strip()]
+    return json.loads(lines[-1]) if path.endswith(".jsonl") else json.loads("\n".join(lines))
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    """Human-readable list of metrics that got worse than the baseline by more than `tolerance`"""
+    found = []
+
+    def check(name: str, current: float, previous: float, higher_is_better: bool = False):
+        if previous is None or current is None or previous == 0:
+            return
+        change = (current - previous) / previous
+        if (-change if higher_is_better else change) > tolerance:
+            found.append(f"{name}: {previous:.4g} -> {current:.4g} ({change:+.0%})")
+
+    for phase, seconds in report["cold_start_seconds"].items():
+        check(f"cold_start_seconds.{phase}", seconds, baseline.get("cold_start_seconds", {}).get(phase))
+    for target, result in report["targets"].items():
+        previous = baseline.get("targets", {}).get(target)
+        if previous is None:
+            continue
+        check(f"{target}.max_sustainable_qps", result["max_sustainable_qps"], previous["max_sustainable_qps"], True)
+        previous_levels = {level["concurrency"]: level for level in previous["levels"]}
+        for level in result["levels"]:
+            old = previous_levels.get(level["concurrency"])
+            if old is None:
+                continue
+            check(f"{target}.c{level['concurrency']}.p95_ms", level["latency"].get("p95_ms"), old["latency"].get("p95_ms"))
+            for stage, summary in level["stages"].items():
+                check(f"{target}.c{level['concurrency']}.{stage}.p50_ms", summary.get("p50_ms"),
+                      old["stages"].get(stage, {}).get("p50_ms"))
+    fallbacks = report["metrics"]["rag_answer_parse_fallbacks_total"]
+    if fallbacks > baseline.get("metrics", {}).get("rag_answer_parse_fallbacks_total", 0):
+        found.append(f"rag_answer_parse_fallbacks_total: {fallbacks:.0f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load and latency benchmark against fake OpenAI models")
+    parser.add_argument("--concurrency", default="1,8,32",
+                        type=lambda value: [int(level) for level in value.split(",")],
+                        help="Comma-separated client concurrency levels")
+    parser.add_argument("--requests", type=int, default=40, help="Requests per concurrency level")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Fake LLM time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="Fake LLM generation speed")
+    parser.add_argument("--embedding-latency-ms", type=float, default=20, help="Fake embeddings round-trip")
+    parser.add_argument("--slo-ms", type=float, default=5000, help="p95 latency a level must meet to count as sustainable")
+    parser.add_argument("--cache", action="store_true", help="Send the questions as-is so the response cache can hit")
+    parser.add_argument("--no-gateway", action="store_true", help="Only benchmark the agent directly")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--baseline", help="Earlier report (.json) or history (.jsonl) to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression against --baseline")
+    parser.add_argument("--no-history", action="store_true", help="Print the result without appending it to the history file")
+    args = parser.parse_args()
+
+    with open(QUERIES_FILE, "r", encoding='utf-8') as f:
+        queries = load_queries(os.path.join(REPO_DIR, "test_queries.sh")) + [item["query"] for item in json.load(f)]
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [BENCHMARKS_DIR, os.environ.get("PYTHONPATH")])),
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "FAKE_EMBEDDING_LATENCY_MS": str(args.embedding_latency_ms),
+        "SEMANTIC_CACHE_PATH": "",
+    }
+    if not args.cache:
+        env["SEMANTIC_CACHE_THRESHOLD"] = "2"  # Unreachable cosine similarity: no near-duplicate hits
+
+    use_gateway = not args.no_gateway and shutil.which("go") is not None
+    if not args.no_gateway and not use_gateway:
+        print("go not found, skipping the gateway benchmark", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.symlink(os.path.join(REPO_DIR, DATA_FILE), os.path.join(workdir, DATA_FILE))
+        port = free_port()
+        agent_url = f"http://127.0.0.1:{port}"
+
+        agent, build_seconds = start_agent(workdir, port, env, args.timeout)
+        stop(agent)
+        agent, load_seconds = start_agent(workdir, port, env, args.timeout)
+        gateway = None
+        try:
+            targets = {"agent": benchmark_target(agent_url, agent_url, queries, args, "agent")}
+            if use_gateway:
+                gateway_port = free_port()
+                gateway = start_gateway(workdir, gateway_port, agent_url, args.timeout)
+                targets["gateway"] = benchmark_target(f"http://127.0.0.1:{gateway_port}", agent_url, queries, args, "gateway")
+            metrics = scrape_metrics(agent_url)
+        finally:
+            if gateway is not None:
+                stop(gateway)
+            stop(agent)
+
+    report = {
+        "benchmark": "load",
+        "timestamp": time.time(),
+        "commit": git_commit(),
+        "config": {
+            "llm_latency_ms": args.llm_latency_ms,
+            "tokens_per_second": args.tokens_per_second,
+            "embedding_latency_ms": args.embedding_latency_ms,
+            "cache": args.cache,
+            "slo_ms": args.slo_ms,
+            "max_concurrent_llm_calls": int(os.environ.get("MAX_CONCURRENT_LLM_CALLS", "8")),
+            "retrieval_mode": os.environ.get("RETRIEVAL_MODE", "hybrid"),
+        },
+        "cold_start_seconds": {"build_index": build_seconds, "load_index": load_seconds},
+        "targets": targets,
+        "metrics": metrics,
+    }
+    print(json.dumps(report, indent=2))
+
+    if not args.no_history:
+        os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+        with open(HISTORY_FILE, "a", encoding='utf-8') as f:
+            f.write(json.dumps(report) + "\n")
+
+    if args.baseline:
+        found = regressions(report, load_baseline(args.baseline), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Offline relevance benchmark: plain dense retrieval vs. hybrid retrieval (metadata filters + BM25 + RRF).
+
+Indexes the corpus into a temporary Chroma store (with the offline HashingEmbeddings by default,
+or OpenAI embeddings with --openai), runs the labelled queries in benchmarks/relevance_queries.json
+through both retrievers and prints a JSON report of precision@k, recall@k, MRR and the amount of
+context text each retriever would hand to the LLM.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from compensation_extractor import DATA_FILE  # noqa: E402
+from hybrid_retrieval import HybridRetriever, KeywordIndex  # noqa: E402
+from ingest import ingest  # noqa: E402
+from fakes import HashingEmbeddings  # noqa: E402
+
+QUERIES_FILE = os.path.join(REPO_DIR, "benchmarks", "relevance_queries.json")
+
+
+def score(retriever, queries: list) -> dict:
+    precisions, recalls, reciprocal_ranks, context_chars = [], [], [], []
+    for item in queries:
+        relevant = set(item["relevant_topic_ids"])
+        docs = retriever.invoke(item["query"])
+        # A post split into several chunks counts once
+        topic_ids = list(dict.fromkeys(doc.metadata.get("topic_id") for doc in docs))
+        hits = [topic_id in relevant for topic_id in topic_ids]
+        precisions.append(sum(doc.metadata.get("topic_id") in relevant for doc in docs) / len(docs) if docs else 0.0)
+        recalls.append(sum(hits) / len(relevant) if relevant else 0.0)
+        reciprocal_ranks.append(next((1.0 / rank for rank, hit in enumerate(hits, start=1) if hit), 0.0))
+        context_chars.append(sum(len(doc.page_content) for doc in docs))
+    return {
+        "precision": statistics.mean(precisions),
+        "recall": statistics.mean(recalls),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "mean_context_chars": statistics.mean(context_chars),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dense and hybrid retrieval on labelled queries")
+    parser.add_argument("--data", default=os.path.join(REPO_DIR, DATA_FILE))
+    parser.add_argument("--queries", default=QUERIES_FILE)
+    parser.add_argument("--dense-k", type=int, default=8, help="k of the plain dense retriever")
+    parser.add_argument("--hybrid-k", type=int, default=5, help="k of the hybrid retriever")
+    parser.add_argument("--openai", action="store_true", help="Use OpenAI embeddings instead of the offline fake")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with open(args.data, "r", encoding='utf-8') as f:
+        data = json.load(f)
+    with open(args.queries, "r", encoding='utf-8') as f:
+        queries = json.load(f)
+
+    if args.openai:
+        from langchain_openai import OpenAIEmbeddings
+        embedding = OpenAIEmbeddings()
+    else:
+        embedding = HashingEmbeddings()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # ingest() keeps its embedding cache in the working directory; keep it out of the repo
+        with contextlib.chdir(workdir):
+            vectorstore = ingest(data, embedding, os.path.join(workdir, "chroma_db"))
+            dense = vectorstore.as_retriever(search_kwargs={"k": args.dense_k})
+            hybrid = HybridRetriever(
+                vectorstore=vectorstore, keyword_index=KeywordIndex.from_vectorstore(vectorstore), k=args.hybrid_k
+            )
+            results = {
+                f"dense_k{args.dense_k}": score(dense, queries),
+                f"hybrid_k{args.hybrid_k}": score(hybrid, queries),
+            }
+
+    report = {
+        "benchmark": "relevance",
+        "embedding": getattr(embedding, "model", type(embedding).__name__),
+        "queries": len(queries),
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
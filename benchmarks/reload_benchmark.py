@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Hot-reload benchmark: latency and errors under steady load while the index is rebuilt and swapped.
+
+Serves the agent with the OpenAI stand-ins (benchmarks/fake_agent.py) from a temporary directory holding a copy
+of the corpus, keeps --concurrency closed-loop clients sending /query, and --reloads times edits the corpus
+(--changed-posts posts rewritten, removed or added) and calls POST /admin/reload. Two modes:
+  in_process  uvicorn fake_agent:app: the process builds the new version in the background and swaps it in
+  serve       serve.py --workers N: the master rebuilds once and replaces the workers (rolling restart)
+Every request is assigned to a phase by its start time: `steady` (no reload running), `reload` (from the
+reload call until /admin/index reports the new version with nothing left draining) and `after_swap` (the
+first --after-swap-seconds on the new version, when the response cache is cold). The report has the latency,
+error count and max latency of each phase, the reload and swap times, and, for comparison, the downtime of
+the old way: restarting the agent on the refreshed index.
+
+The JSON report is printed and appended to benchmarks/results/reload_history.jsonl.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import aiohttp
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from compensation_extractor import DATA_FILE  # noqa: E402
+from batch_benchmark import load_queries  # noqa: E402
+from load_benchmark import latency_summary, start_agent, stop, wait_ready  # noqa: E402
+from relevance_benchmark import QUERIES_FILE  # noqa: E402
+from serving_benchmark import wait_all_ready  # noqa: E402
+from startup_benchmark import free_port, git_commit  # noqa: E402
+
+HISTORY_FILE = os.path.join(REPO_DIR, "benchmarks", "results", "reload_history.jsonl")
+
+
+def edit_corpus(path: str, changed_posts: int, round_number: int) -> None:
+    """Rewrite, remove and add posts, a third of changed_posts each, like an incremental scrape"""
+    with open(path, "r", encoding='utf-8') as f:
+        data = json.load(f)
+    rng = random.Random(round_number)
+    share = max(1, changed_posts // 3)
+    for post in rng.sample(data, share):
+        post["content"] = f"{post.get('content') or ''}\nUpdate {round_number}: negotiated a higher joining bonus."
+    removed = set(rng.sample(range(len(data)), share))
+    data = [post for i, post in enumerate(data) if i not in removed]
+    for i in range(share):
+        topic_id = 900000000 + round_number * 1000 + i
+        data.append({
+            **data[i],
+            "topic_id": topic_id,
+            "url": f"https://leetcode.com/discuss/post/{topic_id}",
+            "title": f"Newco{round_number} | SDE {i % 3 + 1} | Bangalore",
+            "content": f"Newco{round_number} offer {i}: base {30 + i} LPA, stock {i % 7} LPA, bonus 3 LPA, YOE {i % 9}.",
+        })
+    with open(path, "w", encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def get_json(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def post_json(url: str) -> dict:
+    request = urllib.request.Request(url, data=b"", method="POST")
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+async def wait_swapped(url: str, previous: str, polls: int, timeout: float) -> str:
+    """Poll /admin/index until `polls` answers in a row (every worker, under serve.py) report a new version
+    with no requests draining; returns that version"""
+    started = time.perf_counter()
+    streak, version = 0, previous
+    while streak < polls:
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"Index still {previous} after {timeout}s")
+        try:
+            status = await asyncio.to_thread(get_json, f"{url}/admin/index")
+        except OSError:
+            status = {}
+        version = status.get("active_version", previous)
+        done = version != previous and not status.get("reloading") and not status.get("draining")
+        streak = streak + 1 if done else 0
+        await asyncio.sleep(0.1)
+    return version
+
+
+async def run_load(url: str, queries: list, args, data_path: str) -> dict:
+    """Closed-loop /query load around --reloads reloads; returns per-request records and reload timings"""
+    records = []  # (start time, latency, status)
+    reloads = []
+    stopping = False
+
+    async def client(session: aiohttp.ClientSession, number: int):
+        i = number
+        while not stopping:
+            query = f"{queries[i % len(queries)]} #{i}"
+            i += args.concurrency
+            started = time.perf_counter()
+            try:
+                async with session.post(f"{url}/query", json={"query": query}) as response:
+                    await response.read()
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status = "error"
+            records.append((started, time.perf_counter() - started, status))
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=args.timeout)) as session:
+        clients = [asyncio.create_task(client(session, n)) for n in range(args.concurrency)]
+        for round_number in range(1, args.reloads + 1):
+            await asyncio.sleep(args.steady_seconds)
+            previous = (await asyncio.to_thread(get_json, f"{url}/admin/index"))["active_version"]
+            await asyncio.to_thread(edit_corpus, data_path, args.changed_posts, round_number)
+            started = time.perf_counter()
+            await asyncio.to_thread(post_json, f"{url}/admin/reload")
+            version = await wait_swapped(url, previous, 10 if args.workers else 3, args.timeout)
+            reloads.append({"started": started, "finished": time.perf_counter(), "version": version})
+        await asyncio.sleep(args.steady_seconds)
+        stopping = True
+        await asyncio.gather(*clients)
+    return {"records": records, "reloads": reloads}
+
+
+def phase_of(started: float, reloads: list, after_swap_seconds: float) -> str:
+    for reload in reloads:
+        if reload["started"] <= started < reload["finished"]:
+            return "reload"
+        if reload["finished"] <= started < reload["finished"] + after_swap_seconds:
+            return "after_swap"
+    return "steady"
+
+
+def summarize(run: dict, after_swap_seconds: float) -> dict:
+    phases = {}
+    for started, latency, status in run["records"]:
+        phase = phases.setdefault(phase_of(started, run["reloads"], after_swap_seconds), {"latencies": [], "errors": 0})
+        if status == 200:
+            phase["latencies"].append(latency)
+        else:
+            phase["errors"] += 1
+    return {
+        "phases": {
+            name: {
+                "requests": len(phase["latencies"]) + phase["errors"],
+                "errors": phase["errors"],
+                "latency": latency_summary(phase["latencies"]),
+                "max_ms": max(phase["latencies"], default=0) * 1000,
+            }
+            for name, phase in phases.items()
+        },
+        "reload_seconds": [reload["finished"] - reload["started"] for reload in run["reloads"]],
+        "versions": [reload["version"] for reload in run["reloads"]],
+    }
+
+
+def start_server(workdir: str, port: int, env: dict, args) -> subprocess.Popen:
+    if not args.workers:
+        return start_agent(workdir, port, env, args.timeout)[0]
+    with open(os.path.join(workdir, "serve.log"), "a", encoding='utf-8') as log:
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(REPO_DIR, "serve.py"), "--app", "fake_agent:app", "--host", "127.0.0.1",
+             "--port", str(port), "--workers", str(args.workers), "--max-requests", "0"],
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    wait_all_ready(f"http://127.0.0.1:{port}", process, args.workers, args.timeout)
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure latency under load while the index is hot-reloaded")
+    parser.add_argument("--workers", type=int, default=0, help="Run serve.py with this many workers (0: one uvicorn process)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Closed-loop clients")
+    parser.add_argument("--reloads", type=int, default=3, help="Corpus edits and reloads")
+    parser.add_argument("--changed-posts", type=int, default=60, help="Posts rewritten, removed or added per reload")
+    parser.add_argument("--steady-seconds", type=float, default=5, help="Load without a reload before, between and after reloads")
+    parser.add_argument("--after-swap-seconds", type=float, default=2, help="Time after a swap reported separately")
+    parser.add_argument("--llm-latency-ms", type=float, default=100, help="Fake LLM time to first token")
+    parser.add_argument("--embedding-latency-ms", type=float, default=20, help="Fake embeddings round-trip")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--no-history", action="store_true", help="Print the result without appending it to the history file")
+    args = parser.parse_args()
+
+    with open(QUERIES_FILE, "r", encoding='utf-8') as f:
+        queries = load_queries(os.path.join(REPO_DIR, "test_queries.sh")) + [item["query"] for item in json.load(f)]
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [BENCHMARKS_DIR, os.environ.get("PYTHONPATH")])),
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "FAKE_LLM_TOKENS_PER_SECOND": "2000",
+        "FAKE_EMBEDDING_LATENCY_MS": str(args.embedding_latency_ms),
+        "SEMANTIC_CACHE_PATH": "",
+        "SEMANTIC_CACHE_THRESHOLD": "2",  # Every request runs the pipeline
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        data_path = os.path.join(workdir, DATA_FILE)
+        shutil.copy(os.path.join(REPO_DIR, DATA_FILE), data_path)
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        server = start_server(workdir, port, env, args)
+        try:
+            run = asyncio.run(run_load(url, queries, args, data_path))
+        finally:
+            stop(server)
+
+        # The old way to pick up a refresh: restart on the refreshed index, unavailable until /ready
+        started = time.perf_counter()
+        server = start_server(workdir, port, env, args)
+        restart_downtime = time.perf_counter() - started
+        try:
+            wait_ready(f"{url}/ready", server, args.timeout)
+            restarted_version = get_json(f"{url}/admin/index")["active_version"]
+        finally:
+            stop(server)
+
+    result = summarize(run, args.after_swap_seconds)
+    report = {
+        "benchmark": "reload",
+        "timestamp": time.time(),
+        "commit": git_commit(),
+        "mode": f"serve_{args.workers}_workers" if args.workers else "in_process",
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "concurrency": args.concurrency,
+            "reloads": args.reloads,
+            "changed_posts": args.changed_posts,
+            "llm_latency_ms": args.llm_latency_ms,
+            "embedding_latency_ms": args.embedding_latency_ms,
+        },
+        **result,
+        "restart_downtime_seconds": restart_downtime,
+        "restart_serves_latest_version": bool(result["versions"]) and restarted_version == result["versions"][-1],
+    }
+    print(json.dumps(report, indent=2))
+
+    if not args.no_history:
+        os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+        with open(HISTORY_FILE, "a", encoding='utf-8') as f:
+            f.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
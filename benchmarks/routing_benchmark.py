@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Query routing benchmark: the local router in front of the LLM against sending every question to GPT-4.
+
+Two parts, both offline:
+  - classifier: accuracy and confusion matrix of query_router.classify_query() on the labelled questions in
+    benchmarks/routing_queries.json (off_topic, stats, lookup, summarize), and the time to classify one
+  - end to end: the agent served with the OpenAI stand-ins (benchmarks/fake_agent.py) from a temporary directory,
+    once with QUERY_ROUTING=false (every question goes to the fake GPT-4) and once with routing on, where the
+    fake fast model answers --invalid-rate of prompts with text that fails validation. Each mode answers the
+    labelled questions --rounds times at --concurrency (response cache cleared between rounds) and reports
+    latency overall and per labelled route, what answered each request (no LLM, the fast model, or the fast
+    model escalated to GPT-4, from the Server-Timing stages), LLM spend by model and escalations from /metrics.
+
+The JSON report is printed and appended to benchmarks/results/routing_history.jsonl.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter, defaultdict
+
+import aiohttp
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from compensation_extractor import DATA_FILE, build_compensation_table  # noqa: E402
+from compensation_stats import CompensationStats  # noqa: E402
+from query_router import ROUTES, classify_query  # noqa: E402
+from load_benchmark import clear_cache, latency_summary, parse_server_timing, start_agent, stop  # noqa: E402
+from startup_benchmark import free_port, git_commit  # noqa: E402
+
+QUERIES_FILE = os.path.join(BENCHMARKS_DIR, "routing_queries.json")
+HISTORY_FILE = os.path.join(REPO_DIR, "benchmarks", "results", "routing_history.jsonl")
+
+# /metrics series copied into the report, per label set
+REPORTED_METRICS = ("rag_llm_cost_usd_total", "rag_llm_escalations_total", "rag_query_routes_total")
+SAMPLE_PATTERN = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+
+
+def evaluate_classifier(queries: list, known_companies: set, repeats: int) -> dict:
+    confusion = {label: Counter() for label in ROUTES}
+    misrouted = []
+    for item in queries:
+        route, reason = classify_query(item["query"], known_companies)
+        confusion[item["route"]][route] += 1
+        if route != item["route"]:
+            misrouted.append({"query": item["query"], "expected": item["route"], "routed": route, "reason": reason})
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for item in queries:
+            classify_query(item["query"], known_companies)
+    seconds = (time.perf_counter() - started) / (repeats * len(queries))
+    return {
+        "accuracy": 1 - len(misrouted) / len(queries),
+        "confusion": {label: dict(routes) for label, routes in confusion.items()},
+        "misrouted": misrouted,
+        "classify_us": seconds * 1e6,
+    }
+
+
+def scrape_labelled(url: str) -> dict:
+    """{metric: {labels: value}} for the REPORTED_METRICS"""
+    with urllib.request.urlopen(f"{url}/metrics", timeout=10) as response:
+        text = response.read().decode("utf-8")
+    values = defaultdict(dict)
+    for line in text.splitlines():
+        match = SAMPLE_PATTERN.match(line)
+        if match and match.group(1) in REPORTED_METRICS:
+            values[match.group(1)][match.group(2) or ""] = float(match.group(3))
+    return {name: values.get(name, {}) for name in REPORTED_METRICS}
+
+
+def served_by(stages: dict) -> str:
+    if "llm_fast" in stages:
+        return "fast_then_gpt4" if "llm" in stages else "fast"
+    return "gpt4" if "llm" in stages else "no_llm"
+
+
+async def run_rounds(url: str, queries: list, args) -> list:
+    """Every labelled question, --rounds times, from --concurrency closed-loop clients; one record per request"""
+    records = []
+    for _ in range(args.rounds):
+        await asyncio.to_thread(clear_cache, url)
+        pending = list(queries)
+
+        async def client(session: aiohttp.ClientSession):
+            while pending:
+                item = pending.pop()
+                started = time.perf_counter()
+                try:
+                    async with session.post(f"{url}/query", json={"query": item["query"]}) as response:
+                        await response.read()
+                        status = response.status
+                        stages = parse_server_timing(response.headers.get("Server-Timing", ""))
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    status, stages = "error", {}
+                records.append({"label": item["route"], "latency": time.perf_counter() - started,
+                                "status": status, "served_by": served_by(stages)})
+
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=args.timeout)) as session:
+            await asyncio.gather(*(client(session) for _ in range(args.concurrency)))
+    return records
+
+
+def summarize_mode(records: list, metrics: dict) -> dict:
+    ok = [record for record in records if record["status"] == 200]
+    by_label = defaultdict(list)
+    for record in ok:
+        by_label[record["label"]].append(record["latency"])
+    cost = metrics["rag_llm_cost_usd_total"]
+    served = Counter(record["served_by"] for record in ok)
+    fast_calls = served["fast"] + served["fast_then_gpt4"]
+    return {
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "latency": latency_summary([record["latency"] for record in ok]),
+        "latency_by_label": {label: latency_summary(latencies) for label, latencies in sorted(by_label.items())},
+        "served_by": dict(served),
+        "escalation_rate": served["fast_then_gpt4"] / fast_calls if fast_calls else 0.0,
+        "llm_cost_usd": {labels: value for labels, value in cost.items()},
+        "llm_cost_per_query_usd": sum(cost.values()) / len(ok) if ok else 0.0,
+        "routes": metrics["rag_query_routes_total"],
+        "escalations": metrics["rag_llm_escalations_total"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare routed answering against GPT-4 for every question")
+    parser.add_argument("--queries", default=QUERIES_FILE, help="Questions labelled with their expected route")
+    parser.add_argument("--rounds", type=int, default=3, help="Passes over the questions per mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="Closed-loop clients")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Fake GPT-4 time to first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200, help="Fake GPT-4 generation speed")
+    parser.add_argument("--fast-latency-ms", type=float, default=100, help="Fake fast model time to first token")
+    parser.add_argument("--fast-tokens-per-second", type=float, default=600, help="Fake fast model generation speed")
+    parser.add_argument("--invalid-rate", type=float, default=0.05, help="Share of prompts the fast model answers invalidly")
+    parser.add_argument("--embedding-latency-ms", type=float, default=20, help="Fake embeddings round-trip")
+    parser.add_argument("--classify-repeats", type=int, default=200, help="Passes over the questions to time the classifier")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--no-history", action="store_true", help="Print the result without appending it to the history file")
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding='utf-8') as f:
+        queries = json.load(f)
+    with open(os.path.join(REPO_DIR, DATA_FILE), "r", encoding='utf-8') as f:
+        data = json.load(f)
+    # The agent classifies against the companies of its stats table; build the same one
+    known_companies = CompensationStats.from_corpus(data, build_compensation_table(data)).companies
+    classifier = evaluate_classifier(queries, known_companies, args.classify_repeats)
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [BENCHMARKS_DIR, os.environ.get("PYTHONPATH")])),
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+        "FAKE_FAST_LLM_LATENCY_MS": str(args.fast_latency_ms),
+        "FAKE_FAST_LLM_TOKENS_PER_SECOND": str(args.fast_tokens_per_second),
+        "FAKE_FAST_LLM_INVALID_RATE": str(args.invalid_rate),
+        "FAKE_EMBEDDING_LATENCY_MS": str(args.embedding_latency_ms),
+        "SEMANTIC_CACHE_PATH": "",
+        "SEMANTIC_CACHE_THRESHOLD": "2",  # No near-duplicate hits between the labelled questions
+    }
+    modes = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        shutil.copy(os.path.join(REPO_DIR, DATA_FILE), workdir)
+        for mode, routing in (("gpt4_only", "false"), ("routed", "true")):
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            agent, _ = start_agent(workdir, port, {**env, "QUERY_ROUTING": routing}, args.timeout)
+            try:
+                records = asyncio.run(run_rounds(url, queries, args))
+                modes[mode] = summarize_mode(records, scrape_labelled(url))
+            finally:
+                stop(agent)
+
+    baseline, routed = modes["gpt4_only"], modes["routed"]
+    report = {
+        "benchmark": "routing",
+        "timestamp": time.time(),
+        "commit": git_commit(),
+        "config": {
+            "queries": len(queries),
+            "rounds": args.rounds,
+            "concurrency": args.concurrency,
+            "llm_latency_ms": args.llm_latency_ms,
+            "fast_latency_ms": args.fast_latency_ms,
+            "invalid_rate": args.invalid_rate,
+        },
+        "classifier": classifier,
+        "modes": modes,
+        "cost_reduction": (1 - routed["llm_cost_per_query_usd"] / baseline["llm_cost_per_query_usd"]
+                           if baseline["llm_cost_per_query_usd"] else 0.0),
+        "p50_speedup": (baseline["latency"].get("p50_ms", 0) / routed["latency"]["p50_ms"]
+                        if routed["latency"].get("p50_ms") else 0.0),
+    }
+    print(json.dumps(report, indent=2))
+
+    if not args.no_history:
+        os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+        with open(HISTORY_FILE, "a", encoding='utf-8') as f:
+            f.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
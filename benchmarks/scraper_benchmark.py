@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Crawl-throughput benchmark for LeetCodeCompensationScraper against the local GraphQL stand-in.
+
+Runs the scraper once per --max-in-flight setting (1 approximates the old one-at-a-time crawl)
+against benchmarks/fake_leetcode_server.py with injected latency and errors, and prints a
+JSON report of wall time, posts scraped and request counts for each configuration.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leetcode_scraper import LeetCodeCompensationScraper  # noqa: E402
+from fake_leetcode_server import create_app, load_posts, running_server  # noqa: E402
+
+
+async def run_once(args: argparse.Namespace, max_in_flight: int) -> dict:
+    app = create_app(load_posts(count=args.posts), latency=args.latency, jitter=args.jitter,
+                     error_rate=args.error_rate, error_status=args.error_status, retry_after=args.retry_after)
+    async with running_server(app) as url:
+        scraper = LeetCodeCompensationScraper(
+            base_url=url,
+            max_in_flight=max_in_flight,
+            requests_per_second=args.requests_per_second,
+            base_backoff=0.05
+        )
+        started = time.perf_counter()
+        # The scraper narrates every request; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            posts = await scraper.scrape_all_compensation_data(max_posts=args.max_posts)
+        elapsed = time.perf_counter() - started
+
+    stats = app["stats"]
+    return {
+        "max_in_flight": max_in_flight,
+        "seconds": elapsed,
+        "posts_scraped": len(posts),
+        "posts_per_second": len(posts) / elapsed if elapsed else 0.0,
+        "requests": stats["requests"],
+        "errors_injected": stats["errors_injected"],
+        "server_max_in_flight": stats["max_in_flight"],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a local GraphQL stand-in")
+    parser.add_argument("--posts", type=int, default=300, help="Posts served by the stand-in")
+    parser.add_argument("--max-posts", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, default=0.0)
+    parser.add_argument("--requests-per-second", type=float, default=100.0)
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[1, 4, 16], help="max_in_flight settings to compare")
+    args = parser.parse_args()
+
+    results = [await run_once(args, n) for n in args.in_flight]
+    print(json.dumps({"benchmark": "scraper", "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
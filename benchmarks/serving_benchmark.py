@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Multi-worker serving benchmark: memory per worker and throughput scaling of serve.py.
+
+Runs serve.py with the OpenAI stand-ins (benchmarks/fake_agent.py) in a temporary directory at each --workers
+count, in two modes:
+  preload     the master loads the memory-mapped index snapshot and tables once and forks the workers
+  no_preload  every worker initializes on its own after the fork (its own Chroma client and indexes)
+For each run it reports throughput and latency under a closed loop of --concurrency clients, and each
+worker's resident memory from /proc/<pid>/smaps_rollup: RSS, PSS (shared pages split between the processes
+sharing them) and USS (pages private to the worker). Total PSS is the real footprint of the whole server.
+
+The fake LLM answers quickly by default (--llm-latency-ms), so requests are bound by local CPU work
+(retrieval, packing, parsing) and throughput can only scale up to the number of cores (reported as cpu_count).
+The JSON report is printed and appended to benchmarks/results/serving_history.jsonl.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from compensation_extractor import DATA_FILE  # noqa: E402
+from batch_benchmark import load_queries  # noqa: E402
+from load_benchmark import run_level, stop, wait_ready  # noqa: E402
+from relevance_benchmark import QUERIES_FILE  # noqa: E402
+from startup_benchmark import free_port, git_commit  # noqa: E402
+
+HISTORY_FILE = os.path.join(REPO_DIR, "benchmarks", "results", "serving_history.jsonl")
+
+
+def memory_kb(pid: int) -> dict:
+    """Rss, Pss and USS (private clean + dirty) of a process, in kB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r", encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def worker_pids(master: int) -> list:
+    with open(f"/proc/{master}/task/{master}/children", "r", encoding='utf-8') as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def wait_all_ready(url: str, process: subprocess.Popen, workers: int, timeout: float) -> float:
+    """Seconds until /ready answers 200 several times in a row (each worker reports its own readiness)"""
+    started = time.perf_counter()
+    wait_ready(f"{url}/ready", process, timeout)
+    streak = 0
+    while streak < 3 * workers and time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(f"{url}/ready", timeout=5) as response:
+                streak = streak + 1 if response.status == 200 else 0
+        except OSError:
+            streak = 0
+            time.sleep(0.1)
+    return time.perf_counter() - started
+
+
+def run_server(workdir: str, env: dict, workers: int, preload: bool, queries: list, args) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    command = [sys.executable, os.path.join(REPO_DIR, "serve.py"), "--app", "fake_agent:app", "--host", "127.0.0.1",
+               "--port", str(port), "--workers", str(workers), "--max-requests", "0"]
+    if not preload:
+        command.append("--no-preload")
+    with open(os.path.join(workdir, "serve.log"), "a", encoding='utf-8') as log:
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        startup_seconds = wait_all_ready(url, process, workers, args.timeout)
+        level = asyncio.run(run_level(url, queries, args.concurrency, args.requests, True, args.timeout,
+                                      f"w{workers}-{'preload' if preload else 'no-preload'}"))
+        master = memory_kb(process.pid)
+        per_worker = [memory_kb(pid) for pid in worker_pids(process.pid)]
+    finally:
+        stop(process)
+    mean = lambda key: sum(memory[key] for memory in per_worker) / len(per_worker) / 1024  # noqa: E731
+    return {
+        "workers": workers,
+        "startup_seconds": startup_seconds,
+        "qps": level["qps"],
+        "error_rate": level["error_rate"],
+        "latency": level["latency"],
+        "worker_rss_mb": mean("rss"),
+        "worker_pss_mb": mean("pss"),
+        "worker_uss_mb": mean("uss"),
+        "master_rss_mb": master["rss"] / 1024,
+        "total_pss_mb": (master["pss"] + sum(memory["pss"] for memory in per_worker)) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serve.py memory per worker and throughput scaling")
+    parser.add_argument("--workers", default=f"1,2,{os.cpu_count() or 1}",
+                        type=lambda value: sorted({int(count) for count in value.split(",")}),
+                        help="Comma-separated worker counts")
+    parser.add_argument("--concurrency", type=int, default=32, help="Closed-loop clients")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per run")
+    parser.add_argument("--llm-latency-ms", type=float, default=20, help="Fake LLM time to first token")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--no-history", action="store_true", help="Print the result without appending it to the history file")
+    args = parser.parse_args()
+
+    with open(QUERIES_FILE, "r", encoding='utf-8') as f:
+        queries = load_queries(os.path.join(REPO_DIR, "test_queries.sh")) + [item["query"] for item in json.load(f)]
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [BENCHMARKS_DIR, os.environ.get("PYTHONPATH")])),
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "FAKE_LLM_TOKENS_PER_SECOND": "5000",
+        "FAKE_EMBEDDING_LATENCY_MS": "0",
+        "SEMANTIC_CACHE_PATH": "",
+        "SEMANTIC_CACHE_THRESHOLD": "2",  # Every request runs the pipeline
+        "MAX_CONCURRENT_LLM_CALLS": str(args.concurrency),
+        "MAX_QUEUED_QUERIES": str(args.concurrency),
+    }
+
+    runs = {"preload": [], "no_preload": []}
+    with tempfile.TemporaryDirectory() as workdir:
+        os.symlink(os.path.join(REPO_DIR, DATA_FILE), os.path.join(workdir, DATA_FILE))
+        for workers in args.workers:
+            for mode in runs:
+                runs[mode].append(run_server(workdir, env, workers, mode == "preload", queries, args))
+
+    for results in runs.values():
+        base = results[0]["qps"]
+        for result in results:
+            result["speedup"] = result["qps"] / base if base else None
+
+    report = {
+        "benchmark": "serving",
+        "timestamp": time.time(),
+        "commit": git_commit(),
+        "cpu_count": os.cpu_count(),
+        "config": {"concurrency": args.concurrency, "requests": args.requests, "llm_latency_ms": args.llm_latency_ms},
+        "runs": runs,
+    }
+    print(json.dumps(report, indent=2))
+
+    if not args.no_history:
+        os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+        with open(HISTORY_FILE, "a", encoding='utf-8') as f:
+            f.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for the RAG agent.
+
+Measures, in fresh subprocesses:
+  - import time of the rag_agent module
+  - cold-start time: from launching uvicorn until /ready returns 200
+
+Each run appends one JSON record to benchmarks/results/startup_history.jsonl so
+startup regressions can be tracked over time (the record carries the git commit).
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_FILE = os.path.join(REPO_DIR, "benchmarks", "results", "startup_history.jsonl")
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import rag_agent; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(app_module: str) -> float:
+    """Seconds spent importing the app module in a fresh interpreter"""
+    snippet = IMPORT_SNIPPET.replace("rag_agent", app_module)
+    output = subprocess.run(
+        [sys.executable, "-c", snippet], cwd=REPO_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_cold_start(app: str, timeout: float) -> float:
+    """Seconds from launching uvicorn until /ready answers 200"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_DIR
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode} before becoming ready")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.05)
+        raise TimeoutError(f"Server not ready after {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def summarize(samples: list) -> dict:
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "max": max(samples),
+        "samples": samples
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RAG agent import and cold-start time")
+    parser.add_argument("--app", default="rag_agent:app", help="ASGI app to launch (module:attribute)")
+    parser.add_argument("--runs", type=int, default=3, help="Number of runs per measurement")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for /ready")
+    parser.add_argument("--no-history", action="store_true", help="Print the result without appending it to the history file")
+    args = parser.parse_args()
+
+    app_module = args.app.split(":")[0]
+    import_times = [measure_import(app_module) for _ in range(args.runs)]
+    cold_starts = [measure_cold_start(args.app, args.timeout) for _ in range(args.runs)]
+
+    result = {
+        "benchmark": "startup",
+        "timestamp": time.time(),
+        "commit": git_commit(),
+        "app": args.app,
+        "import_seconds": summarize(import_times),
+        "cold_start_seconds": summarize(cold_starts)
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_history:
+        os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+        with open(HISTORY_FILE, "a", encoding='utf-8') as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
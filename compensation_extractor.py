@@ -0,0 +1,408 @@
+# compensation_extractor.py
+# Ingest-time extraction of structured compensation data from LeetCode posts.
+# Each post in leetcode_compensation_data.json is parsed once into a typed CompensationRecord
+# (deterministic regex parser, with an optional one-time LLM fallback cached by topic_id),
+# and the resulting table keyed by topic_id is what /query uses to build compensation cards.
+
+import argparse
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+DATA_FILE = "leetcode_compensation_data.json"
+TABLE_FILE = "compensation_table.json"
+LLM_CACHE_FILE = "compensation_llm_cache.json"
+
+# Multipliers for the units people use when quoting amounts
+UNIT_MULTIPLIERS = {
+    "lpa": 100_000, "lakh": 100_000, "lakhs": 100_000, "lac": 100_000, "lacs": 100_000, "l": 100_000,
+    "cr": 10_000_000, "crore": 10_000_000, "crores": 10_000_000,
+    "k": 1_000, "m": 1_000_000, "mn": 1_000_000,
+}
+INR_UNITS = {"lpa", "lakh", "lakhs", "lac", "lacs", "l", "cr", "crore", "crores"}
+
+# A lakh/crore figure this large is already written out in full ("CTC: 47,60,000 LPA")
+MAX_INR_UNIT_QUANTITY = 10_000
+
+# Currency symbols / words mapped to ISO 4217 codes
+CURRENCY_CODES = {
+    "₹": "INR", "rs": "INR", "rs.": "INR", "inr": "INR",
+    "$": "USD", "usd": "USD",
+    "€": "EUR", "eur": "EUR",
+    "£": "GBP", "gbp": "GBP",
+}
+
+# An amount with an optional leading/trailing currency and unit, e.g. "₹62L", "41 LPA", "USD 115K", "17,00,000"
+AMOUNT_PATTERN = re.compile(
+    r"(?P<cur>₹|rs\.?|inr|\$|usd|€|eur|£|gbp)?\s*"
+    r"(?<![a-z0-9.])(?P<num>\d[\d,]*(?:\.\d+)?)(?![\d%])\s*"
+    r"(?P<unit>lpa|lakhs?|lacs?|l|crores?|cr|k|mn|m)?(?![a-z])\s*"
+    r"(?P<cur2>inr|usd|eur|gbp)?",
+    re.IGNORECASE
+)
+
+# Durations that look like amounts: "(Year 1)", "1st year", "vested over 4 years"
+DURATION_PATTERN = re.compile(r"\b(years?|yrs?)\s*\d+\b|\b\d+\s*(st|nd|rd|th)?\s*(years?|yrs?|months?)\b", re.IGNORECASE)
+
+# Where a "label: value" fragment starts: the line start or a separator ("|", ",", "+", "("), then any bullet or emoji
+FRAGMENT_START = r"(?:^|[|;,+=(/]|\s[-–]\s)[^\w\n]*(?:\d+[.)]\s+)?"
+# Between a label and its value: ":", "=", "-", "~" or a table cell border, after up to three more words and notes
+# ("Base Package: 22L", "Bonus (20%): 4L"), or the amount itself
+LABEL_END = (
+    r"\b(?:[^\S\n]+[a-z]+){0,3}[^\S\n]*(?:\([^)\n]*\)[^\S\n]*)*"
+    r"(?:[:=~\-–|]+|(?=[₹$€£\d]|(?:rs|inr|usd)\b))"
+)
+
+
+def _field_label(label: str) -> re.Pattern:
+    # Up to three leading qualifier words are allowed ("Annual Salary: 16L", "Total Year 1 CTC | 64L")
+    qualifier = r"(?:[a-z][a-z'-]*|\d+(?:st|nd|rd|th)?)[^\S\n]+"
+    return re.compile(f"{FRAGMENT_START}(?:{qualifier}){{0,3}}(?:{label}){LABEL_END}", re.IGNORECASE)
+
+
+# Field labels, matched case-insensitively at the start of a "label: value" fragment, so a label inside a
+# breakdown ("CTC: 21LPA (20L base + 1L bonus)") is not read as a field of its own
+FIELD_LABELS = {
+    "total_compensation": _field_label(r"total\s*(ctc|comp(ensation)?|tc|package|pay|cost to company)|ctc|tc"),
+    "base_salary": _field_label(r"base(\s*(salary|pay|compensation))?|fixed(\s*(pay|salary|component))?|salary"),
+    "equity": _field_label(r"(total\s*)?(stocks?|equity|rsus?|rsu's|esops?)"),
+    "bonus": _field_label(r"((annual|joining|sign[\s-]*on|performance|target|relocation)\s*)?bonus|jb"),
+}
+
+# Lines describing the author's current/previous package or expectations, not the offer
+SKIP_LINE_PATTERN = re.compile(r"\b(current|previous|prev|prior|existing|expected|expecting|old)\b", re.IGNORECASE)
+# Lines opening a section about the current/previous job ("Current:", "Previous Compensation", "Current CTC: 8L")
+SKIP_SECTION_PATTERN = re.compile(r"^[\W_]*(my\s+)?(current|previous|prev|prior|existing|old)\b", re.IGNORECASE)
+# A heading line: a few words and an optional colon but no value ("Other offer:"), or a line introducing an offer
+HEADING_PATTERN = re.compile(
+    r"^[\W_]*[a-z](?:[a-z &/'.()]|\b-\b){0,50}?[\s:-]*$|^[^:\n]*\boffers?\b[^:\n]*[\s:-]*$", re.IGNORECASE
+)
+# Lines that start describing the offer ("Date of the Offer: ...", "Offered: ..."), or the company of one
+OFFER_START_PATTERN = re.compile(r"^[\W_]*(date\b.*\boffer|offer|new)\b", re.IGNORECASE)
+COMPANY_LINE_PATTERN = re.compile(r"^[\W_]*company\b", re.IGNORECASE)
+
+EXPERIENCE_PATTERNS = [
+    re.compile(r"\b(yoe|years?\s+of\s+experience|total\s+exp(erience)?)\b\s*[:\-=~]*\s*~?\s*(?P<years>\d+(\.\d+)?)", re.IGNORECASE),
+    re.compile(r"(?P<years>\d+(\.\d+)?)\s*\+?\s*(yoe|years?\s+of\s+experience)\b", re.IGNORECASE),
+    re.compile(r"(?<!prior )(?<!previous )\bexperience\b\s*[:\-=~]+\s*~?\s*(?P<years>\d+(\.\d+)?)\s*(yrs?|years?)?", re.IGNORECASE),
+]
+
+LABELLED_TEXT_PATTERNS = {
+    "company": re.compile(r"^\s*company\s*[:\-]\s*(?P<value>[^\n,|(]+)", re.IGNORECASE | re.MULTILINE),
+    "title": re.compile(r"^\s*(title\s*/\s*level|title|level|role|position|designation)\s*[:\-]\s*(?P<value>[^\n|]+)", re.IGNORECASE | re.MULTILINE),
+    "location": re.compile(r"^\s*location\s*[:\-]\s*(?P<value>[^\n|]+)", re.IGNORECASE | re.MULTILINE),
+}
+
+KNOWN_LOCATIONS = [
+    "Bangalore", "Bengaluru", "Banglore", "Hyderabad", "Pune", "Gurgaon", "Gurugram", "Noida", "Chennai", "Mumbai", "Delhi",
+    "Kolkata", "Ahmedabad", "Seattle", "Bay Area", "San Francisco", "New York", "NYC", "Austin", "London",
+    "Dublin", "Berlin", "Amsterdam", "Singapore", "Toronto", "Vancouver", "Tokyo", "Dubai", "Remote",
+    "India", "USA", "UK", "Canada", "Germany", "Netherlands", "Japan", "Poland",
+]
+LOCATION_PATTERN = re.compile(r"\b(" + "|".join(re.escape(loc) for loc in KNOWN_LOCATIONS) + r")\b", re.IGNORECASE)
+
+# Signals that amounts without an explicit currency are in INR
+INR_CONTEXT_PATTERN = re.compile(r"lpa|lakh|\blacs?\b|crore|₹|\binr\b|\brs\.?\s*\d|india|bangalore|bengaluru|banglore|hyderabad|pune|gurgaon|gurugram|noida|chennai|mumbai", re.IGNORECASE)
+
+# Tags that never name a company
+GENERIC_TAGS = {
+    "compensation", "interview", "career", "interview experience", "frontend", "backend", "dsa", "java",
+    "system design", "data science", "machine learning engineer", "data scientist / data engineer", "mts",
+    "india", "bengaluru", "bangalore", "pune", "hyderabad", "offer", "salary",
+}
+
+
+class CompensationRecord(BaseModel):
+    topic_id: str
+    company: str = ""
+    title: str = ""
+    location: str = ""
+    experience_years: Optional[float] = None
+    total_compensation: Optional[float] = None
+    total_compensation_currency: str = ""
+    base_salary: Optional[float] = None
+    base_salary_currency: str = ""
+    equity: Optional[float] = None
+    equity_currency: str = ""
+    bonus: Optional[float] = None
+    bonus_currency: str = ""
+    url: str = ""
+    created_at: str = ""
+    updated_at: str = ""
+    extraction_method: str = "regex"  # "regex" or "llm"
+
+    def has_compensation(self) -> bool:
+        return self.total_compensation is not None or self.base_salary is not None
+
+    def to_card(self) -> Dict[str, str]:
+        """Render the record in the CompensationCard schema served by /query"""
+        return {
+            "id": self.topic_id,
+            "company": self.company or "Not specified",
+            "title": self.title or "Not specified",
+            "total_compensation": _format_amount(self.total_compensation),
+            "total_compensation_currency": self.total_compensation_currency,
+            "base_salary": _format_amount(self.base_salary),
+            "base_salary_currency": self.base_salary_currency,
+            "equity": _format_amount(self.equity),
+            "equity_currency": self.equity_currency,
+            "bonus": _format_amount(self.bonus),
+            "bonus_currency": self.bonus_currency,
+            "experience": f"{self.experience_years:g} years" if self.experience_years is not None else "Not specified",
+            "location": self.location or "Not specified",
+            "url": self.url,
+            "created_at": self.created_at[:10],
+        }
+
+
+def _format_amount(value: Optional[float]) -> str:
+    if value is None:
+        return "Not specified"
+    return str(int(round(value)))
+
+
+def parse_amount(text: str, default_currency: str = "") -> Optional[Tuple[float, str]]:
+    """Parse the first amount in text into (full numeric value, ISO currency code)"""
+    for match in AMOUNT_PATTERN.finditer(DURATION_PATTERN.sub(" ", text)):
+        number = float(match.group("num").replace(",", ""))
+        unit = (match.group("unit") or "").lower()
+        currency_token = (match.group("cur") or match.group("cur2") or "").lower()
+        currency = CURRENCY_CODES.get(currency_token, "")
+
+        if unit in INR_UNITS:
+            currency = currency or "INR"
+        currency = currency or default_currency
+
+        if unit and (unit not in INR_UNITS or number < MAX_INR_UNIT_QUANTITY):
+            number *= UNIT_MULTIPLIERS[unit]
+        elif number < 1000:
+            # Bare small numbers are shorthand: lakhs in INR posts ("CTC: 34"), thousands elsewhere ("Base: 180")
+            number *= 100_000 if currency == "INR" else 1_000
+
+        if number > 0:
+            return round(number, 2), currency
+    return None
+
+
+def _normalize_content(text: str) -> str:
+    # Some posts carry literal "\n" sequences and markdown emphasis
+    return text.replace("\\n", "\n").replace("\\t", "\t").replace("\r", "").replace("**", "").replace("__", "")
+
+
+def _split_title(title: str) -> List[str]:
+    # "Doordash | E4 | India - Compensation" -> ["Doordash", "E4", "India"]
+    title = re.sub(r"[-–]\s*(compensation|offer|offer evaluation)\s*$", "", title, flags=re.IGNORECASE)
+    return [part.strip() for part in re.split(r"[|/]", title) if part.strip()] if "|" in title else []
+
+
+def _offer_lines(content: str) -> List[str]:
+    """Lines of a post about the offer. Lines about the current/previous package or expectations are dropped,
+    and so is the section such a line opens: after a heading ("Current:") up to the next heading or the blank
+    line closing it or the first line about the offer, after a value line ("Current CTC: 8L") also up to a blank
+    line or a company line."""
+    lines = []
+    section = None  # "heading" or "line" while inside a skipped section
+    section_has_content = False
+    paragraph_has_offer = False  # A "Current TC: ..." line within an offer's own paragraph opens no section
+    for line in content.split("\n"):
+        if not line.strip():
+            if section == "line" or section_has_content:
+                section = None
+            paragraph_has_offer = False
+            continue
+        if SKIP_SECTION_PATTERN.match(line):
+            if HEADING_PATTERN.match(line):
+                section, section_has_content = "heading", False
+            elif not paragraph_has_offer:
+                section = "line"
+            continue
+        if section:
+            if (HEADING_PATTERN.match(line) or OFFER_START_PATTERN.match(line)
+                    or (section == "line" and COMPANY_LINE_PATTERN.match(line))):
+                section = None
+            else:
+                section_has_content = True
+                continue
+        if not SKIP_LINE_PATTERN.search(line):
+            lines.append(line)
+            paragraph_has_offer = paragraph_has_offer or bool(
+                OFFER_START_PATTERN.match(line) or COMPANY_LINE_PATTERN.match(line)
+            )
+    return lines
+
+
+def extract_compensation(entry: Dict) -> CompensationRecord:
+    """Deterministically extract a CompensationRecord from one scraped post"""
+    content = _normalize_content(entry.get("content") or "")
+    title = entry.get("title") or ""
+    tags = entry.get("tags") or []
+    title_parts = _split_title(title)
+
+    default_currency = "INR" if INR_CONTEXT_PATTERN.search(f"{title}\n{' '.join(tags)}\n{content}") else ""
+    if not default_currency and re.search(r"\$|\busd\b", content, re.IGNORECASE):
+        default_currency = "USD"
+
+    record = CompensationRecord(
+        topic_id=str(entry["topic_id"]),
+        url=entry.get("url", ""),
+        created_at=entry.get("created_at") or "",
+        updated_at=entry.get("updated_at") or "",
+    )
+
+    # Every field comes from the lines about the offer, not the current/previous package
+    offer_lines = _offer_lines(content)
+    offer_text = "\n".join(offer_lines)
+
+    # Amount fields: take the first "label: amount" fragment, reading the value up to the next "|" or ";"
+    for line in offer_lines:
+        for field, label_pattern in FIELD_LABELS.items():
+            if getattr(record, field) is not None:
+                continue
+            label = label_pattern.search(line)
+            if not label:
+                continue
+            amount = parse_amount(re.split(r"[|;]", line[label.end():].lstrip(" |"))[0], default_currency)
+            if amount:
+                setattr(record, field, amount[0])
+                setattr(record, f"{field}_currency", amount[1])
+
+    for pattern in EXPERIENCE_PATTERNS:
+        match = pattern.search(content)
+        if match:
+            record.experience_years = float(match.group("years"))
+            break
+
+    labelled = {field: pattern.search(offer_text) for field, pattern in LABELLED_TEXT_PATTERNS.items()}
+
+    company_tags = [tag for tag in tags if tag.lower() not in GENERIC_TAGS and not LOCATION_PATTERN.fullmatch(tag)]
+    if labelled["company"]:
+        record.company = labelled["company"].group("value").strip()
+    elif company_tags:
+        record.company = company_tags[0]
+    elif title_parts:
+        record.company = title_parts[0]
+
+    if labelled["title"]:
+        record.title = labelled["title"].group("value").strip()
+    elif len(title_parts) > 1:
+        record.title = title_parts[1]
+
+    if labelled["location"]:
+        record.location = labelled["location"].group("value").strip()
+    else:
+        location = LOCATION_PATTERN.search(f"{title}\n{' '.join(tags)}\n{offer_text}")
+        if location:
+            record.location = location.group(1)
+
+    return record
+
+
+LLM_EXTRACTION_PROMPT = (
+    "Extract the compensation offer described in this LeetCode post. "
+    "Return only a JSON object with keys: company, title, location, experience_years, "
+    "total_compensation, total_compensation_currency, base_salary, base_salary_currency, equity, equity_currency, "
+    "bonus, bonus_currency. Amounts must be full numbers (e.g. '35 LPA' is 3500000 with currency 'INR'), "
+    "currencies ISO 4217 codes, and unknown values null.\n\nTitle: {title}\nContent:\n{content}"
+)
+
+
+def llm_extract(entry: Dict, llm) -> Optional[Dict]:
+    """One-time LLM extraction for posts the deterministic parser could not handle"""
+    prompt = LLM_EXTRACTION_PROMPT.format(title=entry.get("title", ""), content=entry.get("content", "")[:4000])
+    try:
+        answer = llm.invoke(prompt).content
+        match = re.search(r'\{.*\}', answer, re.DOTALL)
+        return json.loads(match.group(0)) if match else None
+    except Exception:
+        logging.error(f"LLM extraction failed for topic {entry.get('topic_id')}", exc_info=True)
+        return None
+
+
+def load_llm_cache(path: str = LLM_CACHE_FILE) -> Dict[str, Dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_compensation_table(data: List[Dict], llm=None, llm_cache_path: str = LLM_CACHE_FILE) -> Dict[str, CompensationRecord]:
+    """Extract a record for every post. Previously cached LLM extractions are always applied;
+    new LLM calls are only made when an llm is passed, for posts the regex parser left without amounts."""
+    llm_cache = load_llm_cache(llm_cache_path)
+    cache_dirty = False
+    table = {}
+
+    for entry in data:
+        record = extract_compensation(entry)
+        cached = llm_cache.get(record.topic_id)
+
+        # Cached results are reused only while the post itself is unchanged
+        if cached is not None and cached.get("updated_at") != record.updated_at:
+            cached = None
+        if cached is None and llm is not None and not record.has_compensation():
+            fields = llm_extract(entry, llm)
+            if fields is not None:
+                cached = {"updated_at": record.updated_at, "fields": fields}
+                llm_cache[record.topic_id] = cached
+                cache_dirty = True
+
+        if cached is not None and not record.has_compensation():
+            fields = {k: v for k, v in cached["fields"].items() if v is not None and k in CompensationRecord.model_fields}
+            fields.pop("topic_id", None)
+            try:
+                record = CompensationRecord(**{**record.model_dump(), **fields, "extraction_method": "llm"})
+            except ValueError:
+                logging.warning(f"Ignoring malformed cached LLM extraction for topic {record.topic_id}")
+
+        table[record.topic_id] = record
+
+    if cache_dirty:
+        with open(llm_cache_path, "w", encoding='utf-8') as f:
+            json.dump(llm_cache, f, indent=2, ensure_ascii=False)
+
+    return table
+
+
+def save_compensation_table(table: Dict[str, CompensationRecord], path: str = TABLE_FILE) -> None:
+    # Written atomically: a running agent may load the table while ingest refreshes it
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding='utf-8') as f:
+        json.dump({topic_id: record.model_dump() for topic_id, record in table.items()}, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_compensation_table(path: str = TABLE_FILE) -> Dict[str, CompensationRecord]:
+    with open(path, "r", encoding='utf-8') as f:
+        return {topic_id: CompensationRecord(**record) for topic_id, record in json.load(f).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the structured compensation table from scraped LeetCode posts")
+    parser.add_argument("--data", default=DATA_FILE, help="Scraped corpus to read")
+    parser.add_argument("--output", default=TABLE_FILE, help="Where to write the table keyed by topic_id")
+    parser.add_argument("--llm-fallback", action="store_true", help="Use GPT-4 once per post the regex parser cannot handle")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    with open(args.data, "r", encoding='utf-8') as f:
+        data = json.load(f)
+
+    llm = None
+    if args.llm_fallback:
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(model_name="gpt-4", temperature=0)
+
+    table = build_compensation_table(data, llm=llm)
+    save_compensation_table(table, args.output)
+
+    with_comp = sum(1 for record in table.values() if record.has_compensation())
+    logging.info(f"Extracted {len(table)} records ({with_comp} with compensation amounts) into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
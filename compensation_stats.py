@@ -0,0 +1,300 @@
+# compensation_stats.py
+# LLM-free aggregation over the compensation corpus. The ingest-time compensation table is laid out as
+# columnar NumPy arrays (amounts normalized to USD, categorical fields canonicalized the same way the
+# retriever does it), so filter / group-by / percentile queries are vectorized and take milliseconds.
+# Also detects aggregative questions ("median TC for SDE2 in Bangalore") so /query can answer them from here.
+
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from compensation_extractor import TABLE_FILE, CompensationRecord
+from dedup import DEDUP_THRESHOLD, deduplicate_posts
+from hybrid_retrieval import extract_query_filters, filterable_companies
+from ingest import post_metadata
+
+# The stats rows, saved with a fingerprint of the compensation table they were built from, so a restart
+# needs neither the corpus nor another dedup pass
+STATS_FILE = "compensation_stats.json"
+
+METRICS = ("total_compensation", "base_salary", "equity", "bonus")
+GROUP_FIELDS = ("company", "level", "location", "yoe", "year")
+PERCENTILES = (25, 50, 75, 90)
+
+# Approximate USD value of one unit of each currency the extractor recognises; refresh occasionally
+FX_TO_USD = {"USD": 1.0, "INR": 0.012, "EUR": 1.08, "GBP": 1.27}
+
+# Annual amounts outside this USD range are extraction noise (a year or a percentage read as an amount)
+PLAUSIBLE_USD = (1_000, 10_000_000)
+
+INDIA_LOCATIONS = {
+    "india", "bangalore", "hyderabad", "pune", "gurgaon", "noida", "chennai", "mumbai", "delhi", "kolkata", "ahmedabad",
+}
+
+# Years-of-experience buckets used when grouping by "yoe"
+YOE_EDGES = np.array([0, 2, 4, 7, 10, 15])
+YOE_LABELS = np.array(["0-2", "2-4", "4-7", "7-10", "10-15", "15+"])
+
+AGGREGATE_PATTERN = re.compile(
+    r"\b(median|average|avg|typical|percentiles?|p\d{2}|distribution|range|trends?|how much (?:do|does)|"
+    r"what do .{1,40} pay|over time)\b",
+    re.IGNORECASE
+)
+# "p75 TC": a percentile, not a level filter
+PERCENTILE_PATTERN = re.compile(r"\bp\d{2}\b", re.IGNORECASE)
+COMPARE_PATTERN = re.compile(r"\b(vs\.?|versus|compare|compared)\b", re.IGNORECASE)
+TREND_PATTERN = re.compile(r"\b(trends?|over time|over the years|year over year|change[ds]?)\b", re.IGNORECASE)
+METRIC_PATTERNS = [
+    ("base_salary", re.compile(r"\bbase\b|\bfixed\b", re.IGNORECASE)),
+    ("equity", re.compile(r"\b(stocks?|equity|rsus?|esops?)\b", re.IGNORECASE)),
+    ("bonus", re.compile(r"\bbonus(es)?\b", re.IGNORECASE)),
+]
+YOE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*\+?\s*(?:yoe|years?|yrs?)(?:\s+of\s+experience)?\b", re.IGNORECASE)
+YEAR_PATTERN = re.compile(r"\b(20[12]\d)\b")
+
+
+class CompensationStats:
+    """Columnar view of the compensation table for vectorized filtering, grouping and percentiles"""
+
+    def __init__(self, rows: List[Dict]):
+        self.rows = rows
+        self.topic_id = np.array([row["topic_id"] for row in rows], dtype=object)
+        self.url = np.array([row["url"] for row in rows], dtype=object)
+        self.company = np.array([row["company"] for row in rows], dtype=object)
+        self.level = np.array([row["level"] for row in rows], dtype=object)
+        self.location = np.array([row["location"] for row in rows], dtype=object)
+        self.yoe = np.array([np.nan if row["yoe"] is None else row["yoe"] for row in rows], dtype=np.float64)
+        self.created = np.array([row["created"] or "NaT" for row in rows], dtype="datetime64[D]")
+        self.year = np.array([str(row["created"])[:4] for row in rows], dtype=object)
+        self.amounts_usd = {metric: np.array([row[metric] for row in rows], dtype=np.float64) for metric in METRICS}
+        self.companies = filterable_companies(self.company)
+
+        yoe_index = np.clip(np.searchsorted(YOE_EDGES, np.nan_to_num(self.yoe, nan=-1), side="right") - 1, 0, None)
+        self.yoe_bucket = np.where(np.isnan(self.yoe), "", YOE_LABELS[yoe_index]).astype(object)
+
+    def __len__(self) -> int:
+        return len(self.topic_id)
+
+    @classmethod
+    def from_corpus(cls, data: List[Dict], table: Dict[str, CompensationRecord],
+                    dedup_threshold: Optional[float] = DEDUP_THRESHOLD) -> "CompensationStats":
+        """Build the columns from the scraped corpus and its ingest-time compensation table.
+
+        Each post counts once: repeated topic ids are dropped, and near-duplicate posts are collapsed the way
+        ingest collapses them (None or 0 keeps every distinct topic).
+        """
+        first_seen = {}
+        for entry in data:
+            first_seen.setdefault(str(entry["topic_id"]), entry)
+        data = list(first_seen.values())
+        if dedup_threshold:
+            data, _ = deduplicate_posts(data, dedup_threshold)
+        rows = []
+        for entry in data:
+            record = table.get(str(entry["topic_id"]))
+            if record is None or not record.has_compensation():
+                continue
+            metadata = post_metadata(entry, record)
+            row = {
+                "topic_id": record.topic_id,
+                "url": record.url,
+                "company": metadata["company"],
+                "level": metadata["level"],
+                "location": metadata["location"],
+                "yoe": record.experience_years,
+                "created": (record.created_at or metadata["created_at"])[:10],
+            }
+            for metric in METRICS:
+                row[metric] = to_usd(getattr(record, metric), getattr(record, f"{metric}_currency"))
+            rows.append(row)
+        return cls(rows)
+
+    def save(self, path: str = STATS_FILE, table_path: str = TABLE_FILE) -> None:
+        # Written atomically, like the compensation table, since workers may load it while another process saves it
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump({"table": table_fingerprint(table_path), "rows": self.rows}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = STATS_FILE, table_path: str = TABLE_FILE) -> Optional["CompensationStats"]:
+        """The saved stats, or None when they are missing or were built from another compensation table"""
+        if not os.path.exists(path) or not os.path.exists(table_path):
+            return None
+        with open(path, "r", encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved.get("table") != table_fingerprint(table_path):
+            return None
+        return cls(saved["rows"])
+
+    def _group_column(self, field: str) -> np.ndarray:
+        return {"company": self.company, "level": self.level, "location": self.location,
+                "yoe": self.yoe_bucket, "year": self.year}[field]
+
+    def query(self, metric: str = "total_compensation", currency: str = "INR", company: Optional[List[str]] = None,
+              level: Optional[str] = None, location: Optional[str] = None, min_yoe: Optional[float] = None,
+              max_yoe: Optional[float] = None, since: Optional[str] = None, until: Optional[str] = None,
+              group_by: Optional[List[str]] = None, trend: bool = False, max_sources: int = 10) -> Dict:
+        """Percentiles, counts and (optionally) a per-year trend of one metric, per group of the filtered rows"""
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}, expected one of {', '.join(METRICS)}")
+        if currency not in FX_TO_USD:
+            raise ValueError(f"Unsupported currency {currency!r}, expected one of {', '.join(FX_TO_USD)}")
+        group_by = list(group_by or [])
+        unknown = [field for field in group_by if field not in GROUP_FIELDS]
+        if unknown:
+            raise ValueError(f"Cannot group by {', '.join(unknown)}, expected any of {', '.join(GROUP_FIELDS)}")
+
+        started = time.perf_counter()
+        values = self.amounts_usd[metric] / FX_TO_USD[currency]
+        mask = np.isfinite(values)
+        if company:
+            mask &= np.isin(self.company, list(company))
+        if level:
+            mask &= self.level == level
+        if location:
+            mask &= np.isin(self.location, list(INDIA_LOCATIONS)) if location == "india" else self.location == location
+        if min_yoe is not None:
+            mask &= self.yoe >= min_yoe
+        if max_yoe is not None:
+            mask &= self.yoe <= max_yoe
+        if since:
+            mask &= self.created >= np.datetime64(since, "D")
+        if until:
+            mask &= self.created <= np.datetime64(until, "D")
+
+        rows = np.flatnonzero(mask)
+        if group_by:
+            keys = self._group_column(group_by[0])[rows].astype(str)
+            for field in group_by[1:]:
+                keys = np.char.add(np.char.add(keys, "|"), self._group_column(field)[rows].astype(str))
+        else:
+            keys = np.zeros(len(rows), dtype=str)
+        group_keys, inverse = np.unique(keys, return_inverse=True)
+
+        # Sort once by (group, value): every group becomes a contiguous, already sorted slice
+        order = np.lexsort((values[rows], inverse))
+        sorted_rows, sorted_groups = rows[order], inverse[order]
+        bounds = np.searchsorted(sorted_groups, np.arange(len(group_keys) + 1))
+
+        groups = []
+        for g, key in enumerate(group_keys):
+            members = sorted_rows[bounds[g]:bounds[g + 1]]
+            group_values = values[members]
+            quantiles = np.percentile(group_values, PERCENTILES)
+            recent = members[np.argsort(self.created[members])[::-1]]
+            group = {
+                "group": dict(zip(group_by, str(key).split("|"))) if group_by else {},
+                "count": int(len(members)),
+                "mean": float(group_values.mean()),
+                "min": float(group_values[0]),
+                "max": float(group_values[-1]),
+                **{f"p{p}": float(q) for p, q in zip(PERCENTILES, quantiles)},
+                "topic_ids": [str(topic_id) for topic_id in self.topic_id[recent[:max_sources]]],
+                "sources": [url for url in self.url[recent[:max_sources]] if url],
+            }
+            if trend:
+                years, year_inverse = np.unique(self.year[members].astype(str), return_inverse=True)
+                group["trend"] = [
+                    {"year": year, "count": int((year_inverse == y).sum()),
+                     "p50": float(np.median(group_values[year_inverse == y]))}
+                    for y, year in enumerate(years) if year
+                ]
+            groups.append(group)
+        groups.sort(key=lambda group: group["count"], reverse=True)
+
+        return {
+            "metric": metric,
+            "currency": currency,
+            "filters": {key: value for key, value in {
+                "company": company, "level": level, "location": location, "min_yoe": min_yoe,
+                "max_yoe": max_yoe, "since": since, "until": until,
+            }.items() if value not in (None, [], "")},
+            "group_by": group_by,
+            "count": int(len(rows)),
+            "groups": groups,
+            "elapsed_ms": (time.perf_counter() - started) * 1000,
+        }
+
+
+def table_fingerprint(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def to_usd(amount: Optional[float], currency: str) -> float:
+    """Amount in USD, or NaN when it is missing, in an unknown currency or implausible"""
+    if amount is None or currency not in FX_TO_USD:
+        return np.nan
+    usd = amount * FX_TO_USD[currency]
+    return usd if PLAUSIBLE_USD[0] <= usd <= PLAUSIBLE_USD[1] else np.nan
+
+
+def parse_stats_query(query: str, known_companies) -> Optional[Dict]:
+    """Keyword arguments for CompensationStats.query() when the question asks for an aggregate, else None"""
+    filters = extract_query_filters(PERCENTILE_PATTERN.sub(" ", query), known_companies)
+    companies = filters.get("company", [])
+    years = sorted(set(YEAR_PATTERN.findall(query)))
+    trend = bool(TREND_PATTERN.search(query))
+    comparison = bool(COMPARE_PATTERN.search(query)) and len(companies) >= 2
+    if not (AGGREGATE_PATTERN.search(query) or comparison or (trend and len(years) >= 2)):
+        return None
+
+    params = {"metric": next((metric for metric, pattern in METRIC_PATTERNS if pattern.search(query)), "total_compensation")}
+    params.update({field: filters[field] for field in ("company", "level", "location") if field in filters})
+    yoe = YOE_PATTERN.search(query)
+    if yoe:
+        experience = float(yoe.group(1))
+        params["min_yoe"], params["max_yoe"] = max(experience - 1, 0), experience + 1
+
+    params["group_by"] = ["company"] if len(companies) >= 2 else []
+    if trend or len(years) >= 2:
+        params["trend"] = True
+    if years:
+        params["since"], params["until"] = f"{years[0]}-01-01", f"{years[-1]}-12-31"
+    return params
+
+
+def format_money(value: float, currency: str) -> str:
+    """Human-readable amount: lakhs/crores for INR, K/M otherwise (without a symbol when the currency is unknown)"""
+    if currency == "INR":
+        return f"₹{value / 1e7:.2f} Cr" if value >= 1e7 else f"₹{value / 1e5:.1f} L"
+    symbol = {"USD": "$", "EUR": "€", "GBP": "£", "": ""}.get(currency, f"{currency} ")
+    return f"{symbol}{value / 1e6:.2f}M" if value >= 1e6 else f"{symbol}{value / 1e3:.0f}K"
+
+
+def summarize_stats(result: Dict, max_groups: int = 5) -> str:
+    """Plain-language summary of a query() result"""
+    metric = result["metric"].replace("_", " ")
+    currency = result["currency"]
+    if not result["count"]:
+        return f"No posts with {metric} figures match this question."
+
+    filters = result["filters"]
+    scope = " ".join(part for part in (
+        "/".join(filters.get("company", [])).title(),
+        filters.get("level", "").upper(),
+        f"in {filters['location'].title()}" if filters.get("location") else "",
+        f"with {filters['min_yoe']:g}-{filters['max_yoe']:g} years of experience" if "max_yoe" in filters else "",
+    ) if part) or "All matching posts"
+
+    sentences = []
+    for group in result["groups"][:max_groups]:
+        label = ", ".join(value.title() or "unspecified" for value in group["group"].values()) or scope
+        sentences.append(
+            f"{label}: median {metric} "
+            f"{format_money(group['p50'], currency)} (p25 {format_money(group['p25'], currency)}, "
+            f"p75 {format_money(group['p75'], currency)}, p90 {format_money(group['p90'], currency)}) "
+            f"across {group['count']} posts."
+        )
+        if group.get("trend"):
+            sentences.append("By year: " + ", ".join(
+                f"{point['year']} {format_money(point['p50'], currency)} ({point['count']})" for point in group["trend"]
+            ) + ".")
+    sentences.append(f"Computed from {result['count']} LeetCode posts; amounts converted to {currency} at approximate rates.")
+    return " ".join(sentences)
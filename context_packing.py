@@ -0,0 +1,183 @@
+# context_packing.py
+# Context assembly between retrieval and the LLM. Retrieved chunks are merged back into one passage per post
+# (dropping the 100-char splitter overlap), the repeated "Title/Author/Created/..." header block is replaced
+# by one short source line, and passages are packed in rank order (optionally MMR-diversified) up to a token budget.
+
+import logging
+import math
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Header fields written by ingest.format_post; the title and date are kept in the source line instead
+HEADER_LINE_PATTERN = re.compile(r"^(Title|Author|Created|Tags|URL|Topic ID): .*$\n?", re.MULTILINE)
+# The scraped summary is the first few hundred characters of the content again
+SUMMARY_BLOCK_PATTERN = re.compile(r"^Summary: .*?(?=^Tags: |\Z)", re.MULTILINE | re.DOTALL)
+CONTENT_PREFIX_PATTERN = re.compile(r"^Content: ", re.MULTILINE)
+
+MAX_STRIPPED_GAP = 20  # Neighbouring chunks can be this far apart once the splitter strips whitespace
+MAX_OVERLAP_CHARS = 300  # Upper bound on the overlap between neighbouring chunks of one post
+MIN_TRUNCATED_TOKENS = 80  # Do not bother adding a passage that would be cut below this many tokens
+
+
+class TokenCounter:
+    """Token counts with the model's tiktoken encoding, falling back to ~4 characters per token
+    when the encoding cannot be loaded (tiktoken downloads it on first use)"""
+
+    def __init__(self, model: str = "gpt-4"):
+        try:
+            import tiktoken
+            self.encoding = tiktoken.encoding_for_model(model)
+        except Exception as e:
+            logging.warning(f"tiktoken encoding for {model} unavailable ({type(e).__name__}), estimating tokens from length.")
+            self.encoding = None
+
+    def count(self, text: str) -> int:
+        if self.encoding is None:
+            return math.ceil(len(text) / 4)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.encoding is None:
+            return text[:max_tokens * 4]
+        return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def merge_chunks(chunks: Sequence[Document]) -> str:
+    """Join chunks of one post, removing the text each chunk repeats from its neighbour.
+
+    Chunks carry their start offset in the post (ingest adds `start_index`), so they are stitched exactly;
+    chunks from indexes built before that are joined on their longest common edge instead.
+    """
+    if all(isinstance(chunk.metadata.get("start_index"), int) for chunk in chunks):
+        merged, end = "", None
+        for chunk in sorted(chunks, key=lambda chunk: chunk.metadata["start_index"]):
+            start, text = chunk.metadata["start_index"], chunk.page_content
+            if end is None:
+                merged = text
+            elif start <= end:
+                merged += text[end - start:]
+            elif start - end <= MAX_STRIPPED_GAP:
+                merged += "\n" + text  # Adjacent chunk; the splitter stripped the whitespace between them
+            else:
+                merged += "\n...\n" + text  # Chunks in between were not retrieved
+            end = max(end or 0, start + len(text))
+        return merged
+    return _merge_by_overlap([chunk.page_content for chunk in chunks])
+
+
+def _merge_by_overlap(texts: Sequence[str]) -> str:
+    merged = ""
+    for text in texts:
+        if not merged:
+            merged = text
+        elif text in merged:
+            continue
+        elif merged in text:
+            merged = text
+        else:
+            merged = _join_overlapping(merged, text)
+    return merged
+
+
+def _join_overlapping(first: str, second: str) -> str:
+    for size in range(min(MAX_OVERLAP_CHARS, len(first), len(second)), 0, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+        if second.endswith(first[:size]):
+            return second + first[size:]
+    return f"{first}\n\n{second}"
+
+
+def strip_boilerplate(text: str) -> str:
+    """Drop the per-post header block and the duplicated summary, keeping the post body"""
+    text = SUMMARY_BLOCK_PATTERN.sub("", text)
+    text = HEADER_LINE_PATTERN.sub("", text)
+    text = CONTENT_PREFIX_PATTERN.sub("", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def post_key(doc: Document) -> str:
+    """The post a chunk belongs to; a chunk without a topic_id (legacy index) is a post of its own"""
+    return str(doc.metadata.get("topic_id") or id(doc))
+
+
+def group_by_post(docs: Sequence[Document]) -> "OrderedDict[str, List[Document]]":
+    """Chunks grouped per post, posts in order of their best-ranked chunk"""
+    posts: "OrderedDict[str, List[Document]]" = OrderedDict()
+    for doc in docs:
+        posts.setdefault(post_key(doc), []).append(doc)
+    return posts
+
+
+def mmr_order(query_embedding: Sequence[float], embeddings: np.ndarray, mmr_lambda: float) -> List[int]:
+    """Maximal marginal relevance order: trade relevance to the query against similarity to what is already picked"""
+    def normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    vectors = normalize(np.asarray(embeddings, dtype=np.float32))
+    relevance = vectors @ normalize(np.asarray(query_embedding, dtype=np.float32))
+    similarity = vectors @ vectors.T
+
+    order = [int(np.argmax(relevance))]
+    remaining = set(range(len(vectors))) - set(order)
+    while remaining:
+        candidates = np.array(sorted(remaining))
+        redundancy = similarity[np.ix_(candidates, order)].max(axis=1)
+        scores = mmr_lambda * relevance[candidates] - (1 - mmr_lambda) * redundancy
+        best = int(candidates[np.argmax(scores)])
+        order.append(best)
+        remaining.remove(best)
+    return order
+
+
+def pack_context(docs: Sequence[Document], counter: TokenCounter, token_budget: int,
+                 query_embedding: Optional[Sequence[float]] = None,
+                 chunk_embeddings: Optional[Dict[str, Sequence[float]]] = None,
+                 mmr_lambda: Optional[float] = None) -> Dict:
+    """Build the prompt context from retrieved chunks.
+
+    With mmr_lambda, query_embedding and chunk_embeddings (keyed by chunk id), posts are ordered by MMR
+    over the mean of their chunk embeddings instead of by retrieval rank. Returns the context text plus
+    the posts and token count that went into it.
+    """
+    posts = group_by_post(docs)
+    passages = []
+    for topic_id, chunks in posts.items():
+        metadata = chunks[0].metadata
+        body = strip_boilerplate(merge_chunks(chunks))
+        source = f"[Post {topic_id}] {metadata.get('title', '')} ({(metadata.get('created_at') or '')[:10]})"
+        passages.append((topic_id, chunks, f"{source.strip()}\n{body}"))
+
+    if mmr_lambda is not None and query_embedding is not None and chunk_embeddings and len(passages) > 1:
+        post_vectors = []
+        for _, chunks, _ in passages:
+            vectors = [chunk_embeddings[key] for key in (chunk.metadata.get("chunk_id") or chunk.id for chunk in chunks)
+                       if key in chunk_embeddings]
+            post_vectors.append(np.mean(vectors, axis=0) if vectors else np.zeros(len(query_embedding)))
+        passages = [passages[i] for i in mmr_order(query_embedding, np.array(post_vectors), mmr_lambda)]
+
+    packed, topic_ids, used = [], [], 0
+    separator_tokens = counter.count("\n\n")
+    for topic_id, _, passage in passages:
+        tokens = counter.count(passage)
+        remaining = token_budget - used - (separator_tokens if packed else 0)
+        if tokens > remaining:
+            if remaining < MIN_TRUNCATED_TOKENS:
+                break
+            passage, tokens = counter.truncate(passage, remaining), remaining
+        packed.append(passage)
+        topic_ids.append(topic_id)
+        used += tokens + (separator_tokens if len(packed) > 1 else 0)
+
+    return {
+        "context": "\n\n".join(packed),
+        "topic_ids": topic_ids,
+        "tokens": used,
+        "chunks": len(docs),
+        "posts": len(posts),
+    }
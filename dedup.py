@@ -0,0 +1,135 @@
+# dedup.py
+# Near-duplicate post detection for ingestion: reposts, cross-posts and almost identical offer threads are
+# collapsed into one canonical post before chunking, so they stop taking several retrieval slots.
+# Posts are shingled into word 5-grams, summarized by MinHash signatures and bucketed with LSH (banding),
+# so only posts sharing a band are compared and the corpus is processed in near-linear time.
+
+import logging
+import re
+import time
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+SHINGLE_SIZE = 5  # Words per shingle
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 32  # 32 bands of 4 rows: pairs above ~0.42 Jaccard usually share a bucket, then get verified
+DEDUP_THRESHOLD = 0.8  # Estimated Jaccard similarity of the shingle sets to count as a duplicate
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """Hashes of the distinct word `size`-grams of a text (the whole text for shorter ones)"""
+    words = WORD_PATTERN.findall(text.replace("\\n", " ").lower())  # Scraped posts keep newlines escaped
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    grams = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """MinHash signatures from NUM_PERMUTATIONS random universal hash functions (a * x + b) mod p"""
+
+    def __init__(self, num_permutations: int = NUM_PERMUTATIONS, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        if len(hashes) == 0:
+            return np.full(len(self.a), MAX_HASH, dtype=np.uint64)
+        # The product wraps around 2^64, which scrambles the order of the inputs like a random permutation
+        return (((hashes[:, None] * self.a[None, :] + self.b[None, :]) % MERSENNE_PRIME) & MAX_HASH).min(axis=0)
+
+
+def find_duplicate_clusters(texts: List[str], threshold: float = DEDUP_THRESHOLD,
+                            bands: int = LSH_BANDS) -> List[List[int]]:
+    """Groups (of two or more indices into texts) whose shingle sets are estimated >= threshold Jaccard-similar"""
+    hasher = MinHasher()
+    signatures = np.stack([hasher.signature(shingles(text)) for text in texts]) if texts else np.zeros((0, NUM_PERMUTATIONS))
+    empty = [not WORD_PATTERN.search(text.lower()) for text in texts]
+    rows = signatures.shape[1] // bands
+
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    checked = set()
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = defaultdict(list)
+        for i in range(len(texts)):
+            if not empty[i]:
+                buckets[signatures[i, band * rows:(band + 1) * rows].tobytes()].append(i)
+        for members in buckets.values():
+            for position, j in enumerate(members):
+                for i in members[:position]:
+                    if (i, j) in checked or find(i) == find(j):
+                        continue
+                    checked.add((i, j))
+                    # Fraction of agreeing MinHash values estimates the Jaccard similarity
+                    if np.mean(signatures[i] == signatures[j]) >= threshold:
+                        parent[find(j)] = find(i)
+
+    clusters: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(texts)):
+        clusters[find(i)].append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def canonical_index(posts: List[Dict], members: List[int]) -> int:
+    """The post a cluster collapses into: the most detailed one, and the earliest of equally detailed ones"""
+    return min(members, key=lambda i: (-len(posts[i].get("content") or ""), posts[i].get("created_at") or "", i))
+
+
+def deduplicate_posts(posts: List[Dict], threshold: float = DEDUP_THRESHOLD) -> Tuple[List[Dict], Dict]:
+    """Drop near-duplicate posts, keeping one canonical post per cluster in corpus order.
+
+    The canonical post gets the other posts' URLs and topic ids as `alternate_urls` / `duplicate_topic_ids`.
+    Returns the kept posts and a report.
+    """
+    started = time.perf_counter()
+    clusters = find_duplicate_clusters([post.get("content") or "" for post in posts], threshold)
+
+    dropped = set()
+    alternates: Dict[int, List[int]] = {}
+    for members in clusters:
+        canonical = canonical_index(posts, members)
+        alternates[canonical] = [i for i in members if i != canonical]
+        dropped.update(alternates[canonical])
+
+    kept = []
+    for i, post in enumerate(posts):
+        if i in dropped:
+            continue
+        if i in alternates:
+            post = {
+                **post,
+                "alternate_urls": [posts[j]["url"] for j in alternates[i] if posts[j].get("url")],
+                "duplicate_topic_ids": [str(posts[j]["topic_id"]) for j in alternates[i]],
+            }
+        kept.append(post)
+
+    report = {
+        "posts": len(posts),
+        "kept": len(kept),
+        "duplicates": len(dropped),
+        "duplicate_ratio": len(dropped) / len(posts) if posts else 0.0,
+        "clusters": len(clusters),
+        "largest_cluster": max((len(members) for members in clusters), default=0),
+        "threshold": threshold,
+        "seconds": time.perf_counter() - started,
+    }
+    logging.info(
+        f"Dedup: {report['duplicates']} of {report['posts']} posts are near-duplicates in {report['clusters']} clusters "
+        f"({report['duplicate_ratio']:.1%}, {report['seconds']:.2f}s)."
+    )
+    return kept, report
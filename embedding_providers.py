@@ -0,0 +1,352 @@
+# embedding_providers.py
+# Pluggable embedding providers for ingestion and queries: OpenAI (remote) or a local ONNX sentence-transformers
+# model run on CPU. Both sit behind CachedEmbeddings, a persistent cache of query and chunk vectors (memory-mapped
+# float32 rows keyed by model and text hash, LRU-evicted) that also batches the texts it has to embed.
+
+import asyncio
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+PROVIDERS = ("openai", "local")
+DEFAULT_OPENAI_MODEL = "text-embedding-ada-002"
+# What indexes built before providers were recorded were embedded with
+LEGACY_EMBEDDING_IDENTITY = f"OpenAIEmbeddings:{DEFAULT_OPENAI_MODEL}"
+
+KEY_SIZE = 32  # sha256 digest of "<identity>\n<text>", stored as raw bytes (an all-zero row is free)
+
+
+def embedding_identity(embedding: Embeddings) -> str:
+    """Provider class and model of an embedding model, e.g. "OpenAIEmbeddings:text-embedding-ada-002".
+
+    Recorded in the ingest manifest, so an index is never queried with vectors from a different model.
+    """
+    if isinstance(embedding, CachedEmbeddings):
+        return embedding.identity
+    return f"{type(embedding).__name__}:{getattr(embedding, 'model', '')}"
+
+
+def create_embeddings(provider: str, model: str = "", model_path: str = "") -> Embeddings:
+    """The embedding model for a provider name: "openai" (model, default text-embedding-ada-002)
+    or "local" (an ONNX export in model_path)"""
+    if provider == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(model=model or DEFAULT_OPENAI_MODEL)
+    if provider == "local":
+        return LocalOnnxEmbeddings(model_path)
+    raise ValueError(f"Unknown embedding provider {provider!r}, expected one of {PROVIDERS}")
+
+
+class LocalOnnxEmbeddings(Embeddings):
+    """Sentence-transformers model exported to ONNX (model.onnx + tokenizer.json, e.g. all-MiniLM-L6-v2), run on CPU.
+
+    Texts are sorted by length and embedded in batches padded only to their longest member; token vectors are
+    mean-pooled over the attention mask and L2-normalized, as sentence-transformers does.
+    """
+
+    def __init__(self, model_path: str, batch_size: int = 32, max_length: int = 256):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError("The local embedding provider needs `pip install onnxruntime tokenizers`.") from e
+
+        onnx_file = next((path for path in (os.path.join(model_path, "model.onnx"), os.path.join(model_path, "onnx", "model.onnx"))
+                          if os.path.exists(path)), None)
+        if onnx_file is None:
+            raise RuntimeError(f"No model.onnx found in {model_path!r} (set LOCAL_EMBEDDING_MODEL_PATH).")
+
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        pad_token = next((token for token in ("[PAD]", "<pad>") if self.tokenizer.token_to_id(token) is not None), "[PAD]")
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+        self.onnx_file = onnx_file
+        self._session = None
+        self._session_pid = None
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        # The file hash is part of the identity, so re-exported weights under the same name are not mixed up
+        with open(onnx_file, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        self.model = f"{os.path.basename(os.path.normpath(model_path))}-{digest[:12]}"
+
+    @property
+    def session(self):
+        """The inference session of this process (onnxruntime thread pools do not survive fork())"""
+        if self._session is None or self._session_pid != os.getpid():
+            import onnxruntime
+            self._session = onnxruntime.InferenceSession(self.onnx_file, providers=["CPUExecutionProvider"])
+            self._session_pid = os.getpid()
+        return self._session
+
+    def _embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        output = self.session.run(None, feeds)[0]
+        if output.ndim == 3:  # Token embeddings: mean-pool over the real (unpadded) tokens
+            weights = attention_mask[..., None].astype(np.float32)
+            output = (output * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return (output / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        batches = [order[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        vectors = None
+        for batch in batches:
+            embedded = self._embed_batch([texts[i] for i in batch])
+            if vectors is None:
+                vectors = np.empty((len(texts), embedded.shape[1]), dtype=np.float32)
+            vectors[batch] = embedded
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class EmbeddingCache:
+    """On-disk embedding cache for one model: `max_entries` float32 rows in a memory-mapped file, plus memory-mapped
+    arrays of row keys (text hash) and last-use times for LRU eviction.
+
+    Other processes (e.g. the pre-forked serve.py workers) may share the files. Writers take an exclusive flock on
+    the cache's lock file and re-read the shared keys before claiming rows, so two processes never fill the same
+    row. Reads take no lock: a row's key is cleared before its vector is rewritten and checked again after a
+    read, so a reader never returns a vector that belongs to another text.
+    """
+
+    def __init__(self, cache_dir: str, identity: str, max_entries: int = 50000):
+        self.identity = identity
+        self.max_entries = max_entries
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9._-]+", "_", identity))
+        self.dimension: Optional[int] = None
+        self.vectors = self.keys = self.last_used = None
+        self.slots: Dict[bytes, int] = {}
+        self.free: List[int] = []  # Unused rows
+        self.lock = threading.Lock()  # Threads of this process; _file_lock() serializes writers across processes
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+        meta_path = os.path.join(self.directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("identity") == identity and meta.get("max_entries") == max_entries:
+                self._open(meta["dimension"], "r+")
+            else:
+                logging.warning(f"Embedding cache in {self.directory} has a different layout, starting it over.")
+
+    def _open(self, dimension: int, mode: str) -> None:
+        self.dimension = dimension
+        path = lambda name: os.path.join(self.directory, name)  # noqa: E731
+        self.vectors = np.memmap(path("vectors.f32"), dtype=np.float32, mode=mode, shape=(self.max_entries, dimension))
+        self.keys = np.memmap(path("keys.bin"), dtype=np.uint8, mode=mode, shape=(self.max_entries, KEY_SIZE))
+        self.last_used = np.memmap(path("last_used.f64"), dtype=np.float64, mode=mode, shape=(self.max_entries,))
+        self._sync_slots()
+
+    def _create(self, dimension: int) -> None:
+        meta_path = os.path.join(self.directory, "meta.json")
+        if os.path.exists(meta_path):  # Created by another process since we started
+            with open(meta_path, "r", encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("identity") == self.identity and meta.get("max_entries") == self.max_entries:
+                self._open(meta["dimension"], "r+")
+                return
+        self._open(dimension, "w+")
+        with open(os.path.join(self.directory, "meta.json"), "w", encoding='utf-8') as f:
+            json.dump({"identity": self.identity, "dimension": dimension, "max_entries": self.max_entries}, f)
+        logging.info(f"Created embedding cache for {self.identity} in {self.directory} ({self.max_entries} x {dimension}).")
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared by every process writing to this cache directory"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "lock"), "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _sync_slots(self) -> None:
+        """Reload the row map and free rows from the shared keys, which other processes may have changed"""
+        used = self.keys.any(axis=1)
+        self.slots = {self.keys[slot].tobytes(): int(slot) for slot in np.flatnonzero(used)}
+        self.free = np.flatnonzero(~used)[::-1].tolist()
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.identity}\n{text}".encode("utf-8")).digest()
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """Cached vectors for the keys, None where missing"""
+        found = []
+        with self.lock:
+            now = time.time()
+            for key in keys:
+                slot = self.slots.get(key)
+                vector = None
+                if slot is not None and self.keys[slot].tobytes() == key:
+                    vector = np.array(self.vectors[slot])
+                    if self.keys[slot].tobytes() != key:  # Rewritten by another process while we copied it
+                        vector = None
+                if vector is None:
+                    if slot is not None:
+                        del self.slots[key]
+                    self.stats["misses"] += 1
+                else:
+                    self.last_used[slot] = now
+                    self.stats["hits"] += 1
+                found.append(vector)
+        return found
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray) -> None:
+        """Store vectors, evicting the least recently used rows when the cache is full"""
+        if len(keys) == 0:
+            return
+        with self.lock, self._file_lock():
+            if self.vectors is None:
+                self._create(vectors.shape[1])
+            self._sync_slots()
+            new_keys = list(dict.fromkeys(key for key in keys if key not in self.slots))
+            evict = min(len(new_keys), self.max_entries) - len(self.free)
+            if evict > 0:
+                occupied = np.fromiter(self.slots.values(), dtype=np.int64)
+                victims = occupied[np.argpartition(self.last_used[occupied], evict - 1)[:evict]]
+                for slot in victims:
+                    del self.slots[self.keys[slot].tobytes()]
+                    self.keys[slot] = 0
+                    self.free.append(int(slot))
+                self.stats["evictions"] += evict
+            now = time.time()
+            rows = {key: vector for key, vector in zip(keys, vectors)}
+            for key in new_keys[-self.max_entries:]:
+                if not self.free:
+                    break
+                slot = self.free.pop()
+                self.keys[slot] = 0  # Invalidate before the vector changes, then publish the key
+                self.vectors[slot] = rows[key]
+                self.keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self.last_used[slot] = now
+                self.slots[key] = slot
+
+    def flush(self) -> None:
+        with self.lock:
+            for array in (self.vectors, self.keys, self.last_used):
+                if array is not None:
+                    array.flush()
+
+
+class CachedEmbeddings(Embeddings):
+    """An embedding model behind an EmbeddingCache.
+
+    Only texts missing from the cache are embedded, `batch_size` at a time. Concurrent aembed_query calls are
+    group-committed: while one request to the provider is in flight, newly arriving queries queue up and are
+    then embedded together in a single call.
+    """
+
+    def __init__(self, embedding: Embeddings, cache: EmbeddingCache, batch_size: int = 256):
+        self.embedding = embedding
+        self.cache = cache
+        self.identity = cache.identity
+        self.batch_size = batch_size
+        self.model = getattr(embedding, "model", "")
+        self._pending: List[tuple] = []  # (text, key, future) waiting for the next provider call
+        self._flushing = False
+        self._flush_tasks = set()  # Running _flush_pending() tasks, referenced so they are not collected mid-flight
+        self.stats = {"provider_calls": 0, "embedded_texts": 0}
+
+    def _lookup(self, texts: List[str]) -> tuple:
+        keys = [self.cache.key(text) for text in texts]
+        return keys, self.cache.get_many(keys)
+
+    def _store(self, keys: List[bytes], vectors: List[List[float]]) -> np.ndarray:
+        array = np.asarray(vectors, dtype=np.float32)
+        self.cache.put_many(keys, array)
+        self.stats["provider_calls"] += 1
+        self.stats["embedded_texts"] += len(keys)
+        return array
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found = self._lookup(texts)
+        missing = list(dict.fromkeys(i for i, vector in enumerate(found) if vector is None))
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            vectors = self._store([keys[i] for i in batch], self.embedding.embed_documents([texts[i] for i in batch]))
+            for i, vector in zip(batch, vectors):
+                found[i] = vector
+        return [vector.tolist() for vector in found]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found = self._lookup(texts)
+        missing = [i for i, vector in enumerate(found) if vector is None]
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            vectors = await self.embedding.aembed_documents([texts[i] for i in batch])
+            # The cache write takes a file lock and rescans the shared keys: keep it off the event loop
+            vectors = await asyncio.to_thread(self._store, [keys[i] for i in batch], vectors)
+            for i, vector in zip(batch, vectors):
+                found[i] = vector
+        return [vector.tolist() for vector in found]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, found = self._lookup([text])
+        if found[0] is not None:
+            return found[0].tolist()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, keys[0], future))
+        if not self._flushing:
+            self._flushing = True
+            task = asyncio.ensure_future(self._flush_pending())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_done)
+        return await future
+
+    def _flush_done(self, task: asyncio.Task) -> None:
+        self._flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("Embedding queued queries failed", exc_info=task.exception())
+
+    async def _flush_pending(self) -> None:
+        """Embed queued queries, one provider call per batch, until the queue is empty"""
+        try:
+            while self._pending:
+                batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                unique = {key: text for text, key, _ in batch}
+                try:
+                    vectors = await self.embedding.aembed_documents(list(unique.values()))
+                    vectors = await asyncio.to_thread(self._store, list(unique), vectors)
+                except Exception as e:
+                    for _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                by_key = dict(zip(unique, vectors))
+                for _, key, future in batch:
+                    if not future.done():
+                        future.set_result(by_key[key].tolist())
+        finally:
+            self._flushing = False
+
+    def get_stats(self) -> Dict:
+        return {"identity": self.identity, "entries": len(self.cache), **self.cache.stats, **self.stats}
@@ -0,0 +1,153 @@
+package main
+
+// Benchmarks for the gateway against a stub Python agent (no Python, no OpenAI):
+//
+//	go test -run '^$' -bench . -benchmem main.go gateway_bench_test.go
+
+import (
+	"bytes"
+	"encoding/json"
+	"fmt"
+	"io"
+	"log"
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"sync/atomic"
+	"testing"
+	"time"
+)
+
+func TestMain(m *testing.M) {
+	log.SetOutput(io.Discard) // Per-request gateway logging would drown the benchmark output
+	os.Exit(m.Run())
+}
+
+// stubAgent answers /ready and /query like the Python agent, after delay, and counts /query calls
+func stubAgent(b testing.TB, delay time.Duration) (*httptest.Server, *atomic.Int64) {
+	calls := &atomic.Int64{}
+	body, _ := json.Marshal(map[string]interface{}{
+		"response":          "For SDE II at Google in Bangalore, total compensation is around 45-60 LPA.",
+		"compensation_data": []interface{}{},
+		"source_links":      []string{"https://leetcode.com/discuss/post/123"},
+	})
+	server := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		if r.URL.Path == "/ready" {
+			w.WriteHeader(http.StatusOK)
+			return
+		}
+		io.Copy(io.Discard, r.Body)
+		calls.Add(1)
+		time.Sleep(delay)
+		w.Header().Set("Content-Type", "application/json")
+		w.Header().Set("Server-Timing", "llm;dur=1.0")
+		w.Write(body)
+	}))
+	b.Cleanup(server.Close)
+	return server, calls
+}
+
+// startGateway runs the gateway in front of the given agents
+func startGateway(b testing.TB, cacheTTL time.Duration, agents ...*httptest.Server) *httptest.Server {
+	cfg := config{
+		upstreamTimeout:     10 * time.Second,
+		maxInflightPerAgent: 1024,
+		cacheTTL:            cacheTTL,
+		cacheMaxEntries:     1000,
+		maxResponseBytes:    1 << 20,
+	}
+	for _, agent := range agents {
+		cfg.agentURLs = append(cfg.agentURLs, agent.URL)
+	}
+	g := newGateway(cfg)
+	g.pool.checkHealth()
+	server := httptest.NewServer(g.routes())
+	b.Cleanup(server.Close)
+	return server
+}
+
+// legacyGateway is the previous forwarding path: http.Post with the default client for every request
+func legacyGateway(b *testing.B, agent *httptest.Server) *httptest.Server {
+	server := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		var req QueryRequest
+		json.NewDecoder(r.Body).Decode(&req)
+		agentReq, _ := json.Marshal(req)
+		rsp, err := http.Post(agent.URL+"/query", "application/json", bytes.NewBuffer(agentReq))
+		if err != nil {
+			http.Error(w, "Failed to contact agent", http.StatusInternalServerError)
+			return
+		}
+		defer rsp.Body.Close()
+		body, _ := io.ReadAll(rsp.Body)
+		w.Header().Set("Content-Type", "application/json")
+		w.Write(body)
+	}))
+	b.Cleanup(server.Close)
+	return server
+}
+
+// runClients sends POST /query from parallel clients; query(i) picks the question for the i-th request
+func runClients(b *testing.B, url string, query func(i int64) string) {
+	client := &http.Client{Transport: &http.Transport{MaxIdleConnsPerHost: 256}}
+	var next, failed atomic.Int64
+	b.SetParallelism(16)
+	b.ResetTimer()
+	b.RunParallel(func(pb *testing.PB) {
+		for pb.Next() {
+			body, _ := json.Marshal(QueryRequest{Query: query(next.Add(1))})
+			rsp, err := client.Post(url+"/query", "application/json", bytes.NewReader(body))
+			if err != nil {
+				failed.Add(1)
+				continue
+			}
+			io.Copy(io.Discard, rsp.Body)
+			rsp.Body.Close()
+			if rsp.StatusCode != http.StatusOK {
+				failed.Add(1)
+			}
+		}
+	})
+	b.StopTimer()
+	if failed.Load() > 0 {
+		b.Fatalf("%d of %d requests failed", failed.Load(), b.N)
+	}
+}
+
+func uniqueQuery(i int64) string {
+	return fmt.Sprintf("What is the compensation for SDE II at Google in Bangalore? #%d", i)
+}
+
+// Every request is a cache miss: the cost of proxying over pooled keep-alive connections
+func BenchmarkGatewayUniqueQueries(b *testing.B) {
+	agent, _ := stubAgent(b, time.Millisecond)
+	runClients(b, startGateway(b, 0, agent).URL, uniqueQuery)
+}
+
+// The same forwarding with the old default-client http.Post, for comparison with BenchmarkGatewayUniqueQueries
+func BenchmarkLegacyGatewayUniqueQueries(b *testing.B) {
+	agent, _ := stubAgent(b, time.Millisecond)
+	runClients(b, legacyGateway(b, agent).URL, uniqueQuery)
+}
+
+// Requests spread over two agents by least in-flight requests
+func BenchmarkGatewayTwoAgents(b *testing.B) {
+	first, firstCalls := stubAgent(b, time.Millisecond)
+	second, secondCalls := stubAgent(b, time.Millisecond)
+	runClients(b, startGateway(b, 0, first, second).URL, uniqueQuery)
+	total := float64(firstCalls.Load() + secondCalls.Load())
+	b.ReportMetric(float64(secondCalls.Load())/total, "second-agent-share")
+}
+
+// Fifty popular questions asked over and over: answered from the TTL cache after the first call each
+func BenchmarkGatewayCachedQueries(b *testing.B) {
+	agent, calls := stubAgent(b, 20*time.Millisecond)
+	runClients(b, startGateway(b, time.Minute, agent).URL, func(i int64) string { return uniqueQuery(i % 50) })
+	b.ReportMetric(float64(calls.Load())/float64(b.N), "upstream-calls/op")
+}
+
+// Identical questions in flight at the same time, cache disabled: singleflight sends one upstream call per wave
+func BenchmarkGatewayIdenticalConcurrentQueries(b *testing.B) {
+	agent, calls := stubAgent(b, 20*time.Millisecond)
+	runClients(b, startGateway(b, 0, agent).URL, func(i int64) string { return uniqueQuery(0) })
+	b.ReportMetric(float64(calls.Load())/float64(b.N), "upstream-calls/op")
+}
@@ -0,0 +1,169 @@
+package main
+
+// Tests for the gateway's singleflight and response cache (run together with the benchmarks' stub agent):
+//
+//	go test -v main.go gateway_bench_test.go gateway_test.go
+
+import (
+	"bytes"
+	"context"
+	"encoding/json"
+	"fmt"
+	"io"
+	"net/http"
+	"sync"
+	"sync/atomic"
+	"testing"
+	"time"
+)
+
+// postQuery sends one POST /query and returns the status, X-Cache header and body
+func postQuery(t *testing.T, url, query string) (int, string, string) {
+	body, _ := json.Marshal(QueryRequest{Query: query})
+	rsp, err := http.Post(url+"/query", "application/json", bytes.NewReader(body))
+	if err != nil {
+		t.Errorf("POST /query: %v", err)
+		return 0, "", ""
+	}
+	defer rsp.Body.Close()
+	answer, _ := io.ReadAll(rsp.Body)
+	return rsp.StatusCode, rsp.Header.Get("X-Cache"), string(answer)
+}
+
+func TestFlightGroupRunsOneCallForConcurrentCallers(t *testing.T) {
+	group := &flightGroup{flights: map[string]*flight{}}
+	release := make(chan struct{})
+	var calls atomic.Int64
+	var sharedCount atomic.Int64
+	var wg sync.WaitGroup
+	for i := 0; i < 10; i++ {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			response, err, shared := group.do(context.Background(), "google l4", func() (*cachedResponse, error) {
+				calls.Add(1)
+				<-release
+				return &cachedResponse{status: http.StatusOK, body: []byte("answer")}, nil
+			})
+			if err != nil || string(response.body) != "answer" {
+				t.Errorf("got %v, %v", response, err)
+			}
+			if shared {
+				sharedCount.Add(1)
+			}
+		}()
+	}
+	time.Sleep(50 * time.Millisecond) // Let every caller join the first one's call
+	close(release)
+	wg.Wait()
+
+	if calls.Load() != 1 || sharedCount.Load() != 9 {
+		t.Fatalf("calls = %d, shared = %d; want 1 call shared by 9 callers", calls.Load(), sharedCount.Load())
+	}
+	if len(group.flights) != 0 {
+		t.Fatalf("finished flight was not removed: %v", group.flights)
+	}
+}
+
+func TestFlightGroupWaiterStopsOnItsOwnCancellation(t *testing.T) {
+	group := &flightGroup{flights: map[string]*flight{}}
+	release := make(chan struct{})
+	go group.do(context.Background(), "key", func() (*cachedResponse, error) {
+		<-release
+		return &cachedResponse{status: http.StatusOK}, nil
+	})
+	time.Sleep(10 * time.Millisecond)
+
+	ctx, cancel := context.WithCancel(context.Background())
+	cancel()
+	if _, err, shared := group.do(ctx, "key", nil); err != context.Canceled || !shared {
+		t.Fatalf("got err = %v, shared = %v; want the waiter's own cancellation", err, shared)
+	}
+	close(release)
+}
+
+func TestGatewaySendsIdenticalConcurrentQueriesUpstreamOnce(t *testing.T) {
+	agent, calls := stubAgent(t, 100*time.Millisecond)
+	url := startGateway(t, 0, agent).URL // Cache disabled: only singleflight can share the call
+
+	queries := []string{"Google L4 pay", "google l4 pay", "  GOOGLE   L4 PAY ", "Google L4 pay"}
+	statuses := make([]string, len(queries))
+	var wg sync.WaitGroup
+	for i, query := range queries {
+		wg.Add(1)
+		go func(i int, query string) {
+			defer wg.Done()
+			status, cacheStatus, _ := postQuery(t, url, query)
+			statuses[i] = fmt.Sprintf("%d %s", status, cacheStatus)
+		}(i, query)
+	}
+	wg.Wait()
+
+	if calls.Load() != 1 {
+		t.Fatalf("agent got %d calls, want 1", calls.Load())
+	}
+	counts := map[string]int{}
+	for _, status := range statuses {
+		counts[status]++
+	}
+	if counts["200 MISS"] != 1 || counts["200 SHARED"] != len(queries)-1 {
+		t.Fatalf("got %v, want one MISS and the rest SHARED", statuses)
+	}
+
+	postQuery(t, url, "Google L4 pay") // Not in flight any more, and nothing was cached
+	if calls.Load() != 2 {
+		t.Fatalf("agent got %d calls, want 2", calls.Load())
+	}
+}
+
+func TestGatewayAnswersRepeatedQueriesFromTheCache(t *testing.T) {
+	agent, calls := stubAgent(t, time.Millisecond)
+	url := startGateway(t, time.Minute, agent).URL
+
+	_, first, body := postQuery(t, url, "Google L4 pay")
+	_, second, cached := postQuery(t, url, "google  L4 PAY")
+	if first != "MISS" || second != "HIT" || cached != body || calls.Load() != 1 {
+		t.Fatalf("got %s then %s with %d agent calls, want MISS then HIT with 1", first, second, calls.Load())
+	}
+}
+
+func TestResponseCacheEvictsTheLeastRecentlyUsed(t *testing.T) {
+	cache := newResponseCache(time.Minute, 2)
+	cache.put("a", &cachedResponse{body: []byte("a")})
+	cache.put("b", &cachedResponse{body: []byte("b")})
+	cache.get("a") // "b" is now the least recently used
+	cache.put("c", &cachedResponse{body: []byte("c")})
+
+	if _, ok := cache.get("b"); ok {
+		t.Fatal("least recently used entry was kept")
+	}
+	for _, key := range []string{"a", "c"} {
+		if response, ok := cache.get(key); !ok || string(response.body) != key {
+			t.Fatalf("entry %q was evicted", key)
+		}
+	}
+	if cache.len() != 2 {
+		t.Fatalf("cache holds %d entries, want 2", cache.len())
+	}
+}
+
+func TestResponseCacheExpiresEntriesAfterTTL(t *testing.T) {
+	cache := newResponseCache(30*time.Millisecond, 10)
+	cache.put("a", &cachedResponse{body: []byte("a")})
+	if _, ok := cache.get("a"); !ok {
+		t.Fatal("fresh entry missing")
+	}
+	time.Sleep(50 * time.Millisecond)
+	if _, ok := cache.get("a"); ok {
+		t.Fatal("expired entry was returned")
+	}
+	if cache.len() != 0 {
+		t.Fatalf("expired entry was not dropped: %d entries", cache.len())
+	}
+
+	disabled := newResponseCache(0, 10)
+	disabled.put("a", &cachedResponse{})
+	if disabled.len() != 0 {
+		t.Fatal("CACHE_TTL=0 still cached an answer")
+	}
+}
@@ -0,0 +1,376 @@
+# hybrid_retrieval.py
+# Hybrid retrieval for the RAG agent: structured metadata filters extracted from the query
+# (company, location, level) drive Chroma `where` filters, an in-process BM25 index covers
+# titles, tags and content, and the dense and keyword rankings are merged with reciprocal rank fusion.
+
+import asyncio
+import hashlib
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from compensation_extractor import GENERIC_TAGS, KNOWN_LOCATIONS, LOCATION_PATTERN
+
+# Spelling variants mapped to one canonical company key
+COMPANY_ALIASES = {
+    "j.p. morgan": "jpmorgan", "jp morgan": "jpmorgan", "jp morgan chase": "jpmorgan", "jpmc": "jpmorgan",
+    "jpmorgan chase": "jpmorgan", "walmart labs": "walmart", "walmart global tech": "walmart",
+    "visa inc": "visa", "facebook": "meta", "aws": "amazon", "goldman": "goldman sachs", "gs": "goldman sachs",
+    "msft": "microsoft", "oracle cerner": "oracle",
+}
+
+LOCATION_ALIASES = {
+    "bengaluru": "bangalore", "banglore": "bangalore", "blr": "bangalore", "gurugram": "gurgaon",
+    "nyc": "new york", "wfh": "remote",
+}
+
+# Short aliases that are also ordinary words ("tell us about ..."): only a place when written in capitals
+# or after a preposition ("in the us", "from sf")
+CONTEXT_LOCATION_ALIASES = {"us": "usa", "sf": "san francisco"}
+LOCATION_CONTEXT = r"\b(?:in|at|from|to|within|across|based in)\s+(?:the\s+)?"
+
+# Locations read from an alias or from "remote" are weak signals: their filter is relaxed first
+WEAK_LOCATIONS = {"remote"}
+
+# Level spellings: "SDE-2", "SDE II", "L5", "E4", "IC3", "SMTS", ...
+# A bare "i"/"p" is a word or a percentile ("I 3 offers", "p90 TC"): only "i3", "i10" and "p4" written together count
+LEVEL_PATTERN = re.compile(
+    r"\b(?:sde|swe|se)\s*[-_ ]?\s*(?P<sde>iii|ii|i|[1-3])\b"
+    r"|\b(?P<ladder>[le]c?|[ip]c)\s*[-_ ]?\s*(?P<ladder_num>[1-9]0?)\b"
+    r"|\b(?P<attached>i(?=[1-9]0?\b)|p(?=[1-9]\b))(?P<attached_num>[1-9]0?)\b"
+    r"|\b(?P<named>smts|lmts|pmts|mts|sse|staff|principal|intern)\b",
+    re.IGNORECASE
+)
+ROMAN = {"i": "1", "ii": "2", "iii": "3"}
+
+# Companies whose ladder is numbered in tens ("Atlassian P40"): next to them "p40" is a level, not a percentile
+TENS_LADDER_COMPANIES = {"atlassian"}
+TENS_LADDER_COMPANY_PATTERN = re.compile(r"\b(" + "|".join(TENS_LADDER_COMPANIES) + r")\b", re.IGNORECASE)
+TENS_LEVEL_PATTERN = re.compile(r"\bp\s*[-_]?\s*([2-8]0)\b", re.IGNORECASE)
+
+# Values the extractor sometimes picks up as a company name
+NOT_COMPANIES = GENERIC_TAGS | {
+    "offer", "offers", "offer evaluation", "help", "startup", "confidential", "not specified", "n/a", "na",
+    "e-commerce", "mnc", "fintech", "top fintech", "product based", "leetcode", "ctc", "tc", "base", "salary",
+    "compensation details", "faang", "faang company", "big product based company", "need advice", "urgent help",
+    "general discussion", "offer comparison", "offer eval", "job switch", "service based", "product based mnc",
+    "faang based", "saas startup", "placement", "withheld", "united states", "python", "typescript",
+    "machine learning", "behavioral", "pbc", "tree",
+}
+
+# Employers whose names are also ordinary words ("is this even good", "my target CTC"):
+# a query only names them when capitalized
+COMMON_WORD_COMPANIES = {"even", "progress", "target", "slice", "grab", "hike", "motive", "indeed", "visa"}
+
+# A company key needs this many posts before queries can filter on it; one-off keys are mostly extraction noise
+MIN_COMPANY_POSTS = 2
+
+# Trailing words that are part of a post title rather than the company name ("Amazon Offer", "Google L4",
+# "Microsoft Bangalore", "Tekion Corp")
+COMPANY_NOISE_PATTERN = re.compile(
+    r"[\s.,:;|/-]+(offers?|interview( experience)?|compensation( details)?|evaluation|sde.*|swe.*|vs .*|or .*|"
+    r"inc|corp|pvt ltd|private limited|[lei]\d+|ict\d|cs\d|sse|s?mts|vp|"
+    + "|".join(re.escape(location.lower()) for location in KNOWN_LOCATIONS) + r")[\s.]*$"
+)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "for", "from", "how", "in", "is", "it", "me", "of", "on", "or", "the",
+    "to", "vs", "what", "which", "with", "show", "give", "posts", "post", "tell", "about", "much",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_company(name: str) -> str:
+    """Canonical company key, or "" when the name is not really a company"""
+    key = " ".join(name.lower().replace(",", " ").split())
+    stripped = COMPANY_NOISE_PATTERN.sub("", key)
+    while stripped != key:  # "Google L4 Bangalore Offer" carries several suffixes
+        key, stripped = stripped, COMPANY_NOISE_PATTERN.sub("", stripped)
+    if len(key) < 2 or key in NOT_COMPANIES or LOCATION_PATTERN.fullmatch(key) or len(key.split()) > 4:
+        return ""
+    return COMPANY_ALIASES.get(key, key)
+
+
+def filterable_companies(post_companies: Iterable[str], min_posts: int = MIN_COMPANY_POSTS) -> Set[str]:
+    """Company keys (one per post) that queries may filter on: those of at least min_posts posts"""
+    counts = Counter(company for company in post_companies if company)
+    return {company for company, count in counts.items() if count >= min_posts}
+
+
+def find_location(text: str) -> Tuple[str, bool]:
+    """Canonical city/country for the first known location mentioned in text ("" if none), and whether
+    it was named outright (False for aliases and other weak signals)"""
+    match = LOCATION_PATTERN.search(text or "")
+    if match:
+        location = match.group(1).lower()
+        return LOCATION_ALIASES.get(location, location), location not in WEAK_LOCATIONS
+    for alias, canonical in LOCATION_ALIASES.items():
+        if re.search(rf"\b{re.escape(alias)}\b", text or "", re.IGNORECASE):
+            return canonical, False
+    for alias, canonical in CONTEXT_LOCATION_ALIASES.items():
+        if re.search(rf"\b{alias.upper()}\b", text or "") or re.search(rf"{LOCATION_CONTEXT}{alias}\b", text or "", re.IGNORECASE):
+            return canonical, False
+    return "", False
+
+
+def normalize_location(text: str) -> str:
+    """Canonical city/country for the first known location mentioned in text ("" if none)"""
+    return find_location(text)[0]
+
+
+def extract_level(text: str) -> str:
+    """Canonical level token ("sde2", "l5", "e4", "ic3", "smts", ...) for the first level mentioned"""
+    text = text or ""
+    if TENS_LADDER_COMPANY_PATTERN.search(text):
+        tens = TENS_LEVEL_PATTERN.search(text)
+        if tens:
+            return "p" + tens.group(1)
+    match = LEVEL_PATTERN.search(text)
+    if not match:
+        return ""
+    if match.group("sde"):
+        return "sde" + ROMAN.get(match.group("sde").lower(), match.group("sde"))
+    if match.group("ladder"):
+        return match.group("ladder").lower() + match.group("ladder_num")
+    if match.group("attached"):
+        return match.group("attached").lower() + match.group("attached_num")
+    return match.group("named").lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def extract_query_filters(query: str, known_companies: Set[str]) -> Dict:
+    """Pull company, location and level constraints out of a free-text query"""
+    lowered = f" {' '.join(query.lower().split())} "
+    companies = set()
+    for name in sorted(set(known_companies) | set(COMPANY_ALIASES), key=len, reverse=True):
+        if not name or not re.search(rf"(?<![a-z0-9]){re.escape(name)}(?![a-z0-9])", lowered):
+            continue
+        mentions = re.findall(rf"(?<![A-Za-z0-9]){re.escape(name)}(?![A-Za-z0-9])", query, re.IGNORECASE)
+        if name in COMMON_WORD_COMPANIES and all(mention.islower() for mention in mentions):
+            continue
+        companies.add(normalize_company(name))
+    filters = {}
+    if companies:
+        filters["company"] = sorted(companies)
+    location = normalize_location(query)
+    if location:
+        filters["location"] = location
+    level = extract_level(query)
+    if level:
+        filters["level"] = level
+    return filters
+
+
+def to_chroma_where(filters: Dict) -> Optional[Dict]:
+    """Translate extracted filters into a Chroma `where` clause"""
+    clauses = []
+    if filters.get("company"):
+        companies = filters["company"]
+        clauses.append({"company": companies[0]} if len(companies) == 1 else {"company": {"$in": companies}})
+    for field in ("location", "level"):
+        if filters.get(field):
+            clauses.append({field: filters[field]})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def weak_filters(query: str) -> List[str]:
+    """Filter fields extracted from weak signals in the query (a location only implied by an alias)"""
+    location, named = find_location(query)
+    return ["location"] if location and not named else []
+
+
+def relaxations(filters: Dict, weak: Sequence[str] = ()) -> List[Dict]:
+    """Filters from most to least specific: fields from weak signals are dropped first, then level,
+    then location, then company"""
+    steps = [dict(filters)]
+    for field in [*weak, *(field for field in ("level", "location", "company") if field not in weak)]:
+        if field in steps[-1]:
+            relaxed = dict(steps[-1])
+            del relaxed[field]
+            steps.append(relaxed)
+    if steps[-1]:
+        steps.append({})
+    return steps
+
+
+def matches_filters(metadata: Dict, filters: Dict) -> bool:
+    if filters.get("company") and metadata.get("company") not in filters["company"]:
+        return False
+    for field in ("location", "level"):
+        if filters.get(field) and metadata.get(field) != filters[field]:
+            return False
+    return True
+
+
+def doc_key(doc: Document) -> str:
+    """Stable identity of a chunk across the dense and keyword result lists"""
+    return doc.metadata.get("chunk_id") or doc.id or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = 60) -> List[Document]:
+    """Merge ranked lists: each document scores sum(1 / (k + rank)) over the lists it appears in"""
+    scores: Dict[str, float] = defaultdict(float)
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc_key(doc)
+            scores[key] += 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def dense_search_many(vectorstore, query_embeddings: List[List[float]], k: int,
+                      where: Optional[Dict] = None) -> List[List[Document]]:
+    """Nearest chunks for several query embeddings in one Chroma query"""
+    if not query_embeddings:
+        return []
+    result = vectorstore._collection.query(
+        query_embeddings=query_embeddings, n_results=k, where=where, include=["documents", "metadatas"]
+    )
+    return [
+        [Document(id=chunk_id, page_content=text or "", metadata=metadata or {})
+         for chunk_id, text, metadata in zip(ids, texts, metadatas)]
+        for ids, texts, metadatas in zip(result["ids"], result["documents"], result["metadatas"])
+    ]
+
+
+class KeywordIndex:
+    """In-memory BM25 inverted index over chunk content plus post title, tags and structured metadata"""
+
+    def __init__(self, docs: List[Document], k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        self.companies = filterable_companies(
+            {doc.metadata.get("topic_id"): doc.metadata.get("company") for doc in docs}.values()
+        )
+
+        postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        lengths = np.zeros(len(docs), dtype=np.float32)
+        for i, doc in enumerate(docs):
+            tokens = tokenize(self._index_text(doc))
+            lengths[i] = len(tokens)
+            for token in tokens:
+                postings[token][i] = postings[token].get(i, 0) + 1
+
+        self.doc_lengths = lengths
+        self.avg_length = float(lengths.mean()) if len(docs) else 0.0
+        self.postings = {
+            token: (np.fromiter(entries.keys(), dtype=np.int32), np.fromiter(entries.values(), dtype=np.float32))
+            for token, entries in postings.items()
+        }
+        self.idf = {
+            token: math.log(1 + (len(docs) - len(ids) + 0.5) / (len(ids) + 0.5))
+            for token, (ids, _) in self.postings.items()
+        }
+
+    @staticmethod
+    def _index_text(doc: Document) -> str:
+        metadata = doc.metadata
+        fields = [metadata.get(field, "") for field in ("title", "tags", "company", "location", "level")]
+        return " ".join(fields + [doc.page_content])
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore) -> "KeywordIndex":
+        """Build the index from the chunks already stored in Chroma (no corpus re-chunking needed)"""
+        stored = vectorstore.get(include=["documents", "metadatas"])
+        docs = [
+            Document(id=chunk_id, page_content=text or "", metadata=metadata or {})
+            for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        ]
+        return cls(docs)
+
+    def search(self, query: str, k: int = 20, filters: Optional[Dict] = None) -> List[Document]:
+        if not self.docs:
+            return []
+        query_tokens = tokenize(query)
+        level = extract_level(query)
+        if level:
+            query_tokens.append(level)
+
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        for token in set(query_tokens):
+            if token not in self.postings:
+                continue
+            ids, tf = self.postings[token]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[ids] / self.avg_length)
+            scores[ids] += self.idf[token] * tf * (self.k1 + 1) / (tf + norm)
+
+        results = []
+        for i in np.argsort(-scores):
+            if scores[i] <= 0 or len(results) >= k:
+                break
+            if filters and not matches_filters(self.docs[i].metadata, filters):
+                continue
+            results.append(self.docs[i])
+        return results
+
+
+class HybridRetriever(BaseRetriever):
+    """Metadata-filtered dense search fused with BM25 keyword search via reciprocal rank fusion.
+
+    Filters extracted from the query are applied to both searches; when they leave fewer than
+    k candidates they are relaxed (level, then location, then company) so narrow queries still answer.
+    """
+
+    vectorstore: object
+    keyword_index: KeywordIndex
+    k: int = 5
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def fuse_many(self, queries: List[str], query_embeddings: List[List[float]]) -> List[List[Document]]:
+        """Retrieve for several queries at once.
+
+        Queries that currently share a `where` clause are searched together in one Chroma query,
+        so a batch costs one round-trip per distinct filter (per relaxation step) rather than per query.
+        """
+        steps = [
+            relaxations(extract_query_filters(query, self.keyword_index.companies), weak_filters(query))
+            for query in queries
+        ]
+        level = [0] * len(queries)
+        results: List[List[Document]] = [[] for _ in queries]
+        pending = list(range(len(queries)))
+        while pending:
+            groups: Dict[str, List[int]] = defaultdict(list)
+            for i in pending:
+                groups[repr(to_chroma_where(steps[i][level[i]]))].append(i)
+
+            pending = []
+            for members in groups.values():
+                where = to_chroma_where(steps[members[0]][level[members[0]]])
+                dense_lists = dense_search_many(
+                    self.vectorstore, [query_embeddings[i] for i in members], self.fetch_k, where
+                )
+                for i, dense in zip(members, dense_lists):
+                    sparse = self.keyword_index.search(queries[i], k=self.fetch_k, filters=steps[i][level[i]])
+                    results[i] = reciprocal_rank_fusion([dense, sparse], k=self.rrf_k)[:self.k]
+                    enough = len({doc_key(doc) for doc in dense + sparse}) >= self.k
+                    if not enough and level[i] + 1 < len(steps[i]):
+                        level[i] += 1
+                        pending.append(i)
+        return results
+
+    def _fuse(self, query: str, query_embedding: List[float]) -> List[Document]:
+        return self.fuse_many([query], [query_embedding])[0]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self._fuse(query, self.vectorstore.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        query_embedding = await self.vectorstore.embeddings.aembed_query(query)
+        # Chroma and the BM25 scan are local CPU work; keep them off the event loop
+        return await asyncio.to_thread(self._fuse, query, query_embedding)
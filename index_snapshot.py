@@ -0,0 +1,199 @@
+# index_snapshot.py
+# Read-only snapshot of the Chroma index for multi-process serving: chunk vectors in a .npy file that every
+# worker memory-maps (so the pages are shared, not copied per process) plus chunk texts and metadata.
+# SnapshotVectorStore answers the subset of the Chroma API the agent uses, with exact nearest-neighbour search.
+
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+SNAPSHOT_META_FILE = "meta.json"  # Written last: a snapshot directory without it is incomplete
+EXPORT_PAGE_SIZE = 5000
+
+
+def snapshot_path(snapshot_dir: str, version: str) -> str:
+    return os.path.join(snapshot_dir, version)
+
+
+def read_snapshot_meta(path: str) -> Dict:
+    meta_path = os.path.join(path, SNAPSHOT_META_FILE)
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_snapshot_embedding(path: str, identity: str, default: str = "") -> None:
+    """Refuse to serve a snapshot whose vectors come from a different embedding model than the queries.
+
+    Snapshots whose meta records no model (exported from a legacy index) count as embedded with default.
+    """
+    meta = read_snapshot_meta(path)
+    if not meta:
+        raise RuntimeError(f"{path} is not a complete index snapshot (it has no {SNAPSHOT_META_FILE}).")
+    built_with = meta.get("embedding") or default
+    if meta.get("count") and built_with != identity:
+        raise RuntimeError(
+            f"The index snapshot {path} was embedded with {built_with}, but the configured embedding model is "
+            f"{identity}. Rebuild the index with `python ingest.py --rebuild` or switch EMBEDDING_PROVIDER back."
+        )
+
+
+def export_snapshot(vectorstore, snapshot_dir: str, version: str, embedding: str) -> str:
+    """Write the vectorstore contents to snapshot_dir/<version> (atomically) and return that path.
+
+    Other versions are left in place for the processes still serving them; see prune_snapshots().
+    """
+    path = snapshot_path(snapshot_dir, version)
+    if read_snapshot_meta(path).get("version") == version:
+        return path
+
+    started = time.time()
+    count = vectorstore._collection.count()
+    ids, documents, metadatas, vectors = [], [], [], []
+    for offset in range(0, count, EXPORT_PAGE_SIZE):
+        page = vectorstore._collection.get(
+            limit=EXPORT_PAGE_SIZE, offset=offset, include=["embeddings", "documents", "metadatas"]
+        )
+        ids.extend(page["ids"])
+        documents.extend(text or "" for text in page["documents"])
+        metadatas.extend(metadata or {} for metadata in page["metadatas"])
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, "vectors.npy"), np.concatenate(vectors) if vectors else np.zeros((0, 0), np.float32))
+    with open(os.path.join(tmp_path, "chunks.json"), "w", encoding='utf-8') as f:
+        json.dump({"ids": ids, "documents": documents, "metadatas": metadatas}, f)
+    with open(os.path.join(tmp_path, SNAPSHOT_META_FILE), "w", encoding='utf-8') as f:
+        json.dump({"version": version, "embedding": embedding, "count": len(ids), "created_at": time.time()}, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+    logging.info(f"Exported index snapshot {version} ({len(ids)} chunks) to {path} in {time.time() - started:.1f}s.")
+    return path
+
+
+def prune_snapshots(snapshot_dir: str, keep: Sequence[str]) -> None:
+    """Remove every snapshot version not in keep (exports still being written are left alone).
+
+    Processes that still map a removed snapshot keep working: its chunks are in memory and the mapped
+    vectors stay readable until they are unmapped.
+    """
+    if not os.path.isdir(snapshot_dir):
+        return
+    for name in os.listdir(snapshot_dir):
+        if name not in keep and ".tmp-" not in name:
+            shutil.rmtree(os.path.join(snapshot_dir, name), ignore_errors=True)
+            logging.info(f"Removed index snapshot {name}.")
+
+
+class SnapshotCollection:
+    """The read side of a Chroma collection (count, get, query) over a snapshot directory.
+
+    Search is exact squared-L2 (Chroma's default space) over the memory-mapped vectors; `where` supports the
+    equality, $in, $and and $or clauses the retrievers build.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.meta = read_snapshot_meta(path)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.squared_norms = np.einsum("ij,ij->i", self.vectors, self.vectors) if len(self.vectors) else np.zeros(0, np.float32)
+        with open(os.path.join(path, "chunks.json"), "r", encoding='utf-8') as f:
+            chunks = json.load(f)
+        self.ids: List[str] = chunks["ids"]
+        self.documents: List[str] = chunks["documents"]
+        self.metadatas: List[Dict] = chunks["metadatas"]
+        self.positions = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def _column(self, field: str) -> np.ndarray:
+        if field not in self._columns:
+            self._columns[field] = np.array([metadata.get(field) for metadata in self.metadatas], dtype=object)
+        return self._columns[field]
+
+    def _mask(self, where: Dict) -> np.ndarray:
+        masks = []
+        for field, condition in where.items():
+            if field in ("$and", "$or"):
+                parts = [self._mask(clause) for clause in condition]
+                masks.append(np.logical_and.reduce(parts) if field == "$and" else np.logical_or.reduce(parts))
+            elif isinstance(condition, dict):
+                (operator, value), = condition.items()
+                if operator == "$eq":
+                    masks.append(self._column(field) == value)
+                elif operator == "$in":
+                    masks.append(np.isin(self._column(field), list(value)))
+                else:
+                    raise ValueError(f"Unsupported where operator {operator!r} in an index snapshot")
+            else:
+                masks.append(self._column(field) == condition)
+        return np.logical_and.reduce(masks) if masks else np.ones(self.count(), dtype=bool)
+
+    def _rows(self, positions: Sequence[int], include: Sequence[str]) -> Dict:
+        result = {"ids": [self.ids[i] for i in positions]}
+        if "documents" in include:
+            result["documents"] = [self.documents[i] for i in positions]
+        if "metadatas" in include:
+            result["metadatas"] = [self.metadatas[i] for i in positions]
+        if "embeddings" in include:
+            result["embeddings"] = np.asarray(self.vectors[list(positions)])
+        return result
+
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict] = None, limit: Optional[int] = None,
+            offset: int = 0, include: Sequence[str] = ("documents", "metadatas")) -> Dict:
+        if ids is not None:
+            positions = [self.positions[chunk_id] for chunk_id in ids if chunk_id in self.positions]
+        elif where:
+            positions = np.flatnonzero(self._mask(where)).tolist()
+        else:
+            positions = range(self.count())
+        positions = list(positions)[offset:None if limit is None else offset + limit]
+        return self._rows(positions, include)
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 10, where: Optional[Dict] = None,
+              include: Sequence[str] = ("documents", "metadatas", "distances")) -> Dict:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if where:
+            candidates = np.flatnonzero(self._mask(where))
+            vectors, squared_norms = self.vectors[candidates], self.squared_norms[candidates]
+        else:
+            candidates, vectors, squared_norms = None, self.vectors, self.squared_norms
+        # |v - q|^2 = |v|^2 - 2 v.q + |q|^2, for every query at once
+        distances = squared_norms[None, :] - 2 * (queries @ vectors.T) + np.einsum("ij,ij->i", queries, queries)[:, None]
+
+        k = min(n_results, distances.shape[1])
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for row in distances:
+            top = np.argpartition(row, k - 1)[:k] if 0 < k < len(row) else np.arange(k)
+            top = top[np.argsort(row[top], kind="stable")]
+            positions = top if candidates is None else candidates[top]
+            rows = self._rows(positions.tolist(), include)
+            for key in ("ids", "documents", "metadatas"):
+                result[key].append(rows.get(key, []))
+            result["distances"].append(row[top].tolist())
+        return result
+
+
+class SnapshotVectorStore:
+    """Read-only stand-in for the LangChain Chroma vectorstore, backed by a SnapshotCollection"""
+
+    def __init__(self, path: str, embedding=None):
+        self._collection = SnapshotCollection(path)
+        self.embeddings = embedding
+
+    @property
+    def version(self) -> str:
+        return self._collection.meta.get("version", "")
+
+    def get(self, **kwargs) -> Dict:
+        return self._collection.get(**kwargs)
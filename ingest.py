@@ -0,0 +1,239 @@
+# ingest.py
+# Incremental, content-hashed ingestion of the scraped LeetCode corpus into the persistent Chroma vectorstore.
+# Every chunk gets a stable id derived from its topic_id and text hash, so a refresh only embeds new or
+# changed chunks (through a persistent embedding cache keyed by text hash) and deletes chunks of removed posts.
+# The manifest records which embedding provider and model built the index, so it is never mixed with another.
+# Near-duplicate posts (reposts, cross-posts) are collapsed into one canonical post before chunking.
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from langchain.docstore.document import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+
+from compensation_extractor import (
+    DATA_FILE, TABLE_FILE, CompensationRecord, build_compensation_table, extract_compensation, save_compensation_table
+)
+from dedup import DEDUP_THRESHOLD, deduplicate_posts
+from embedding_providers import (
+    LEGACY_EMBEDDING_IDENTITY, PROVIDERS, CachedEmbeddings, EmbeddingCache, create_embeddings, embedding_identity
+)
+from hybrid_retrieval import extract_level, normalize_company, normalize_location
+
+PERSIST_DIR = "chroma_db"
+EMBEDDING_CACHE_DIR = "embedding_cache"
+MANIFEST_FILE = "ingest_manifest.json"  # Stored inside the persist directory
+EMBED_BATCH_SIZE = 256
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+
+
+def format_post(entry: Dict) -> str:
+    """Create a comprehensive text representation of a compensation post"""
+    return (
+        f"Title: {entry['title']}\n"
+        f"Author: {entry['author']}\n"
+        f"Created: {entry['created_at']}\n"
+        f"Content: {entry['content']}\n"
+        f"Summary: {entry['summary']}\n"
+        f"Tags: {', '.join(entry['tags'])}\n"
+        f"URL: {entry['url']}\n"
+        f"Topic ID: {entry['topic_id']}"
+    )
+
+
+def post_metadata(entry: Dict, record: Optional[CompensationRecord] = None) -> Dict[str, str]:
+    """Structured metadata used for filtering and keyword search (Chroma only accepts scalar values)"""
+    record = record or extract_compensation(entry)
+    metadata = {
+        "topic_id": str(entry['topic_id']),
+        "updated_at": entry.get('updated_at') or "",
+        "created_at": entry.get('created_at') or "",
+        "title": entry.get('title') or "",
+        "tags": ", ".join(entry.get('tags') or []),
+        "company": normalize_company(record.company),
+        "location": normalize_location(f"{record.location} {entry.get('title') or ''}"),
+        "level": extract_level(f"{entry.get('title') or ''} {record.title}"),
+    }
+    # Only set on posts that absorbed duplicates, so other chunks keep their ids
+    if entry.get("alternate_urls"):
+        metadata["alternate_urls"] = ", ".join(entry["alternate_urls"])
+    return metadata
+
+
+def build_documents(data: List[Dict]) -> List[Document]:
+    """Convert each LeetCode compensation post to a Document for retrieval"""
+    return [Document(page_content=format_post(entry), metadata=post_metadata(entry)) for entry in data]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_documents(docs: List[Document]) -> List[Document]:
+    """Split documents into chunks, each carrying a stable content-addressed id in its metadata.
+
+    The id covers the metadata as well as the text, so metadata changes are re-upserted
+    (the text embedding itself still comes from the embedding cache).
+    """
+    # Using larger chunks since LeetCode posts contain more detailed information
+    # start_index lets context assembly stitch a post's chunks back together without the overlap
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100, add_start_index=True)
+    chunks = []
+    seen_ids = set()
+    for chunk in splitter.split_documents(docs):
+        chunk_hash = text_hash(chunk.page_content)
+        chunk_id = f"{chunk.metadata['topic_id']}-{text_hash(chunk_hash + json.dumps(chunk.metadata, sort_keys=True))[:16]}"
+        if chunk_id in seen_ids:
+            continue  # Identical text repeated within one post
+        seen_ids.add(chunk_id)
+        chunk.metadata["chunk_hash"] = chunk_hash
+        chunk.metadata["chunk_id"] = chunk_id
+        chunks.append(chunk)
+    return chunks
+
+
+def cached_embeddings(embedding: Embeddings, cache_dir: str = EMBEDDING_CACHE_DIR,
+                      max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES) -> CachedEmbeddings:
+    """Wrap an embedding model with a persistent on-disk cache keyed by model and text hash"""
+    if isinstance(embedding, CachedEmbeddings):
+        return embedding
+    cache = EmbeddingCache(cache_dir, embedding_identity(embedding), max_entries)
+    return CachedEmbeddings(embedding, cache, batch_size=EMBED_BATCH_SIZE)
+
+
+def sync_vectorstore(vectorstore: Chroma, chunks: List[Document], batch_size: int = EMBED_BATCH_SIZE) -> Dict:
+    """Upsert chunks whose ids are not yet indexed and delete indexed chunks that are no longer wanted"""
+    existing_ids = set(vectorstore.get(include=[])["ids"])
+    wanted = {chunk.metadata["chunk_id"]: chunk for chunk in chunks}
+
+    to_add = [chunk for chunk_id, chunk in wanted.items() if chunk_id not in existing_ids]
+    to_delete = [chunk_id for chunk_id in existing_ids if chunk_id not in wanted]
+
+    for start in range(0, len(to_delete), batch_size):
+        vectorstore.delete(ids=to_delete[start:start + batch_size])
+
+    for start in range(0, len(to_add), batch_size):
+        batch = to_add[start:start + batch_size]
+        vectorstore.add_texts(
+            texts=[chunk.page_content for chunk in batch],
+            metadatas=[chunk.metadata for chunk in batch],
+            ids=[chunk.metadata["chunk_id"] for chunk in batch]
+        )
+        logging.info(f"Embedded and upserted {start + len(batch)}/{len(to_add)} new or changed chunks.")
+
+    return {
+        "added": len(to_add),
+        "deleted": len(to_delete),
+        "unchanged": len(wanted) - len(to_add),
+        "total": len(wanted),
+        "version": text_hash("\n".join(sorted(wanted)))[:16]
+    }
+
+
+def write_manifest(persist_dir: str, stats: Dict) -> None:
+    os.makedirs(persist_dir, exist_ok=True)
+    with open(os.path.join(persist_dir, MANIFEST_FILE), "w", encoding='utf-8') as f:
+        json.dump({**stats, "ingested_at": time.time()}, f, indent=2)
+
+
+def read_manifest(persist_dir: str = PERSIST_DIR) -> Dict:
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+
+def index_version(vectorstore: Chroma, persist_dir: str = PERSIST_DIR) -> str:
+    """Fingerprint of the vectorstore contents: the hash of all chunk ids recorded by the last ingest,
+    and the embedding model the chunks were embedded with"""
+    manifest = read_manifest(persist_dir)
+    version = manifest.get("version") or f"chunks-{vectorstore._collection.count()}"
+    return f"{version}-{text_hash(manifest.get('embedding') or LEGACY_EMBEDDING_IDENTITY)[:8]}"
+
+
+def index_embedding(vectorstore: Chroma, persist_dir: str = PERSIST_DIR) -> Optional[str]:
+    """Identity of the embedding model that built the index, None while the index is empty"""
+    if vectorstore._collection.count() == 0:
+        return None
+    # Indexes ingested before the manifest recorded a provider were all embedded with OpenAI
+    return read_manifest(persist_dir).get("embedding") or LEGACY_EMBEDDING_IDENTITY
+
+
+def check_index_embedding(vectorstore: Chroma, embedding: Embeddings, persist_dir: str = PERSIST_DIR) -> None:
+    """Refuse to query or extend an index with vectors from a different embedding model"""
+    built_with = index_embedding(vectorstore, persist_dir)
+    identity = embedding_identity(embedding)
+    if built_with is not None and built_with != identity:
+        raise RuntimeError(
+            f"The index in {persist_dir} was embedded with {built_with}, but the configured embedding model is "
+            f"{identity}. Rebuild it with `python ingest.py --rebuild` or switch EMBEDDING_PROVIDER back."
+        )
+
+
+def ingest(data: List[Dict], embedding: Embeddings, persist_dir: str = PERSIST_DIR, rebuild: bool = False,
+           dedup_threshold: Optional[float] = DEDUP_THRESHOLD) -> Chroma:
+    """Bring the persistent vectorstore in line with the corpus, embedding only the delta.
+
+    With rebuild, the index is emptied first (needed after switching embedding providers).
+    Posts at least dedup_threshold similar to another are indexed once (None or 0 keeps every post).
+    """
+    dedup_report = None
+    if dedup_threshold:
+        data, dedup_report = deduplicate_posts(data, dedup_threshold)
+    chunks = chunk_documents(build_documents(data))
+    logging.info(f"Split {len(data)} posts into {len(chunks)} chunks.")
+
+    embedding = cached_embeddings(embedding)
+    vectorstore = Chroma(embedding_function=embedding, persist_directory=persist_dir)
+    if rebuild:
+        vectorstore.reset_collection()
+        logging.info(f"Emptied the index in {persist_dir} for a rebuild with {embedding.identity}.")
+    check_index_embedding(vectorstore, embedding, persist_dir)
+    started = time.time()
+    stats = sync_vectorstore(vectorstore, chunks)
+    embedding.cache.flush()
+    write_manifest(persist_dir, {**stats, "embedding": embedding.identity, "dedup": dedup_report})
+    logging.info(
+        f"Ingest finished in {time.time() - started:.1f}s: {stats['added']} added, "
+        f"{stats['deleted']} deleted, {stats['unchanged']} unchanged (version {stats['version']})."
+    )
+    return vectorstore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally refresh the Chroma index from the scraped corpus")
+    parser.add_argument("--data", default=DATA_FILE, help="Scraped corpus to index")
+    parser.add_argument("--persist-dir", default=PERSIST_DIR, help="Chroma persist directory")
+    parser.add_argument("--embedding-provider", choices=PROVIDERS, default=os.environ.get("EMBEDDING_PROVIDER", "openai"),
+                        help="Embedding backend (default: EMBEDDING_PROVIDER or openai)")
+    parser.add_argument("--embedding-model", default=os.environ.get("EMBEDDING_MODEL", ""),
+                        help="OpenAI embedding model (default: EMBEDDING_MODEL or text-embedding-ada-002)")
+    parser.add_argument("--local-model-path", default=os.environ.get("LOCAL_EMBEDDING_MODEL_PATH", "models/all-MiniLM-L6-v2"),
+                        help="ONNX model directory for the local provider")
+    parser.add_argument("--rebuild", action="store_true", help="Re-embed every chunk (after switching providers)")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD,
+                        help="MinHash similarity above which posts count as near-duplicates (0 disables dedup)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    with open(args.data, "r", encoding='utf-8') as f:
+        data = json.load(f)
+
+    embedding = create_embeddings(args.embedding_provider, args.embedding_model, args.local_model_path)
+    ingest(data, embedding, args.persist_dir, rebuild=args.rebuild, dedup_threshold=args.dedup_threshold)
+
+    # Keep the structured compensation table in step with the index
+    save_compensation_table(build_compensation_table(data), TABLE_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,174 @@
 # This script scrapes LeetCode compensation data using their GraphQL APIs
 # It fetches compensation topics and their detailed content for RAG Agent
 
+import argparse
 import asyncio
 import aiohttp
 import json
+import os
+import random
 import time
+from email.utils import parsedate_to_datetime
 from typing import List, Dict, Optional
 
+# Responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+COMPENSATION_TITLE_KEYWORDS = ['compensation', 'salary', 'offer', 'pay', 'total comp']
+
+# Newest-first listing orders: the only ones where an incremental crawl may stop at the first known page
+RECENCY_ORDERS = {'MOST_RECENT'}
+
+
+class TokenBucket:
+    """Token-bucket rate limiter: `rate` requests per second on average, with bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # Set when the server asks everyone to back off (Retry-After)
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Hold back all requests for the given number of seconds"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CrawlStore:
+    """Append-only JSONL store for scraped posts plus a paging checkpoint.
+
+    Every post is appended (and flushed) as soon as it is fetched, so a crash loses at most the
+    posts in flight; the checkpoint records the paging cursor so an interrupted crawl can resume.
+    compact() consolidates the JSONL into the corpus file read by rag_agent.py.
+    """
+
+    def __init__(self, jsonl_path: str = "leetcode_compensation_data.jsonl",
+                 checkpoint_path: str = "leetcode_scrape_checkpoint.json"):
+        self.jsonl_path = jsonl_path
+        self.checkpoint_path = checkpoint_path
+
+    def read_posts(self) -> List[Dict]:
+        """Read every stored post, skipping a line truncated by a crash mid-write"""
+        if not os.path.exists(self.jsonl_path):
+            return []
+        posts = []
+        with open(self.jsonl_path, "r", encoding='utf-8') as f:
+            for line in f:
+                try:
+                    posts.append(json.loads(line))
+                except ValueError:
+                    continue
+        return posts
+
+    def load_known(self, corpus_path: Optional[str] = None) -> Dict[str, str]:
+        """Map topic_id -> updatedAt for posts already stored (in the corpus file and/or the JSONL)"""
+        known = {}
+        if corpus_path and os.path.exists(corpus_path):
+            with open(corpus_path, "r", encoding='utf-8') as f:
+                for post in json.load(f):
+                    known[str(post['topic_id'])] = post.get('updated_at') or ""
+        for post in self.read_posts():
+            known[str(post['topic_id'])] = post.get('updated_at') or ""
+        return known
+
+    def append(self, post: Dict):
+        with open(self.jsonl_path, "a", encoding='utf-8') as f:
+            f.write(json.dumps(post, ensure_ascii=False) + "\n")
+            f.flush()
+
+    def read_checkpoint(self) -> Optional[Dict]:
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, "r", encoding='utf-8') as f:
+            return json.load(f)
+
+    def write_checkpoint(self, checkpoint: Dict):
+        # Write to a temp file and rename, so the checkpoint is never left half-written
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump(checkpoint, f, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def compact(self, output_path: str = "leetcode_compensation_data.json", corpus_path: Optional[str] = None) -> List[Dict]:
+        """Write the consolidated corpus: one record per topic_id (latest updatedAt wins), newest first.
+
+        Posts already in corpus_path are kept unless the JSONL has a newer version of them.
+        The JSONL is rewritten without superseded records so it does not grow without bound.
+        """
+        latest: Dict[str, Dict] = {}
+        sources = []
+        if corpus_path and os.path.exists(corpus_path):
+            with open(corpus_path, "r", encoding='utf-8') as f:
+                sources.extend(json.load(f))
+        stored = self.read_posts()
+        sources.extend(stored)
+
+        for post in sources:
+            topic_id = str(post['topic_id'])
+            current = latest.get(topic_id)
+            if current is None or (post.get('updated_at') or "") >= (current.get('updated_at') or ""):
+                latest[topic_id] = post
+
+        corpus = sorted(latest.values(), key=lambda post: post.get('created_at') or "", reverse=True)
+
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump(corpus, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, output_path)
+
+        if stored:
+            stored_ids = {str(post['topic_id']) for post in stored}
+            tmp_path = f"{self.jsonl_path}.tmp"
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                for post in corpus:
+                    if str(post['topic_id']) in stored_ids:
+                        f.write(json.dumps(post, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.jsonl_path)
+
+        return corpus
+
+
 class LeetCodeCompensationScraper:
-    def __init__(self):
-        self.base_url = "https://leetcode.com/graphql/"
+    def __init__(self, base_url: str = "https://leetcode.com/graphql/", max_in_flight: int = 8,
+                 requests_per_second: float = 4.0, max_retries: int = 5,
+                 base_backoff: float = 0.5, max_backoff: float = 30.0, order_by: str = "HOT"):
+        self.base_url = base_url
+        self.order_by = order_by  # Topic listing order; incremental crawls need one of RECENCY_ORDERS
+        self.max_in_flight = max_in_flight  # Concurrent detail requests
+        self.rate_limiter = TokenBucket(requests_per_second)  # Replaces fixed sleeps between requests
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
         self.headers = {
             "accept": "*/*",
             "accept-language": "en-GB,en;q=0.7",
@@ -104,12 +263,55 @@ class LeetCodeCompensationScraper:
         }
         """
 
+    def create_session(self) -> aiohttp.ClientSession:
+        """Create a ClientSession with a connection pool sized for the worker pool and keep-alive enabled"""
+        connector = aiohttp.TCPConnector(
+            limit=self.max_in_flight + 2,  # Detail workers plus the prefetched topics page
+            limit_per_host=self.max_in_flight + 2,
+            keepalive_timeout=60,
+            ttl_dns_cache=300
+        )
+        timeout = aiohttp.ClientTimeout(total=30, connect=10)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def post_graphql(self, session: aiohttp.ClientSession, payload: Dict, description: str) -> Optional[Dict]:
+        """POST a GraphQL payload under the rate limiter, retrying 429/5xx and network errors
+        with exponential backoff and jitter (honoring Retry-After when the server sends it)"""
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            retry_after = None
+            try:
+                async with session.post(self.base_url, json=payload, headers=self.headers) as response:
+                    if response.status == 200:
+                        return await response.json()
+                    if response.status not in RETRYABLE_STATUSES:
+                        print(f"Failed to fetch {description}: HTTP {response.status}")
+                        return None
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    print(f"HTTP {response.status} fetching {description} (attempt {attempt + 1})")
+                    if response.status == 429 and retry_after is not None:
+                        self.rate_limiter.pause(retry_after)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Error fetching {description} (attempt {attempt + 1}): {str(e) or type(e).__name__}")
+
+            if attempt == self.max_retries:
+                break
+            if retry_after is not None:
+                delay = retry_after + random.uniform(0, self.base_backoff)
+            else:
+                # Full jitter: a random delay up to the exponential backoff ceiling
+                delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+            await asyncio.sleep(delay)
+
+        print(f"Giving up on {description} after {self.max_retries + 1} attempts")
+        return None
+
     async def fetch_compensation_topics(self, session: aiohttp.ClientSession, skip: int = 0, first: int = 50) -> Optional[Dict]:
         """Fetch compensation topics from LeetCode GraphQL API"""
         payload = {
             "query": self.topics_query,
             "variables": {
-                "orderBy": "HOT",
+                "orderBy": self.order_by,
                 "keywords": ["compensation"],  # Filter for compensation posts
                 "tagSlugs": [],
                 "skip": skip,
@@ -117,18 +319,7 @@ class LeetCodeCompensationScraper:
             },
             "operationName": "discussPostItems"
         }
-        
-        try:
-            async with session.post(self.base_url, json=payload, headers=self.headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data
-                else:
-                    print(f"Failed to fetch topics: HTTP {response.status}")
-                    return None
-        except Exception as e:
-            print(f"Error fetching topics: {str(e)}")
-            return None
+        return await self.post_graphql(session, payload, f"topics {skip}-{skip + first}")
 
     async def fetch_post_detail(self, session: aiohttp.ClientSession, topic_id: str) -> Optional[Dict]:
         """Fetch detailed content for a specific topic"""
@@ -139,128 +330,227 @@ class LeetCodeCompensationScraper:
             },
             "operationName": "discussPostDetail"
         }
-        
-        try:
-            async with session.post(self.base_url, json=payload, headers=self.headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data
-                else:
-                    print(f"Failed to fetch detail for topic {topic_id}: HTTP {response.status}")
-                    return None
-        except Exception as e:
-            print(f"Error fetching detail for topic {topic_id}: {str(e)}")
+        return await self.post_graphql(session, payload, f"detail for topic {topic_id}")
+
+    async def fetch_compensation_post(self, session: aiohttp.ClientSession, node: Dict, slots: asyncio.Semaphore) -> Optional[Dict]:
+        """Fetch one topic's details (bounded by the worker-pool semaphore) and build its record"""
+        topic_id = node['topicId']
+        async with slots:
+            print(f"Fetching details for: {node['title'][:50]}...")
+            detail_data = await self.fetch_post_detail(session, topic_id)
+
+        if not detail_data or not detail_data.get('data') or not detail_data['data'].get('ugcArticleDiscussionArticle'):
             return None
+        article_detail = detail_data['data']['ugcArticleDiscussionArticle']
+
+        # Combine topic info with detailed content
+        return {
+            'topic_id': topic_id,
+            'title': article_detail['title'],
+            'summary': article_detail['summary'],
+            'content': article_detail['content'],
+            'author': article_detail['author']['userName'] if article_detail['author'] else 'Anonymous',
+            'created_at': article_detail['createdAt'],
+            'updated_at': article_detail['updatedAt'],
+            'hit_count': article_detail['hitCount'],
+            'tags': [tag['name'] for tag in article_detail['tags']],
+            'url': f"https://leetcode.com/discuss/post/{topic_id}",
+            'scraped_at': time.time()
+        }
+
+    async def scrape_all_compensation_data(self, max_posts: int = 10000, store: Optional[CrawlStore] = None,
+                                           incremental: bool = False, known: Optional[Dict[str, str]] = None,
+                                           resume: bool = True) -> List[Dict]:
+        """Scrape compensation data from LeetCode.
+
+        Detail requests for a page of topics run concurrently (up to max_in_flight), paced by the
+        token-bucket rate limiter, while the next topics page is prefetched in the background.
 
-    async def scrape_all_compensation_data(self, max_posts: int = 10000) -> List[Dict]:
-        """Scrape compensation data from LeetCode"""
+        With a store, each post is streamed to its JSONL file as it arrives (and not kept in memory),
+        and the paging cursor is checkpointed after every page so an interrupted crawl resumes where
+        it stopped. In incremental mode, topics in `known` with an unchanged updatedAt are skipped,
+        and paging stops at the first page with nothing new at or below the updated_at watermark, which is
+        only sound when topics are listed newest-first (see RECENCY_ORDERS).
+        """
+        if incremental and self.order_by not in RECENCY_ORDERS:
+            raise ValueError(f"Incremental crawls need a newest-first order ({', '.join(sorted(RECENCY_ORDERS))}), "
+                             f"not {self.order_by}: older pages could still hold new posts.")
         all_compensation_data = []
-        
-        async with aiohttp.ClientSession() as session:
-            skip = 0
+        slots = asyncio.Semaphore(self.max_in_flight)
+        known = known or {}
+
+        skip = 0
+        scraped = 0
+        checkpoint = store.read_checkpoint() if store else None
+        watermark = (checkpoint or {}).get('updated_at_watermark') or max(known.values(), default="")
+        if resume and checkpoint and not checkpoint.get('completed'):
+            skip = checkpoint['skip']
+            scraped = checkpoint['scraped']
+            print(f"Resuming interrupted crawl at topics offset {skip} ({scraped} posts already stored)")
+        newest_seen = watermark
+
+        async def fetch_and_store(node: Dict) -> Optional[Dict]:
+            compensation_post = await self.fetch_compensation_post(session, node, slots)
+            if compensation_post and store:
+                store.append(compensation_post)
+            return compensation_post
+
+        async with self.create_session() as session:
             batch_size = 50
-            
-            print(f"Starting to scrape up to {max_posts} compensation posts...")
-            
-            while len(all_compensation_data) < max_posts:
-                print(f"Fetching topics batch: {skip} to {skip + batch_size}")
-                
-                # Fetch topic list
-                topics_data = await self.fetch_compensation_topics(session, skip, batch_size)
-                if not topics_data or not topics_data.get('data'):
-                    print("No more topics found or API error")
-                    break
-                
-                articles = topics_data['data']['ugcArticleDiscussionArticles']['edges']
-                if not articles:
-                    print("No articles in this batch")
-                    break
-                
-                # Process each topic
-                for article in articles:
-                    if len(all_compensation_data) >= max_posts:
+            completed = False
+
+            print(f"Starting to scrape up to {max_posts} compensation posts "
+                  f"({self.max_in_flight} in flight, {self.rate_limiter.rate} req/s)...")
+
+            next_page = asyncio.create_task(self.fetch_compensation_topics(session, skip, batch_size))
+            try:
+                while scraped < max_posts:
+                    print(f"Fetching topics batch: {skip} to {skip + batch_size}")
+
+                    # Fetch topic list (already in flight since the previous page)
+                    topics_data = await next_page
+                    next_page = None
+                    if not topics_data or not topics_data.get('data'):
+                        print("No more topics found or API error")
+                        break
+
+                    articles = topics_data['data']['ugcArticleDiscussionArticles']['edges']
+                    if not articles:
+                        print("No articles in this batch")
+                        completed = True
+                        break
+
+                    # Check if there are more pages, and start fetching the next one while details download
+                    has_next_page = topics_data['data']['ugcArticleDiscussionArticles']['pageInfo']['hasNextPage']
+                    if has_next_page:
+                        next_page = asyncio.create_task(self.fetch_compensation_topics(session, skip + batch_size, batch_size))
+
+                    # Check which topics are compensation related
+                    nodes = [
+                        article['node'] for article in articles
+                        if any(keyword in article['node']['title'].lower() for keyword in COMPENSATION_TITLE_KEYWORDS)
+                    ]
+                    newest_seen = max([newest_seen] + [node.get('updatedAt') or "" for node in nodes])
+
+                    if incremental:
+                        changed = [node for node in nodes if known.get(str(node['topicId'])) != node.get('updatedAt')]
+                        print(f"{len(nodes) - len(changed)} of {len(nodes)} topics on this page are unchanged")
+                        if not changed and all((node.get('updatedAt') or "") <= watermark for node in nodes):
+                            print("Reached already-stored content, stopping")
+                            completed = True
+                            break
+                        nodes = changed
+
+                    nodes = nodes[:max_posts - scraped]
+
+                    # Fetch detailed content for the whole page concurrently; results keep page order
+                    posts = await asyncio.gather(*(fetch_and_store(node) for node in nodes))
+                    for compensation_post in posts:
+                        if compensation_post:
+                            scraped += 1
+                            if store is None:
+                                all_compensation_data.append(compensation_post)
+                            print(f"Scraped post {scraped}: {compensation_post['title'][:50]}...")
+
+                    skip += batch_size
+                    if store:
+                        store.write_checkpoint({
+                            'skip': skip,
+                            'scraped': scraped,
+                            'completed': False,
+                            'updated_at_watermark': watermark,
+                            'checkpointed_at': time.time()
+                        })
+
+                    if not has_next_page:
+                        print("No more pages available")
+                        completed = True
                         break
-                        
-                    node = article['node']
-                    topic_id = node['topicId']
-                    
-                    # Check if it's compensation related
-                    title = node['title'].lower()
-                    if not any(keyword in title for keyword in ['compensation', 'salary', 'offer', 'pay', 'total comp']):
-                        continue
-                    
-                    print(f"Fetching details for: {node['title'][:50]}...")
-                    
-                    # Fetch detailed content
-                    detail_data = await self.fetch_post_detail(session, topic_id)
-                    if detail_data and detail_data.get('data'):
-                        article_detail = detail_data['data']['ugcArticleDiscussionArticle']
-                        
-                        # Combine topic info with detailed content
-                        compensation_post = {
-                            'topic_id': topic_id,
-                            'title': article_detail['title'],
-                            'summary': article_detail['summary'],
-                            'content': article_detail['content'],
-                            'author': article_detail['author']['userName'] if article_detail['author'] else 'Anonymous',
-                            'created_at': article_detail['createdAt'],
-                            'updated_at': article_detail['updatedAt'],
-                            'hit_count': article_detail['hitCount'],
-                            'tags': [tag['name'] for tag in article_detail['tags']],
-                            'url': f"https://leetcode.com/discuss/post/{topic_id}",
-                            'scraped_at': time.time()
-                        }
-                        
-                        all_compensation_data.append(compensation_post)
-                        print(f"Scraped post {len(all_compensation_data)}: {compensation_post['title'][:50]}...")
-                    
-                    # Be respectful to the API
-                    await asyncio.sleep(0.5)
-                
-                skip += batch_size
-                
-                # Check if there are more pages
-                has_next_page = topics_data['data']['ugcArticleDiscussionArticles']['pageInfo']['hasNextPage']
-                if not has_next_page:
-                    print("No more pages available")
-                    break
-                
-                # Longer delay between batches
-                await asyncio.sleep(2)
-            
+                else:
+                    completed = True  # Reached max_posts
+            finally:
+                if next_page is not None:
+                    next_page.cancel()
+
+        # Only a finished crawl advances the watermark; an interrupted one keeps its cursor for resuming
+        if store and completed:
+            store.write_checkpoint({
+                'skip': 0,
+                'scraped': scraped,
+                'completed': True,
+                'updated_at_watermark': newest_seen,
+                'checkpointed_at': time.time()
+            })
+
         return all_compensation_data
 
-async def main():
+CORPUS_FILE = "leetcode_compensation_data.json"
+
+
+async def main(args: argparse.Namespace):
     """Main function to run the scraper and save results"""
-    print("Starting LeetCode compensation data scraping via GraphQL API...")
-    
-    # Create scraper instance
-    scraper = LeetCodeCompensationScraper()
-    
-    # Scrape compensation data
-    compensation_data = await scraper.scrape_all_compensation_data(max_posts=1000)
-    
+    store = CrawlStore(args.jsonl, args.checkpoint)
+
+    if not args.compact_only:
+        print("Starting LeetCode compensation data scraping via GraphQL API...")
+
+        # Create scraper instance
+        scraper = LeetCodeCompensationScraper(
+            base_url=args.base_url,
+            max_in_flight=args.max_in_flight,
+            requests_per_second=args.requests_per_second,
+            max_retries=args.max_retries,
+            order_by=args.order_by
+        )
+
+        # Scrape compensation data, streaming each post to the JSONL store as it arrives
+        known = store.load_known(CORPUS_FILE) if args.incremental else None
+        await scraper.scrape_all_compensation_data(
+            max_posts=args.max_posts,
+            store=store,
+            incremental=args.incremental,
+            known=known,
+            resume=not args.no_resume
+        )
+
+    # Consolidate the JSONL (and the previous corpus) into the file rag_agent.py reads
+    compensation_data = store.compact(CORPUS_FILE, corpus_path=CORPUS_FILE)
+
     if compensation_data:
-        # Save to JSON file
-        with open("leetcode_compensation_data.json", "w", encoding='utf-8') as f:
-            json.dump(compensation_data, f, indent=2, ensure_ascii=False)
-        
         print(f"\nScraping completed!")
-        print(f"Total compensation posts scraped: {len(compensation_data)}")
-        print(f"Data saved to: leetcode_compensation_data.json")
-        
+        print(f"Total compensation posts in corpus: {len(compensation_data)}")
+        print(f"Data saved to: {CORPUS_FILE}")
+
         # Print sample data
-        if compensation_data:
-            print("\nSample compensation post:")
-            sample = compensation_data[0]
-            print(f"Title: {sample['title']}")
-            print(f"Author: {sample['author']}")
-            print(f"Created: {sample['created_at']}")
-            print(f"Content preview: {sample['content'][:200]}...")
-            print(f"Tags: {sample['tags']}")
+        print("\nSample compensation post:")
+        sample = compensation_data[0]
+        print(f"Title: {sample['title']}")
+        print(f"Author: {sample['author']}")
+        print(f"Created: {sample['created_at']}")
+        print(f"Content preview: {sample['content'][:200]}...")
+        print(f"Tags: {sample['tags']}")
     else:
         print("No compensation data was scraped.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape LeetCode compensation posts")
+    parser.add_argument("--max-posts", type=int, default=1000)
+    parser.add_argument("--max-in-flight", type=int, default=8, help="Concurrent detail requests")
+    parser.add_argument("--requests-per-second", type=float, default=4.0, help="Token-bucket rate limit")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries for 429/5xx and network errors")
+    parser.add_argument("--base-url", default="https://leetcode.com/graphql/", help="GraphQL endpoint (e.g. a local stand-in)")
+    parser.add_argument("--order-by", help="Topic listing order (ArticleOrderByEnum; default HOT, or MOST_RECENT with --incremental)")
+    parser.add_argument("--jsonl", default="leetcode_compensation_data.jsonl", help="Append-only stream of scraped posts")
+    parser.add_argument("--checkpoint", default="leetcode_scrape_checkpoint.json", help="Paging checkpoint for resuming")
+    parser.add_argument("--incremental", action="store_true", help="Skip stored posts with an unchanged updatedAt and stop at known content")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore an interrupted crawl's checkpoint and start from the first page")
+    parser.add_argument("--compact-only", action="store_true", help="Only consolidate the JSONL into the corpus file")
+
+    args = parser.parse_args()
+    if args.order_by is None:
+        args.order_by = 'MOST_RECENT' if args.incremental else 'HOT'
+    elif args.incremental and args.order_by not in RECENCY_ORDERS:
+        parser.error(f"--incremental stops at the first known page, so it needs --order-by {' or '.join(sorted(RECENCY_ORDERS))}")
+
     # Run the async scraper
-    asyncio.run(main())
+    asyncio.run(main(args))
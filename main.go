@@ -1,11 +1,25 @@
 package main
 
 import (
-	"bytes"         // Used to create a buffer for the JSON request body
-	"encoding/json" // For encoding (marshaling) and decoding (unmarshaling) JSON data
-	"io"            // For reading the response body from HTTP requests
-	"log"           // For logging server status and errors
-	"net/http"      // For building HTTP servers and making HTTP requests
+	"bytes"          // Used to create a buffer for the JSON request body
+	"container/list" // LRU order of the response cache
+	"context"        // For upstream deadlines
+	"crypto/rand"    // For generating request and trace ids
+	"encoding/hex"   // For formatting ids as hex strings
+	"encoding/json"  // For encoding (marshaling) and decoding (unmarshaling) JSON data
+	"errors"         // For the gateway's own error values
+	"io"             // For reading the response body from HTTP requests
+	"log"            // For logging server status and errors
+	"net"            // For tuning the upstream dialer
+	"net/http"       // For building HTTP servers and making HTTP requests
+	"os"             // For reading configuration from environment variables
+	"regexp"         // For validating incoming trace headers
+	"sort"           // For picking the least-loaded agent
+	"strconv"        // For numeric configuration
+	"strings"        // For normalizing queries and parsing the agent list
+	"sync"           // For the cache and singleflight locks
+	"sync/atomic"    // For agent health flags
+	"time"           // For timeouts, health checks and cache expiry
 )
 
 // QueryRequest represents the expected JSON request body from the client
@@ -20,14 +34,414 @@ type AgentResponse struct {
 	Response string `json:"response"`
 }
 
-// handler processes POST requests to /query, forwards them to the Python RAG agent, and returns the agent's response
-func handler(w http.ResponseWriter, r *http.Request) {
-	log.Printf("Received %s request from %s", r.Method, r.RemoteAddr)
+// Response headers from the agent that are relayed to the client
+var relayedHeaders = []string{"Content-Type", "Cache-Control", "Retry-After", "Server-Timing"}
 
-	// Enable CORS for frontend requests
+var (
+	requestIDPattern   = regexp.MustCompile(`^[A-Za-z0-9._:-]{1,128}$`)
+	traceparentPattern = regexp.MustCompile(`^00-([0-9a-f]{32})-[0-9a-f]{16}-([0-9a-f]{2})$`)
+)
+
+var (
+	errNoHealthyAgent   = errors.New("no healthy agent")
+	errAtCapacity       = errors.New("all agents are at capacity")
+	errResponseTooLarge = errors.New("agent response too large")
+)
+
+// config holds the gateway settings, read from the environment by configFromEnv
+type config struct {
+	agentURLs           []string      // AGENT_URLS (comma-separated) or AGENT_URL, default http://localhost:8000
+	upstreamTimeout     time.Duration // UPSTREAM_TIMEOUT: deadline for one /query call to an agent (default 120s)
+	maxInflightPerAgent int           // MAX_INFLIGHT_PER_AGENT: requests one agent may hold before we answer 503 (default 40)
+	healthCheckInterval time.Duration // HEALTH_CHECK_INTERVAL: how often each agent's /ready is polled (default 5s)
+	cacheTTL            time.Duration // CACHE_TTL: how long a /query answer is reused (default 5m, 0 disables the cache)
+	cacheMaxEntries     int           // CACHE_MAX_ENTRIES: least recently used answers are dropped beyond this (default 1000)
+	maxResponseBytes    int64         // MAX_RESPONSE_BYTES: larger agent responses are rejected (default 1 MiB)
+}
+
+// getenv returns the environment variable key, or fallback when it is unset
+func getenv(key, fallback string) string {
+	if value := os.Getenv(key); value != "" {
+		return value
+	}
+	return fallback
+}
+
+func getenvInt(key string, fallback int) int {
+	value, err := strconv.Atoi(getenv(key, strconv.Itoa(fallback)))
+	if err != nil {
+		log.Fatalf("Invalid %s: %v", key, err)
+	}
+	return value
+}
+
+func getenvDuration(key string, fallback time.Duration) time.Duration {
+	value, err := time.ParseDuration(getenv(key, fallback.String()))
+	if err != nil {
+		log.Fatalf("Invalid %s: %v", key, err)
+	}
+	return value
+}
+
+func configFromEnv() config {
+	var agentURLs []string
+	for _, url := range strings.Split(getenv("AGENT_URLS", getenv("AGENT_URL", "http://localhost:8000")), ",") {
+		if url = strings.TrimRight(strings.TrimSpace(url), "/"); url != "" {
+			agentURLs = append(agentURLs, url)
+		}
+	}
+	return config{
+		agentURLs:           agentURLs,
+		upstreamTimeout:     getenvDuration("UPSTREAM_TIMEOUT", 120*time.Second),
+		maxInflightPerAgent: getenvInt("MAX_INFLIGHT_PER_AGENT", 40),
+		healthCheckInterval: getenvDuration("HEALTH_CHECK_INTERVAL", 5*time.Second),
+		cacheTTL:            getenvDuration("CACHE_TTL", 5*time.Minute),
+		cacheMaxEntries:     getenvInt("CACHE_MAX_ENTRIES", 1000),
+		maxResponseBytes:    int64(getenvInt("MAX_RESPONSE_BYTES", 1<<20)),
+	}
+}
+
+// randomHex returns n random bytes as a hex string
+func randomHex(n int) string {
+	b := make([]byte, n)
+	rand.Read(b)
+	return hex.EncodeToString(b)
+}
+
+// traceContext returns the request id and W3C traceparent to send to the agent: the client's X-Request-ID
+// and trace id are kept when valid, otherwise new ones are started; the gateway's own span becomes the parent.
+// Both are echoed to the client so a slow request can be found in the gateway and agent logs.
+func traceContext(w http.ResponseWriter, r *http.Request) (requestID, traceparent string) {
+	requestID = r.Header.Get("X-Request-ID")
+	if !requestIDPattern.MatchString(requestID) {
+		requestID = randomHex(8)
+	}
+	traceID, flags := randomHex(16), "01"
+	if match := traceparentPattern.FindStringSubmatch(r.Header.Get("traceparent")); match != nil {
+		traceID, flags = match[1], match[2]
+	}
+	traceparent = "00-" + traceID + "-" + randomHex(8) + "-" + flags
+	w.Header().Set("X-Request-ID", requestID)
+	w.Header().Set("traceparent", traceparent)
+	return requestID, traceparent
+}
+
+// normalizeQuery matches the agent's normalize_query, so both layers agree on which questions are identical
+func normalizeQuery(query string) string {
+	return strings.Join(strings.Fields(strings.ToLower(query)), " ")
+}
+
+// setCORSHeaders allows frontend requests from any origin
+func setCORSHeaders(w http.ResponseWriter) {
 	w.Header().Set("Access-Control-Allow-Origin", "*")
 	w.Header().Set("Access-Control-Allow-Methods", "POST, OPTIONS")
-	w.Header().Set("Access-Control-Allow-Headers", "Content-Type")
+	w.Header().Set("Access-Control-Allow-Headers", "Content-Type, X-Request-ID, traceparent")
+	w.Header().Set("Access-Control-Expose-Headers", "X-Request-ID, traceparent, Server-Timing, X-Cache")
+}
+
+// relayResponseHeaders copies the agent's status-related and timing headers to the client
+func relayResponseHeaders(w http.ResponseWriter, header http.Header) {
+	for _, name := range relayedHeaders {
+		if value := header.Get(name); value != "" {
+			w.Header().Set(name, value)
+		}
+	}
+}
+
+// backend is one Python agent worker. Its slots channel holds one token per in-flight request.
+type backend struct {
+	url     string
+	slots   chan struct{}
+	healthy atomic.Bool
+}
+
+// backendPool load-balances requests across the agents that passed their last health check
+type backendPool struct {
+	backends []*backend
+	client   *http.Client
+}
+
+func newBackendPool(cfg config) *backendPool {
+	pool := &backendPool{
+		// One shared client with keep-alive connections sized to the in-flight limit
+		// (the default transport keeps only 2 idle connections per agent and has no deadlines)
+		client: &http.Client{
+			Transport: &http.Transport{
+				DialContext:           (&net.Dialer{Timeout: 2 * time.Second, KeepAlive: 30 * time.Second}).DialContext,
+				MaxIdleConns:          cfg.maxInflightPerAgent * len(cfg.agentURLs),
+				MaxIdleConnsPerHost:   cfg.maxInflightPerAgent,
+				IdleConnTimeout:       90 * time.Second,
+				ResponseHeaderTimeout: cfg.upstreamTimeout,
+			},
+		},
+	}
+	for _, url := range cfg.agentURLs {
+		pool.backends = append(pool.backends, &backend{url: url, slots: make(chan struct{}, cfg.maxInflightPerAgent)})
+	}
+	return pool
+}
+
+// acquire takes a slot on the healthy agent with the fewest in-flight requests, without waiting:
+// when every healthy agent is full the caller gets errAtCapacity and should answer 503 right away.
+func (p *backendPool) acquire() (*backend, error) {
+	var healthy []*backend
+	for _, b := range p.backends {
+		if b.healthy.Load() {
+			healthy = append(healthy, b)
+		}
+	}
+	if len(healthy) == 0 {
+		return nil, errNoHealthyAgent
+	}
+	sort.Slice(healthy, func(i, j int) bool { return len(healthy[i].slots) < len(healthy[j].slots) })
+	for _, b := range healthy {
+		select {
+		case b.slots <- struct{}{}:
+			return b, nil
+		default:
+		}
+	}
+	return nil, errAtCapacity
+}
+
+func (p *backendPool) release(b *backend) {
+	<-b.slots
+}
+
+// setHealthy records an agent's health, logging only changes
+func (p *backendPool) setHealthy(b *backend, healthy bool, reason string) {
+	if b.healthy.Swap(healthy) != healthy {
+		log.Printf("Agent %s is now %s (%s)", b.url, map[bool]string{true: "healthy", false: "unhealthy"}[healthy], reason)
+	}
+}
+
+// checkHealth polls every agent's /ready endpoint once, in parallel
+func (p *backendPool) checkHealth() {
+	var wg sync.WaitGroup
+	for _, b := range p.backends {
+		wg.Add(1)
+		go func(b *backend) {
+			defer wg.Done()
+			ctx, cancel := context.WithTimeout(context.Background(), 2*time.Second)
+			defer cancel()
+			req, _ := http.NewRequestWithContext(ctx, http.MethodGet, b.url+"/ready", nil)
+			rsp, err := p.client.Do(req)
+			if err != nil {
+				p.setHealthy(b, false, err.Error())
+				return
+			}
+			io.Copy(io.Discard, rsp.Body)
+			rsp.Body.Close()
+			p.setHealthy(b, rsp.StatusCode == http.StatusOK, "/ready returned "+rsp.Status)
+		}(b)
+	}
+	wg.Wait()
+}
+
+// watchHealth re-checks the agents every interval, forever
+func (p *backendPool) watchHealth(interval time.Duration) {
+	for range time.Tick(interval) {
+		p.checkHealth()
+	}
+}
+
+// cachedResponse is an agent response held in memory, so it can be shared and replayed
+type cachedResponse struct {
+	status int
+	header http.Header
+	body   []byte
+}
+
+type cacheEntry struct {
+	key      string
+	response *cachedResponse
+	expires  time.Time
+}
+
+// responseCache is a bounded LRU of successful /query answers, each kept for at most ttl
+type responseCache struct {
+	mu         sync.Mutex
+	ttl        time.Duration
+	maxEntries int
+	order      *list.List // Most recently used at the front
+	entries    map[string]*list.Element
+}
+
+func newResponseCache(ttl time.Duration, maxEntries int) *responseCache {
+	return &responseCache{ttl: ttl, maxEntries: maxEntries, order: list.New(), entries: map[string]*list.Element{}}
+}
+
+func (c *responseCache) get(key string) (*cachedResponse, bool) {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	element, ok := c.entries[key]
+	if !ok {
+		return nil, false
+	}
+	entry := element.Value.(*cacheEntry)
+	if time.Now().After(entry.expires) {
+		c.order.Remove(element)
+		delete(c.entries, key)
+		return nil, false
+	}
+	c.order.MoveToFront(element)
+	return entry.response, true
+}
+
+func (c *responseCache) put(key string, response *cachedResponse) {
+	if c.ttl <= 0 || c.maxEntries <= 0 {
+		return
+	}
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	if element, ok := c.entries[key]; ok {
+		c.order.Remove(element)
+	}
+	c.entries[key] = c.order.PushFront(&cacheEntry{key: key, response: response, expires: time.Now().Add(c.ttl)})
+	for c.order.Len() > c.maxEntries {
+		oldest := c.order.Back()
+		c.order.Remove(oldest)
+		delete(c.entries, oldest.Value.(*cacheEntry).key)
+	}
+}
+
+func (c *responseCache) len() int {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	return c.order.Len()
+}
+
+// flight is one upstream call that concurrent identical queries wait on
+type flight struct {
+	done     chan struct{}
+	response *cachedResponse
+	err      error
+}
+
+// flightGroup deduplicates identical concurrent queries (singleflight): only the first caller
+// for a key runs fn, the others wait for its result
+type flightGroup struct {
+	mu      sync.Mutex
+	flights map[string]*flight
+}
+
+// do runs fn once for all concurrent callers with the same key; shared is true for callers that joined
+// another's call. A waiting caller whose own request is cancelled stops waiting, the call itself goes on.
+func (g *flightGroup) do(ctx context.Context, key string, fn func() (*cachedResponse, error)) (response *cachedResponse, err error, shared bool) {
+	g.mu.Lock()
+	if f, ok := g.flights[key]; ok {
+		g.mu.Unlock()
+		select {
+		case <-f.done:
+			return f.response, f.err, true
+		case <-ctx.Done():
+			return nil, ctx.Err(), true
+		}
+	}
+	f := &flight{done: make(chan struct{})}
+	g.flights[key] = f
+	g.mu.Unlock()
+
+	f.response, f.err = fn()
+	g.mu.Lock()
+	delete(g.flights, key)
+	g.mu.Unlock()
+	close(f.done)
+	return f.response, f.err, false
+}
+
+// gateway forwards client requests to the pool of Python agents
+type gateway struct {
+	cfg     config
+	pool    *backendPool
+	cache   *responseCache
+	flights *flightGroup
+}
+
+func newGateway(cfg config) *gateway {
+	return &gateway{
+		cfg:     cfg,
+		pool:    newBackendPool(cfg),
+		cache:   newResponseCache(cfg.cacheTTL, cfg.cacheMaxEntries),
+		flights: &flightGroup{flights: map[string]*flight{}},
+	}
+}
+
+func (g *gateway) routes() *http.ServeMux {
+	mux := http.NewServeMux()
+	// Register the /query endpoint with the handler
+	mux.HandleFunc("/query", g.handler)
+	// Register the streaming pass-through for /query/stream
+	mux.HandleFunc("/query/stream", g.streamHandler)
+	mux.HandleFunc("/health", g.healthHandler)
+	return mux
+}
+
+// writeError answers with the status that fits an upstream failure: 503 (with Retry-After) when no agent
+// can take the request, 504 on the upstream deadline, 502 for anything else
+func writeError(w http.ResponseWriter, err error) {
+	switch {
+	case errors.Is(err, errAtCapacity), errors.Is(err, errNoHealthyAgent):
+		w.Header().Set("Retry-After", "1")
+		http.Error(w, "Agent is at capacity, please retry shortly.", http.StatusServiceUnavailable)
+	case errors.Is(err, context.DeadlineExceeded):
+		http.Error(w, "Agent timed out", http.StatusGatewayTimeout)
+	case errors.Is(err, context.Canceled):
+		// The client went away; nobody is reading the answer
+	default:
+		http.Error(w, "Failed to contact agent", http.StatusBadGateway)
+	}
+}
+
+// forward sends one /query to the least-loaded healthy agent and reads the answer into memory.
+// It runs under its own deadline rather than the client's context, since other callers may be waiting on it.
+func (g *gateway) forward(requestID, traceparent string, agentReq []byte) (*cachedResponse, error) {
+	b, err := g.pool.acquire()
+	if err != nil {
+		return nil, err
+	}
+	defer g.pool.release(b)
+
+	ctx, cancel := context.WithTimeout(context.Background(), g.cfg.upstreamTimeout)
+	defer cancel()
+	upstream, err := http.NewRequestWithContext(ctx, http.MethodPost, b.url+"/query", bytes.NewReader(agentReq))
+	if err != nil {
+		return nil, err
+	}
+	upstream.Header.Set("Content-Type", "application/json")
+	upstream.Header.Set("X-Request-ID", requestID)
+	upstream.Header.Set("traceparent", traceparent)
+
+	log.Printf("[%s] Forwarding request to Python RAG agent at %s/query", requestID, b.url)
+	rsp, err := g.pool.client.Do(upstream)
+	if err != nil {
+		if !errors.Is(err, context.DeadlineExceeded) {
+			g.pool.setHealthy(b, false, err.Error())
+		}
+		return nil, err
+	}
+	defer rsp.Body.Close()
+
+	// Read the (small, JSON) answer so it can be cached and handed to every waiting caller,
+	// refusing to hold more than maxResponseBytes of it
+	body, err := io.ReadAll(io.LimitReader(rsp.Body, g.cfg.maxResponseBytes+1))
+	if err != nil {
+		return nil, err
+	}
+	if int64(len(body)) > g.cfg.maxResponseBytes {
+		return nil, errResponseTooLarge
+	}
+	log.Printf("[%s] Received response from Python agent with status: %d (%s)", requestID, rsp.StatusCode, rsp.Header.Get("Server-Timing"))
+	return &cachedResponse{status: rsp.StatusCode, header: rsp.Header.Clone(), body: body}, nil
+}
+
+// handler processes POST requests to /query. Answers are served from the TTL cache when possible; otherwise
+// identical concurrent queries share one call to the least-loaded healthy Python agent.
+func (g *gateway) handler(w http.ResponseWriter, r *http.Request) {
+	log.Printf("Received %s request from %s", r.Method, r.RemoteAddr)
+
+	// Enable CORS for frontend requests
+	setCORSHeaders(w)
 
 	// Handle preflight OPTIONS request
 	if r.Method == http.MethodOptions {
@@ -42,58 +456,197 @@ func handler(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
+	requestID, traceparent := traceContext(w, r)
+
 	// Decode the incoming JSON request
 	var req QueryRequest
 	if err := json.NewDecoder(r.Body).Decode(&req); err != nil {
-		log.Printf("Failed to decode request: %v", err)
+		log.Printf("[%s] Failed to decode request: %v", requestID, err)
 		http.Error(w, "Invalid request", http.StatusBadRequest)
 		return
 	}
 
-	log.Printf("Processing query: %s", req.Query)
+	log.Printf("[%s] Processing query: %s", requestID, req.Query)
+
+	key := normalizeQuery(req.Query)
+	if response, ok := g.cache.get(key); ok {
+		log.Printf("[%s] Cache hit, returning response (length: %d bytes)", requestID, len(response.body))
+		writeResponse(w, response, "HIT")
+		return
+	}
 
 	// Marshal the request to JSON to send to the Python agent
 	// json.Marshal converts the Go struct (QueryRequest) into a JSON-formatted byte slice.
 	// This is necessary because the Python RAG agent expects the request body in JSON format.
 	agentReq, err := json.Marshal(req)
 	if err != nil {
-		log.Printf("Failed to marshal request: %v", err)
+		log.Printf("[%s] Failed to marshal request: %v", requestID, err)
 		http.Error(w, "Failed to encode request", http.StatusInternalServerError)
 		return
 	}
 
-	log.Println("Forwarding request to Python RAG agent at http://localhost:8000/query")
-	// Make a POST request to the Python RAG agent's /query endpoint
-	rsp, err := http.Post("http://localhost:8000/query", "application/json", bytes.NewBuffer(agentReq))
+	response, err, shared := g.flights.do(r.Context(), key, func() (*cachedResponse, error) {
+		response, err := g.forward(requestID, traceparent, agentReq)
+		if err == nil && response.status == http.StatusOK {
+			g.cache.put(key, response)
+		}
+		return response, err
+	})
 	if err != nil {
-		log.Printf("Failed to contact Python agent: %v", err)
-		http.Error(w, "Failed to contact agent", http.StatusInternalServerError)
+		log.Printf("[%s] Failed to get an answer from the Python agent: %v", requestID, err)
+		writeError(w, err)
 		return
 	}
-	defer rsp.Body.Close()
 
-	log.Printf("Received response from Python agent with status: %d", rsp.StatusCode)
+	cacheStatus := "MISS"
+	if shared {
+		cacheStatus = "SHARED"
+	}
+	log.Printf("[%s] Successfully processed query (%s), returning response (length: %d bytes)", requestID, cacheStatus, len(response.body))
+	writeResponse(w, response, cacheStatus)
+}
+
+// writeResponse writes an agent response (and its status, e.g. 429/503) back to the client
+func writeResponse(w http.ResponseWriter, response *cachedResponse, cacheStatus string) {
+	w.Header().Set("Content-Type", "application/json")
+	relayResponseHeaders(w, response.header)
+	if cacheStatus == "HIT" {
+		w.Header().Del("Server-Timing") // The stages ran for an earlier request
+	}
+	w.Header().Set("X-Cache", cacheStatus)
+	w.WriteHeader(response.status)
+	w.Write(response.body)
+}
+
+// streamHandler processes POST requests to /query/stream: it forwards the query to the Python agent's
+// server-sent events endpoint and relays every chunk to the client as soon as it arrives, instead of
+// buffering the whole body, so summary tokens and compensation cards reach the client while the LLM is still generating.
+func (g *gateway) streamHandler(w http.ResponseWriter, r *http.Request) {
+	log.Printf("Received %s stream request from %s", r.Method, r.RemoteAddr)
 
-	// Read the response from the agent
-	// io.ReadAll reads all the data from the response body and returns it as a byte slice.
-	// This is used to capture the full JSON response from the Python agent before sending it back to the client.
-	body, err := io.ReadAll(rsp.Body)
+	setCORSHeaders(w)
+	if r.Method == http.MethodOptions {
+		w.WriteHeader(http.StatusOK)
+		return
+	}
+	if r.Method != http.MethodPost {
+		http.Error(w, "Only POST allowed", http.StatusMethodNotAllowed)
+		return
+	}
+
+	flusher, ok := w.(http.Flusher)
+	if !ok {
+		http.Error(w, "Streaming unsupported", http.StatusInternalServerError)
+		return
+	}
+
+	requestID, traceparent := traceContext(w, r)
+
+	var req QueryRequest
+	if err := json.NewDecoder(r.Body).Decode(&req); err != nil {
+		log.Printf("[%s] Failed to decode request: %v", requestID, err)
+		http.Error(w, "Invalid request", http.StatusBadRequest)
+		return
+	}
+	agentReq, err := json.Marshal(req)
+	if err != nil {
+		http.Error(w, "Failed to encode request", http.StatusInternalServerError)
+		return
+	}
+
+	// A stream holds its agent slot until the last chunk is relayed
+	b, err := g.pool.acquire()
 	if err != nil {
-		log.Printf("Failed to read agent response: %v", err)
-		http.Error(w, "Failed to read agent response", http.StatusInternalServerError)
+		log.Printf("[%s] Rejecting stream: %v", requestID, err)
+		writeError(w, err)
 		return
 	}
+	defer g.pool.release(b)
 
-	log.Printf("Successfully processed query, returning response (length: %d bytes)", len(body))
-	// Set response headers and write the agent's response back to the client
+	// Tie the upstream request to the client's: if the client goes away, the agent stops generating
+	upstream, err := http.NewRequestWithContext(r.Context(), http.MethodPost, b.url+"/query/stream", bytes.NewReader(agentReq))
+	if err != nil {
+		http.Error(w, "Failed to build agent request", http.StatusInternalServerError)
+		return
+	}
+	upstream.Header.Set("Content-Type", "application/json")
+	upstream.Header.Set("Accept", "text/event-stream")
+	upstream.Header.Set("X-Request-ID", requestID)
+	upstream.Header.Set("traceparent", traceparent)
+
+	rsp, err := g.pool.client.Do(upstream)
+	if err != nil {
+		log.Printf("[%s] Failed to contact Python agent: %v", requestID, err)
+		if r.Context().Err() == nil && !errors.Is(err, context.DeadlineExceeded) {
+			g.pool.setHealthy(b, false, err.Error())
+		}
+		writeError(w, err)
+		return
+	}
+	defer rsp.Body.Close()
+
+	// Pass the agent's status through (e.g. 429/503 with Retry-After) along with the stream headers
+	relayResponseHeaders(w, rsp.Header)
+	w.Header().Set("X-Accel-Buffering", "no")
+	w.WriteHeader(rsp.StatusCode)
+	flusher.Flush()
+
+	// Relay and flush each chunk as it is read
+	buf := make([]byte, 4096)
+	relayed := 0
+	for {
+		n, readErr := rsp.Body.Read(buf)
+		if n > 0 {
+			if _, err := w.Write(buf[:n]); err != nil {
+				log.Printf("[%s] Client went away after %d bytes: %v", requestID, relayed, err)
+				return
+			}
+			flusher.Flush()
+			relayed += n
+		}
+		if readErr == io.EOF {
+			break
+		}
+		if readErr != nil {
+			log.Printf("[%s] Failed to read agent stream after %d bytes: %v", requestID, relayed, readErr)
+			return
+		}
+	}
+	log.Printf("[%s] Finished streaming response (%d bytes)", requestID, relayed)
+}
+
+// healthHandler reports the gateway's view of its agents: health, in-flight requests and cached answers
+func (g *gateway) healthHandler(w http.ResponseWriter, r *http.Request) {
+	type agentStatus struct {
+		URL      string `json:"url"`
+		Healthy  bool   `json:"healthy"`
+		Inflight int    `json:"inflight"`
+	}
+	status := struct {
+		Agents        []agentStatus `json:"agents"`
+		CachedAnswers int           `json:"cached_answers"`
+	}{CachedAnswers: g.cache.len()}
+	for _, b := range g.pool.backends {
+		status.Agents = append(status.Agents, agentStatus{URL: b.url, Healthy: b.healthy.Load(), Inflight: len(b.slots)})
+	}
 	w.Header().Set("Content-Type", "application/json")
-	w.Write(body)
+	json.NewEncoder(w).Encode(status)
 }
 
 func main() {
-	// Register the /query endpoint with the handler
-	http.HandleFunc("/query", handler)
-	log.Println("Go backend running on :8081")
-	// Start the HTTP server on port 8081
-	log.Fatal(http.ListenAndServe(":8081", nil))
+	cfg := configFromEnv()
+	g := newGateway(cfg)
+	g.pool.checkHealth()
+	go g.pool.watchHealth(cfg.healthCheckInterval)
+
+	// Listen on GATEWAY_ADDR (default :8081). There is no write timeout, since streams stay open while the LLM generates.
+	server := &http.Server{
+		Addr:              getenv("GATEWAY_ADDR", ":8081"),
+		Handler:           g.routes(),
+		ReadHeaderTimeout: 5 * time.Second,
+		ReadTimeout:       30 * time.Second,
+		IdleTimeout:       120 * time.Second,
+	}
+	log.Printf("Go backend running on %s, forwarding to %s", server.Addr, strings.Join(cfg.agentURLs, ", "))
+	log.Fatal(server.ListenAndServe())
 }
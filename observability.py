@@ -0,0 +1,343 @@
+# observability.py
+# Metrics, request tracing and slow-request profiling for the RAG agent.
+# Metrics live in-process and are rendered in the Prometheus text format for /metrics (no client library needed);
+# every request gets a request id and W3C trace context (taken from the Go gateway's headers when present) that is
+# echoed in log lines and response headers; an opt-in sampling profiler writes a flamegraph of each slow request.
+
+import logging
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets from cache hits (~ms) to slow GPT-4 generations (~minute)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        with self._lock:
+            samples = list(self._samples())
+        return "\n".join([f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *samples])
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> Iterable[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; with `function`, the value is read at scrape time instead"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels: str):
+        """Count the enclosed block as in progress"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self) -> Iterable[str]:
+        if self.function is not None:
+            yield f"{self.name} {_format_value(self.function())}"
+            return
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def _samples(self) -> Iterable[str]:
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Time spent in each pipeline stage, per call", ["stage"])
+REQUEST_SECONDS = Histogram("rag_http_request_seconds", "HTTP request latency", ["method", "path", "status"])
+REQUESTS_IN_PROGRESS = Gauge("rag_http_requests_in_progress", "HTTP requests being served")
+
+
+@dataclass
+class RequestContext:
+    request_id: str
+    trace_id: str
+    span_id: str  # This service's span; the caller's span id is the parent
+    trace_flags: str = "01"
+    started: float = field(default_factory=time.perf_counter)
+    stages: Dict[str, float] = field(default_factory=dict)  # Stage -> seconds spent in it for this request
+
+    @classmethod
+    def from_headers(cls, headers: Dict[str, str]) -> "RequestContext":
+        """Continue the caller's trace (W3C traceparent) and keep its X-Request-ID, or start new ones"""
+        request_id = headers.get("x-request-id", "")
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = secrets.token_hex(8)
+        match = TRACEPARENT_PATTERN.match(headers.get("traceparent", "").strip().lower())
+        trace_id, trace_flags = (match.group(1), match.group(3)) if match else (secrets.token_hex(16), "01")
+        return cls(request_id=request_id, trace_id=trace_id, span_id=secrets.token_hex(8), trace_flags=trace_flags)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{self.trace_flags}"
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items())
+
+
+request_context: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Add time spent in a pipeline stage to the stage histogram and to the current request's breakdown"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    context = request_context.get()
+    if context is not None:
+        context.stages[stage] = context.stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """Time the enclosed block (or decorated sync function) as one call of a pipeline stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds the current request id to log records (as `request_id`, "-" outside requests)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = request_context.get()
+        record.request_id = context.request_id if context is not None else "-"
+        return True
+
+
+def install_request_id_logging() -> None:
+    """Make %(request_id)s available to the root handlers' format"""
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(RequestIdFilter())
+
+
+class SlowRequestProfiler:
+    """Sampling profiler for slow requests.
+
+    A background thread samples every thread's stack each `interval` seconds and keeps the last
+    `window` seconds of samples. When a request takes longer than `threshold` seconds, the samples
+    taken while it ran are written to `output_dir` as collapsed stacks, ready for flamegraph.pl or
+    speedscope. Concurrent requests share the event loop thread, so their samples overlap.
+    """
+
+    def __init__(self, threshold: float, output_dir: str, interval: float = 0.005, window: float = 120.0):
+        self.threshold = threshold
+        self.output_dir = output_dir
+        self.interval = interval
+        self.window = window
+        self._samples: deque = deque()  # (perf_counter time, "thread;frame;frame...")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+        self._thread.start()
+        logging.info(f"Profiling requests slower than {self.threshold * 1000:.0f} ms into {self.output_dir}/.")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if names.get(thread_id) != "MainThread" and self._is_idle(frame):
+                    continue
+                self._samples.append((now, f"{names.get(thread_id, thread_id)};{self._fold(frame)}"))
+            while self._samples and self._samples[0][0] < now - self.window:
+                self._samples.popleft()
+
+    @staticmethod
+    def _is_idle(frame) -> bool:
+        """Pool workers waiting for work (the event loop's own idle time in select() is kept)"""
+        filename = frame.f_code.co_filename
+        return filename.endswith(("threading.py", "queue.py")) or (
+            frame.f_code.co_name == "_worker" and filename.endswith(os.path.join("futures", "thread.py"))
+        )
+
+    @staticmethod
+    def _fold(frame) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})")
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+    def record(self, context: RequestContext, elapsed: float) -> Optional[str]:
+        """Write the request's samples if it was slow; returns the file written"""
+        if elapsed < self.threshold:
+            return None
+        stacks = StackCounter(stack for sampled_at, stack in list(self._samples) if sampled_at >= context.started)
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{context.request_id}.folded")
+        with open(path, "w", encoding='utf-8') as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        logging.warning(
+            f"Slow request ({elapsed * 1000:.0f} ms): wrote {sum(stacks.values())} stack samples to {path}"
+        )
+        return path
+
+
+class ObservabilityMiddleware:
+    """ASGI middleware: request context, latency histogram, in-progress gauge, trace headers and profiling"""
+
+    def __init__(self, app, profiler: Optional[SlowRequestProfiler] = None,
+                 quiet_paths: Sequence[str] = ("/health", "/ready", "/metrics")):
+        self.app = app
+        self.profiler = profiler
+        self.quiet_paths = set(quiet_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        context = RequestContext.from_headers(headers)
+        token = request_context.set(context)
+        status = 500
+
+        async def send_with_trace_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                extra = [(b"x-request-id", context.request_id.encode()), (b"traceparent", context.traceparent.encode())]
+                if context.stages:
+                    extra.append((b"server-timing", context.server_timing().encode()))
+                message = {**message, "headers": [*message.get("headers", []), *extra]}
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_trace_headers)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            elapsed = time.perf_counter() - context.started
+            route = scope.get("route")
+            path = getattr(route, "path", "other")  # Route template, so unknown URLs cannot blow up label cardinality
+            REQUEST_SECONDS.observe(elapsed, method=scope["method"], path=path, status=str(status))
+            if scope["path"] not in self.quiet_paths:
+                stages = ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in context.stages.items())
+                logging.info(
+                    f"{scope['method']} {scope['path']} -> {status} in {elapsed * 1000:.0f} ms "
+                    f"(trace {context.trace_id}{'; ' + stages if stages else ''})"
+                )
+                if self.profiler is not None:
+                    self.profiler.record(context, elapsed)
+            request_context.reset(token)
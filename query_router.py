@@ -0,0 +1,141 @@
+# query_router.py
+# Local, LLM-free routing of questions before the RAG chain. A keyword/regex classifier sorts each question into
+# off_topic (refused without retrieval), stats (aggregates answered from compensation_stats), lookup ("show me
+# Doordash E4 India posts": the matching posts, listed from retrieval results and their stored fields) or summarize
+# (the LLM). Also validates LLM answers, so a cheap model's output can be escalated to GPT-4 when it is unusable.
+
+import json
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from compensation_extractor import LOCATION_PATTERN, CompensationRecord
+from compensation_stats import INDIA_LOCATIONS, format_money, parse_stats_query
+from hybrid_retrieval import LEVEL_PATTERN, extract_level, extract_query_filters, normalize_location
+
+ROUTES = ("off_topic", "stats", "lookup", "summarize")
+
+OFF_TOPIC_REPLY = (
+    "I can only help with compensation, salaries, job roles, companies and career questions. "
+    "Try asking about offers at a company, level or location."
+)
+
+# Words that put a question in scope even when it names no company, level or location
+DOMAIN_PATTERN = re.compile(
+    r"\b(compensations?|comp|salary|salaries|pay|paid|paying|payscale|ctc|tc|lpa|lakhs?|lacs?|crores?|base|bonus(es)?|"
+    r"stocks?|equity|rsus?|esops?|vesting|offers?|joining|hikes?|appraisals?|increments?|packages?|sde|swe|sdet|"
+    r"engineers?|developers?|interns?|internships?|levels?|promotions?|yoe|experience|interviews?|jobs?|roles?|"
+    r"careers?|switch(ing)?|compan(y|ies)|employers?|hiring|recruiters?|negotiat\w*|layoffs?|notice period|resumes?|"
+    r"startups?|faang|maang|mnc|leetcode|remuneration|earn(s|ing)?|income|wages?|perks|benefits)\b",
+    re.IGNORECASE
+)
+
+# "show me ... posts", "list offers for ...", "links for ...", "Flipkart SDE 2 posts": the answer is the posts themselves
+LOOKUP_PATTERN = re.compile(
+    r"^\s*(?:please\s+)?(?:show|list|find|get|fetch|display|give)\b.*\b(?:posts?|offers?|links?|urls?|entries|data|details|numbers)\b"
+    r"|\b(?:posts?|links?|urls?)\s+(?:for|about|from|on|of)\b|\b(?:posts|offers)\s*[?.!]?\s*$",
+    re.IGNORECASE
+)
+
+# Anything that needs reasoning over the posts rather than listing them goes to the LLM
+ANALYSIS_PATTERN = re.compile(
+    r"\b(why|should|which|better|best|worst|highest|lowest|most|least|compare|comparison|difference|"
+    r"recommend|advice|negotiat\w*|worth|good|fair|explain|summar\w*|insights?|trends?|change[ds]?|vs\.?|versus)\b",
+    re.IGNORECASE
+)
+
+# Constraints a lookup cannot apply (it filters on company, level and location only)
+UNSUPPORTED_CONSTRAINT_PATTERN = re.compile(
+    r"\b(20[12]\d|after|before|since|until|between|latest|recent|last|this year|yoe|years?|months?|"
+    r"jan(uary)?|feb(ruary)?|mar(ch)?|apr(il)?|may|june?|july?|aug(ust)?|sep(tember)?|oct(ober)?|nov(ember)?|dec(ember)?)\b",
+    re.IGNORECASE
+)
+
+
+def is_lookup(query: str, filters: Dict) -> bool:
+    """A request to list posts, constrained only by one level and one location (and any companies)"""
+    if not filters or not LOOKUP_PATTERN.search(query) or ANALYSIS_PATTERN.search(query):
+        return False
+    if UNSUPPORTED_CONSTRAINT_PATTERN.search(query):
+        return False
+    levels = {extract_level(match.group(0)) for match in LEVEL_PATTERN.finditer(query)}
+    locations = {normalize_location(match.group(0)) for match in LOCATION_PATTERN.finditer(query)}
+    return len(levels) <= 1 and len(locations) <= 1
+
+
+def classify_query(query: str, known_companies: Set[str]) -> Tuple[str, str]:
+    """(route, reason) for a question; errs towards summarize, since the LLM can answer anything the others can"""
+    filters = extract_query_filters(query, known_companies)
+    if not filters and not DOMAIN_PATTERN.search(query):
+        return "off_topic", "no company, level, location or compensation terms"
+    if parse_stats_query(query, known_companies) is not None:
+        return "stats", "aggregate question"
+    if is_lookup(query, filters):
+        return "lookup", "listing request with " + ", ".join(sorted(filters))
+    return "summarize", "needs a written answer"
+
+
+def matches_lookup(metadata: Dict, filters: Dict) -> bool:
+    """Whether a post's stored fields satisfy every filter of a lookup ("india" covers every Indian city)"""
+    if filters.get("company") and metadata.get("company") not in filters["company"]:
+        return False
+    if filters.get("level") and metadata.get("level") != filters["level"]:
+        return False
+    location = filters.get("location")
+    if location == "india":
+        return metadata.get("location") in INDIA_LOCATIONS
+    return not location or metadata.get("location") == location
+
+
+def describe_filters(filters: Dict) -> str:
+    companies = filters.get("company", [])
+    # A noisy company name that merely extends another one ("google l4") adds nothing to the description
+    companies = [name for name in companies if not any(name.startswith(f"{other} ") for other in companies)]
+    return " ".join(part for part in (
+        "/".join(companies).title(),
+        filters.get("level", "").upper(),
+        f"in {filters['location'].title()}" if filters.get("location") else "",
+    ) if part)
+
+
+def summarize_lookup(filters: Dict, records: List[CompensationRecord], max_posts: int = 5) -> str:
+    """Plain-language listing of the posts a lookup found, from their extracted figures"""
+    lines = [f"Found {len(records)} matching post{'' if len(records) == 1 else 's'} for {describe_filters(filters)}."]
+    for record in records[:max_posts]:
+        figures = ", ".join(
+            f"{label} {format_money(amount, currency)}"
+            for label, amount, currency in (
+                ("total", record.total_compensation, record.total_compensation_currency),
+                ("base", record.base_salary, record.base_salary_currency),
+                ("stock", record.equity, record.equity_currency),
+                ("bonus", record.bonus, record.bonus_currency),
+            ) if amount is not None
+        )
+        details = ", ".join(part for part in (
+            record.title,
+            record.location,
+            f"{record.experience_years:g} YOE" if record.experience_years is not None else "",
+            record.created_at[:10],
+        ) if part)
+        lines.append(f"{record.company or 'Unnamed company'} ({details}): {figures or 'no figures extracted'}.")
+    if len(records) > max_posts:
+        lines.append(f"The cards below cover all {len(records)} posts.")
+    return " ".join(lines)
+
+
+def validate_answer(answer: str) -> Optional[str]:
+    """Why an LLM answer does not meet the response schema (None when it does).
+
+    The answer must be a single JSON object with a boolean 'off_topic' and a non-empty string 'summary'.
+    """
+    match = re.search(r"\{.*\}", answer, re.DOTALL)
+    if not match:
+        return "no_json"
+    try:
+        parsed = json.loads(match.group(0))
+    except ValueError:
+        return "invalid_json"
+    if not isinstance(parsed, dict) or not isinstance(parsed.get("off_topic"), bool):
+        return "bad_off_topic"
+    if not isinstance(parsed.get("summary"), str) or not parsed["summary"].strip():
+        return "bad_summary"
+    return None
@@ -2,26 +2,75 @@
 # This is a Python backend service that uses FastAPI and LangChain to answer job compensation-related queries using RAG (Retrieval-Augmented Generation).
 # The service loads real LeetCode compensation data, builds a vector database, and uses an LLM (GPT-4) to answer questions via an HTTP API.
 
-from fastapi import FastAPI  # Web framework for building APIs
+from fastapi import FastAPI, HTTPException  # Web framework for building APIs
+from fastapi.responses import Response, StreamingResponse  # For server-sent events on /query/stream and /metrics
 from pydantic import BaseModel  # For data validation and request/response models
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI  # For generating embeddings and chat LLM interface
+from langchain_openai import ChatOpenAI  # Chat LLM interface
 from langchain_chroma import Chroma  # Vector database for storing embeddings
-from langchain.chains import RetrievalQA  # Retrieval-augmented QA chain
-from langchain.text_splitter import RecursiveCharacterTextSplitter  # For splitting documents into chunks
 from langchain.docstore.document import Document  # Document wrapper for LangChain
 from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate  # For prompt engineering
+import asyncio  # For bounding and coalescing concurrent queries
 import json  # For loading JSON data
 import os  # For environment variables
+import re  # For locating the JSON object in the LLM output
+import shutil  # For swapping staged index directories
+import time  # For measuring startup time
 import logging
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar  # The index version a request started on
+from dataclasses import dataclass, field
+from semantic_cache import SemanticCache  # Exact + embedding-similarity cache of parsed answers
+from compensation_extractor import (  # Ingest-time card extraction
+    DATA_FILE, TABLE_FILE, build_compensation_table, load_compensation_table, save_compensation_table
+)
+from ingest import (  # Incremental, content-hashed vectorstore ingestion
+    PERSIST_DIR, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES, cached_embeddings, check_index_embedding, ingest, index_version, read_manifest
+)
+from index_snapshot import (  # Memory-mapped read-only index versions
+    SnapshotVectorStore, check_snapshot_embedding, export_snapshot, prune_snapshots
+)
+from embedding_providers import LEGACY_EMBEDDING_IDENTITY, create_embeddings  # OpenAI or local ONNX embeddings
+from hybrid_retrieval import HybridRetriever, KeywordIndex, dense_search_many, extract_query_filters  # Metadata filters + BM25 + rank fusion
+from stream_parser import DELTA, VALUE, StreamingJSONParser  # Incremental parsing of the streamed answer
+from compensation_stats import STATS_FILE, CompensationStats, parse_stats_query, summarize_stats  # LLM-free aggregates
+from context_packing import TokenCounter, pack_context, post_key  # Merge, de-boilerplate and budget the prompt context
+from query_router import (  # Local classifier that keeps questions off the LLM where it can
+    OFF_TOPIC_REPLY, classify_query, matches_lookup, summarize_lookup, validate_answer
+)
+from observability import (  # Prometheus metrics, request ids / trace context and slow-request profiling
+    METRICS_CONTENT_TYPE, Counter, Gauge, Histogram, ObservabilityMiddleware, SlowRequestProfiler,
+    install_request_id_logging, observe_stage, record_stage, render_metrics
+)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Configure logging (every line carries the id of the request it belongs to)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s')
+install_request_id_logging()
 
 # Set your OpenAI API key (for demo only; use environment variables in production)
-os.environ["OPENAI_API_KEY"] = ""
+os.environ.setdefault("OPENAI_API_KEY", "")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Heavy initialization runs in the background so the process is live while the index loads;
+    # /ready reports when the agent can take traffic.
+    warm_up_task = asyncio.create_task(warm_up())
+    if profiler is not None:
+        profiler.start()
+    yield
+    if not warm_up_task.done():
+        warm_up_task.cancel()
+    if reload_task is not None and not reload_task.done():
+        reload_task.cancel()
+    if profiler is not None:
+        profiler.stop()
+    if embedding is not None:
+        embedding.cache.flush()
+    # Persist cached answers so they survive restarts
+    if SEMANTIC_CACHE_PATH and ready:
+        response_cache.save(SEMANTIC_CACHE_PATH)
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 logging.info("FastAPI app initialized.")
 
@@ -51,83 +100,48 @@ class AgentResponse(BaseModel):
     compensation_data: list[CompensationCard] = []  # Structured compensation data
     source_links: list[str] = []  # LeetCode discussion links for grounding
 
-# Ensure the OpenAI API key is set
-if not os.environ.get("OPENAI_API_KEY"):
-    raise RuntimeError("OPENAI_API_KEY environment variable not set. Please set it before running the agent.")
-
-# Load scraped LeetCode compensation data from JSON file
-logging.info("Loading LeetCode compensation data...")
-with open("leetcode_compensation_data.json", "r", encoding='utf-8') as f:
-    data = json.load(f)
-
-logging.info(f"Loaded {len(data)} compensation posts from LeetCode")
-
-# Convert each LeetCode compensation post to a text document for retrieval
-raw_docs = []
-for entry in data:
-    # Create a comprehensive text representation of each compensation post
-    doc_text = (
-        f"Title: {entry['title']}\n"
-        f"Author: {entry['author']}\n"
-        f"Created: {entry['created_at']}\n"
-        f"Content: {entry['content']}\n"
-        f"Summary: {entry['summary']}\n"
-        f"Tags: {', '.join(entry['tags'])}\n"
-        f"URL: {entry['url']}\n"
-        f"Topic ID: {entry['topic_id']}"
-    )
-    raw_docs.append(Document(page_content=doc_text))
-
-logging.info(f"Created {len(raw_docs)} documents for retrieval.")
-
-# Split documents into smaller chunks for better retrieval
-# Using larger chunks since LeetCode posts contain more detailed information
-splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-chunks = splitter.split_documents(raw_docs)
-logging.info(f"Split documents into {len(chunks)} chunks.")
-
-# Create embeddings for each chunk using OpenAI
-embedding = OpenAIEmbeddings()
-
-# Store embeddings in a Chroma vector database (persistent)
-PERSIST_DIR = "chroma_db"
-if not os.path.exists(PERSIST_DIR):
-    logging.info(f"Creating new vectorstore in {PERSIST_DIR}...")
-    # First run: create and persist the vectorstore
-    vectorstore = Chroma.from_documents(chunks, embedding, persist_directory=PERSIST_DIR)
-    logging.info("Vectorstore created and persisted.")
-else:
-    logging.info(f"Loading persistent vectorstore from {PERSIST_DIR}...")
-    # Load the persistent vectorstore
-    vectorstore = Chroma(embedding_function=embedding, persist_directory=PERSIST_DIR)
-    logging.info("Vectorstore loaded.")
+class StatsRequest(BaseModel):
+    metric: str = "total_compensation"  # total_compensation, base_salary, equity or bonus
+    currency: str = ""  # Currency to report amounts in (default STATS_CURRENCY)
+    company: list[str] = []  # Canonical company keys, e.g. ["google", "amazon"]
+    level: str = ""  # e.g. "sde2", "l4", "e4", "smts"
+    location: str = ""  # e.g. "bangalore"; "india" covers every Indian city
+    min_yoe: float | None = None
+    max_yoe: float | None = None
+    since: str = ""  # ISO date, inclusive
+    until: str = ""  # ISO date, inclusive
+    group_by: list[str] = []  # Any of company, level, location, yoe, year
+    trend: bool = False  # Add a per-year median to each group
+
+class BatchQueryRequest(BaseModel):
+    queries: list[str]  # Questions to answer; duplicates are answered once
 
-# Create a retriever to fetch relevant chunks for a query
-# Increased k to get more context from the larger dataset
-retriever = vectorstore.as_retriever(search_kwargs={"k": 8})
-logging.info("Retriever created.")
+class BatchQueryResult(BaseModel):
+    query: str
+    response: AgentResponse | None = None  # Set on success
+    status_code: int = 200
+    error: str | None = None  # Set when this item failed; the other items are unaffected
 
-# System prompt to instruct the LLM to return a JSON object containing a summary and a JSON array of compensation objects.
+class BatchQueryResponse(BaseModel):
+    results: list[BatchQueryResult]  # One per input query, in input order
+
+# System prompt to instruct the LLM to return a short JSON summary.
+# Compensation cards are assembled from the ingest-time compensation table, not generated by the LLM.
 system_instruction = (
     "You are a helpful assistant for job switchers and professionals seeking compensation information. "
     "You have access to real LeetCode compensation data from various companies and roles. "
     "Only answer questions related to compensation, salaries, job roles, companies, or career advice. "
-    "If the question is unrelated to compensation or careers, politely respond with a JSON object containing an error message. "
     "\n\n"
-    "Your response must be a single JSON object with two keys: 'summary' and 'compensation_cards'. "
+    "Your response must be a single JSON object with two keys, in this order: 'off_topic' and 'summary'. "
     "The 'summary' key should contain a concise, natural-language summary of the compensation trends based on the user's query and the retrieved data. "
-    "The 'compensation_cards' key must contain a JSON array of objects, where each object represents a relevant LeetCode post and follows this schema: "
-    "id, company, title, total_compensation, total_compensation_currency, base_salary, base_salary_currency, equity, equity_currency, bonus, bonus_currency, experience, location, url, created_at. "
-    "For all currency fields, always use a valid ISO 4217 currency code (e.g., 'INR', 'USD', 'EUR', 'GBP', etc.). Do not use non-standard codes like 'LPA INR'. "
-    "If the compensation is mentioned in units like 'LPA', 'lakhs', or 'crores', convert them to the full numeric value in the appropriate currency (e.g., '35 LPA INR' should be '3500000' with currency 'INR'). "
-    "If a field is not mentioned in a post, use 'Not specified' or an empty string. "
+    "When quoting amounts, state the currency and convert units like 'LPA', 'lakhs' or 'crores' into readable figures. "
+    "If the question is unrelated to compensation or careers, set 'off_topic' to true and put a polite refusal in 'summary'; otherwise set 'off_topic' to false. "
     "Example output:"
     '{{'
-    '  "summary": "For a Software Engineer in London, the average total compensation is around $120,000, with base salaries ranging from $90,000 to $110,000. Tech giants like Google and Meta tend to offer higher equity components.",'
-    '  "compensation_cards": [{{"id": "123", "company": "Amazon", "title": "SDE1", "total_compensation": "150000", "total_compensation_currency": "USD", "base_salary": "120000", "base_salary_currency": "USD", "equity": "20000", "equity_currency": "USD", "bonus": "10000", "bonus_currency": "USD", "experience": "2 years", "location": "Seattle", "url": "https://leetcode.com/discuss/post/123", "created_at": "2024-01-01"}}]'
+    '  "off_topic": false,'
+    '  "summary": "For a Software Engineer in London, the average total compensation is around $120,000, with base salaries ranging from $90,000 to $110,000. Tech giants like Google and Meta tend to offer higher equity components."'
     '}}'
     "\nReturn only the JSON object and nothing else. "
-    "Be precise and extract each component and its currency individually from the post content. "
 )
 
 # Build a prompt template for the LLM (must include {context} and {question})
@@ -136,72 +150,1167 @@ prompt = ChatPromptTemplate.from_messages([
     HumanMessagePromptTemplate.from_template("Context:\n{context}\n\nQuestion:\n{question}")
 ])
 
-# Initialize the LLM (GPT-4) and the RetrievalQA chain
-llm = ChatOpenAI(model_name="gpt-4", temperature=0)
-qa_chain = RetrievalQA.from_chain_type(
-    llm=llm,
-    retriever=retriever,
-    return_source_documents=True,  # Changed to True to get source documents
-    chain_type_kwargs={"prompt": prompt}
+# Concurrency controls for the /query path.
+# Only MAX_CONCURRENT_LLM_CALLS chains run at once; up to MAX_QUEUED_QUERIES more may wait
+# for a slot (for at most QUEUE_TIMEOUT_SECONDS) before we push back with 429/503.
+MAX_CONCURRENT_LLM_CALLS = int(os.environ.get("MAX_CONCURRENT_LLM_CALLS", "8"))
+MAX_QUEUED_QUERIES = int(os.environ.get("MAX_QUEUED_QUERIES", "32"))
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get("QUEUE_TIMEOUT_SECONDS", "30"))
+
+# Semantic response cache settings. Near hits need cosine similarity >= SEMANTIC_CACHE_THRESHOLD;
+# set SEMANTIC_CACHE_PATH to persist the cache across restarts.
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.environ.get("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+SEMANTIC_CACHE_PATH = os.environ.get("SEMANTIC_CACHE_PATH", "")
+
+# Retrieval settings. "hybrid" fuses metadata-filtered dense search with BM25; "dense" is plain similarity search.
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+RETRIEVAL_K = int(os.environ.get("RETRIEVAL_K", "5"))
+
+# Aggregate questions ("median TC for SDE2 in Bangalore") are answered from the numeric compensation table
+# instead of the LLM when STATS_ROUTING is on and at least STATS_MIN_SAMPLE posts match.
+STATS_ROUTING = os.environ.get("STATS_ROUTING", "true").lower() == "true"
+STATS_MIN_SAMPLE = int(os.environ.get("STATS_MIN_SAMPLE", "5"))
+STATS_CURRENCY = os.environ.get("STATS_CURRENCY", "INR")
+
+# Query routing: a local classifier refuses off-topic questions and answers post listings ("show me Doordash E4
+# India posts") from the retrieved posts, without an LLM. Written answers come from FAST_LLM_MODEL and are re-run
+# on GPT-4 only when its output fails schema validation. QUERY_ROUTING=false sends every question to GPT-4
+# (aggregates still follow STATS_ROUTING); an empty FAST_LLM_MODEL keeps the routes but answers with GPT-4.
+QUERY_ROUTING = os.environ.get("QUERY_ROUTING", "true").lower() == "true"
+FAST_LLM_MODEL = os.environ.get("FAST_LLM_MODEL", "gpt-4o-mini")
+
+# Context assembly: retrieved chunks are merged per post and packed into at most CONTEXT_TOKEN_BUDGET tokens.
+# Set CONTEXT_MMR_LAMBDA (e.g. 0.7; 1.0 = pure relevance) to order posts by maximal marginal relevance.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MMR_LAMBDA = float(os.environ["CONTEXT_MMR_LAMBDA"]) if os.environ.get("CONTEXT_MMR_LAMBDA") else None
+
+# Batch settings: at most MAX_BATCH_QUERIES questions per /query/batch call, and at most
+# BATCH_CONCURRENCY of its LLM calls queued for a slot at once (so one batch cannot fill the wait queue).
+MAX_BATCH_QUERIES = int(os.environ.get("MAX_BATCH_QUERIES", "100"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", str(MAX_CONCURRENT_LLM_CALLS)))
+
+# Observability. LLM cost is estimated from token counts at these USD prices per 1K tokens (GPT-4 8K and
+# gpt-4o-mini list prices).
+# Set PROFILE_SLOW_REQUESTS_MS to write a flamegraph (collapsed stacks) of every slower request to PROFILE_DIR.
+LLM_PROMPT_COST_PER_1K = float(os.environ.get("LLM_PROMPT_COST_PER_1K", "0.03"))
+LLM_COMPLETION_COST_PER_1K = float(os.environ.get("LLM_COMPLETION_COST_PER_1K", "0.06"))
+FAST_LLM_PROMPT_COST_PER_1K = float(os.environ.get("FAST_LLM_PROMPT_COST_PER_1K", "0.00015"))
+FAST_LLM_COMPLETION_COST_PER_1K = float(os.environ.get("FAST_LLM_COMPLETION_COST_PER_1K", "0.0006"))
+PROFILE_SLOW_REQUESTS_MS = float(os.environ.get("PROFILE_SLOW_REQUESTS_MS", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+# Embeddings: "openai" (EMBEDDING_MODEL) or "local", an ONNX sentence-transformers export run on CPU so that
+# retrieval needs no network. Query and chunk vectors are cached on disk, up to EMBEDDING_CACHE_MAX_ENTRIES.
+EMBEDDING_PROVIDER = os.environ.get("EMBEDDING_PROVIDER", "openai")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "")
+LOCAL_EMBEDDING_MODEL_PATH = os.environ.get("LOCAL_EMBEDDING_MODEL_PATH", "models/all-MiniLM-L6-v2")
+
+# serve.py exports the index to a read-only snapshot here, which its worker processes share.
+# POST /admin/reload builds a new snapshot version from the current corpus and swaps it in; the old version is
+# removed once the requests still using it have finished (with a warning every RELOAD_DRAIN_TIMEOUT_SECONDS until then).
+INDEX_SNAPSHOT_DIR = os.environ.get("INDEX_SNAPSHOT_DIR", "index_snapshots")
+RELOAD_DRAIN_TIMEOUT_SECONDS = float(os.environ.get("RELOAD_DRAIN_TIMEOUT_SECONDS", "120"))
+
+response_cache = SemanticCache(
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+    similarity_threshold=SEMANTIC_CACHE_THRESHOLD
+)
+llm_slots = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+queued_queries = 0  # Requests currently waiting for an LLM slot
+inflight_queries: dict[str, asyncio.Task] = {}  # Normalized query -> running task, for coalescing
+
+profiler = SlowRequestProfiler(PROFILE_SLOW_REQUESTS_MS / 1000, PROFILE_DIR) if PROFILE_SLOW_REQUESTS_MS > 0 else None
+app.add_middleware(ObservabilityMiddleware, profiler=profiler)
+
+# Pipeline metrics served on /metrics (stage latencies are recorded by observe_stage)
+LLM_PROMPT_TOKENS = Counter("rag_llm_prompt_tokens_total", "Prompt tokens sent to the LLM", ["model"])
+LLM_COMPLETION_TOKENS = Counter("rag_llm_completion_tokens_total", "Completion tokens generated by the LLM", ["model"])
+LLM_COST = Counter("rag_llm_cost_usd_total", "Estimated LLM spend in USD", ["model"])
+LLM_ESCALATIONS = Counter(
+    "rag_llm_escalations_total", "Fast-model answers that failed validation and were re-run on GPT-4", ["reason"]
+)
+QUERY_ROUTES = Counter("rag_query_routes_total", "Queries by the route that answered them", ["route"])
+ROUTE_LATENCY = Histogram("rag_route_latency_seconds", "Query latency by the route that answered it", ["route"])
+RETRIEVED_DOCUMENTS = Histogram(
+    "rag_retrieved_documents", "Chunks retrieved per query", buckets=(0, 1, 2, 3, 5, 8, 13, 21)
+)
+PARSE_FALLBACKS = Counter(
+    "rag_answer_parse_fallbacks_total", "LLM answers returned raw because they were not valid JSON", ["reason"]
+)
+LLM_SLOTS_IN_USE = Gauge("rag_llm_slots_in_use", "LLM concurrency slots held")
+QUEUED_QUERIES = Gauge("rag_queued_queries", "Requests waiting for an LLM slot", function=lambda: queued_queries)
+INFLIGHT_QUERIES = Gauge(
+    "rag_inflight_queries", "Distinct queries being answered (identical ones are coalesced)",
+    function=lambda: len(inflight_queries)
 )
+EMBEDDING_CACHE_ENTRIES = Gauge(
+    "rag_embedding_cache_entries", "Vectors in the on-disk embedding cache",
+    function=lambda: len(embedding.cache) if embedding is not None else 0
+)
+EMBEDDING_CACHE_HITS = Gauge(
+    "rag_embedding_cache_hits", "Texts answered from the embedding cache since startup",
+    function=lambda: embedding.cache.stats["hits"] if embedding is not None else 0
+)
+EMBEDDING_PROVIDER_CALLS = Gauge(
+    "rag_embedding_provider_calls", "Batched calls to the embedding provider since startup",
+    function=lambda: embedding.stats["provider_calls"] if embedding is not None else 0
+)
+INDEX_RELOADS = Counter("rag_index_reloads_total", "Index reloads by outcome (swapped, unchanged, failed)", ["outcome"])
+DRAINING_REQUESTS = Gauge(
+    "rag_index_draining_requests", "Requests still running on an index version a reload replaced",
+    function=lambda: sum(state.active_requests for state in retired_indexes)
+)
+
+
+@dataclass
+class IndexState:
+    """Everything built from one version of the index and corpus, replaced as a whole by a reload"""
+    version: str
+    vectorstore: Chroma | SnapshotVectorStore
+    retriever: HybridRetriever | None  # None in dense mode: retrieve_many searches the vectorstore directly
+    compensation_table: dict
+    compensation_stats: CompensationStats
+    loaded_at: float = field(default_factory=time.time)
+    active_requests: int = 0  # Requests pinned to this version by pin_index()
+
+
+# Heavy state, built by initialize() at startup instead of at import time
+embedding = None
+llm = None
+fast_llm = None  # FAST_LLM_MODEL when query routing is on, else None
+token_counter = None
+index: IndexState | None = None  # The active version; reload_index() replaces it between requests
+ready = False  # True once initialize() has finished
+startup_seconds = None
+startup_error = None
+
+pinned_index: ContextVar[IndexState | None] = ContextVar("pinned_index", default=None)
+retired_indexes: list[IndexState] = []  # Replaced versions that requests are still running on
+reload_task: asyncio.Task | None = None
+last_reload: dict | None = None  # Outcome of the latest reload, for /admin/index
+reload_hook = None  # Set by serve.py in its workers: the master rebuilds once and restarts the workers instead
+
+
+def load_corpus() -> list[dict]:
+    """Load scraped LeetCode compensation data from the JSON file"""
+    logging.info("Loading LeetCode compensation data...")
+    with open(DATA_FILE, "r", encoding='utf-8') as f:
+        data = json.load(f)
+    logging.info(f"Loaded {len(data)} compensation posts from LeetCode")
+    return data
+
+
+def create_embedding():
+    """Embedding model for chunks and queries, behind the persistent embedding cache"""
+    cached = cached_embeddings(
+        create_embeddings(EMBEDDING_PROVIDER, EMBEDDING_MODEL, LOCAL_EMBEDDING_MODEL_PATH),
+        EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES
+    )
+    logging.info(f"Embedding with {cached.identity} ({len(cached.cache)} cached vectors).")
+    return cached
+
+
+def open_vectorstore(embedding) -> tuple[Chroma, list[dict] | None]:
+    """Open the persistent Chroma index, building it on first run; also returns the corpus if it was loaded"""
+    # Store embeddings in a Chroma vector database (persistent)
+    if not os.path.exists(PERSIST_DIR):
+        logging.info(f"Creating new vectorstore in {PERSIST_DIR}...")
+        # First run: chunk, embed and persist the whole corpus (later refreshes run `python ingest.py`)
+        data = load_corpus()
+        vectorstore = ingest(data, embedding, PERSIST_DIR)
+        logging.info("Vectorstore created and persisted.")
+        return vectorstore, data
+    logging.info(f"Loading persistent vectorstore from {PERSIST_DIR}...")
+    # Load the persistent vectorstore
+    vectorstore = Chroma(embedding_function=embedding, persist_directory=PERSIST_DIR)
+    # Vectors from another model would silently return garbage neighbours
+    check_index_embedding(vectorstore, embedding, PERSIST_DIR)
+    logging.info("Vectorstore loaded.")
+    return vectorstore, None
+
+
+def export_index_snapshot(refresh: bool = False) -> str:
+    """Open (or build) the Chroma index and export it as a read-only snapshot; returns the snapshot path.
+
+    With refresh, the current corpus is ingested into a staged copy of the index first (see stage_index()).
+    serve.py runs this in a short-lived child process, because a Chroma client does not survive fork().
+    """
+    cached = create_embedding()
+    if refresh:
+        data = load_corpus()
+        path, staging = stage_index(data, cached)
+        promote_index(staging, build_compensation_table(data))
+        return path
+    vectorstore, _ = open_vectorstore(cached)
+    version = index_version(vectorstore, PERSIST_DIR)
+    path = export_snapshot(vectorstore, INDEX_SNAPSHOT_DIR, version, read_manifest(PERSIST_DIR).get("embedding", ""))
+    prune_snapshots(INDEX_SNAPSHOT_DIR, keep=[version])  # Nothing serves older versions at startup
+    return path
+
+
+def stage_index(data: list[dict], embedding) -> tuple[str, str]:
+    """Ingest the corpus into a copy of the Chroma index and export the result as a new snapshot version.
+
+    The serving index is never written to: only new or changed chunks are embedded, into the copy.
+    Returns the snapshot path and the staging directory, which promote_index() moves into PERSIST_DIR.
+    """
+    staging = f"{PERSIST_DIR}.staging-{os.getpid()}-{int(time.time())}"
+    if os.path.exists(PERSIST_DIR):
+        shutil.copytree(PERSIST_DIR, staging)
+    try:
+        vectorstore = ingest(data, embedding, staging)
+        try:
+            version = index_version(vectorstore, staging)
+            return export_snapshot(vectorstore, INDEX_SNAPSHOT_DIR, version, embedding.identity), staging
+        finally:
+            vectorstore._client.close()  # Releases the staging copy's Chroma system (and its in-memory index)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def promote_index(staging: str, compensation_table: dict) -> None:
+    """Make a staged index the persistent one, and its compensation table the saved one"""
+    retired = f"{PERSIST_DIR}.retired-{os.getpid()}"
+    if os.path.exists(PERSIST_DIR):
+        os.rename(PERSIST_DIR, retired)
+    os.rename(staging, PERSIST_DIR)
+    shutil.rmtree(retired, ignore_errors=True)
+    save_compensation_table(compensation_table, TABLE_FILE)
+
+
+def build_compensation_stats(data: list[dict], compensation_table: dict) -> CompensationStats:
+    """Columnar numeric view of the table for /stats and aggregate questions (needs post titles for levels)"""
+    compensation_stats = CompensationStats.from_corpus(data, compensation_table)
+    logging.info(f"Built compensation stats over {len(compensation_stats)} posts with amounts.")
+    return compensation_stats
+
+
+def build_index_state(version: str, vectorstore, compensation_table: dict,
+                      compensation_stats: CompensationStats) -> IndexState:
+    """Build the retriever over one index version"""
+    # Create a retriever to fetch relevant chunks for a query.
+    # Hybrid retrieval narrows by company/location/level, so fewer (but more relevant) chunks are needed.
+    retriever = None
+    if RETRIEVAL_MODE != "dense":
+        keyword_index = KeywordIndex.from_vectorstore(vectorstore)
+        retriever = HybridRetriever(vectorstore=vectorstore, keyword_index=keyword_index, k=RETRIEVAL_K)
+        logging.info(f"Keyword index built over {len(keyword_index.docs)} chunks.")
+    logging.info(f"Retriever created ({RETRIEVAL_MODE}, k={RETRIEVAL_K}).")
+    return IndexState(version, vectorstore, retriever, compensation_table, compensation_stats)
+
+
+def initialize(snapshot: str | None = None) -> None:
+    """Open the vectorstore and compensation table and set up retrieval and the LLM.
+
+    The raw corpus is only read when the index, the compensation table or its saved stats have to be built.
+    With a snapshot path (see serve.py) the index is served from that memory-mapped, read-only snapshot
+    instead of Chroma.
+    """
+    global embedding, llm, fast_llm, token_counter, index
+
+    # Ensure the OpenAI API key is set
+    if not os.environ.get("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY environment variable not set. Please set it before running the agent.")
+
+    data = None
+    embedding = create_embedding()
+    if snapshot:
+        # The snapshot's own meta records its model; the Chroma manifest may already describe another version
+        check_snapshot_embedding(snapshot, embedding.identity, LEGACY_EMBEDDING_IDENTITY)
+        vectorstore = SnapshotVectorStore(snapshot, embedding)
+        version = vectorstore.version
+        logging.info(f"Index snapshot {version} loaded ({vectorstore._collection.count()} chunks).")
+    else:
+        vectorstore, data = open_vectorstore(embedding)
+        version = index_version(vectorstore, PERSIST_DIR)
+
+    # Structured compensation table keyed by topic_id, extracted once at ingest time
+    # (run `python compensation_extractor.py` to rebuild it, optionally with --llm-fallback)
+    if os.path.exists(TABLE_FILE):
+        compensation_table = load_compensation_table(TABLE_FILE)
+    else:
+        data = data or load_corpus()
+        compensation_table = build_compensation_table(data)
+        save_compensation_table(compensation_table, TABLE_FILE)
+    logging.info(f"Loaded structured compensation records for {len(compensation_table)} posts.")
+
+    # The stats saved with this table; only a missing or changed table needs the corpus (and a dedup pass)
+    compensation_stats = CompensationStats.load(STATS_FILE, TABLE_FILE) if data is None else None
+    if compensation_stats is None:
+        compensation_stats = build_compensation_stats(data or load_corpus(), compensation_table)
+        compensation_stats.save(STATS_FILE, TABLE_FILE)
+    else:
+        logging.info(f"Loaded compensation stats over {len(compensation_stats)} posts with amounts.")
+
+    index = build_index_state(version, vectorstore, compensation_table, compensation_stats)
+
+    # Initialize the LLM (GPT-4) and the tokenizer used to budget its prompt
+    llm = ChatOpenAI(model_name="gpt-4", temperature=0)
+    token_counter = TokenCounter("gpt-4")
+    # Written answers try the cheaper model first, see llm_answer()
+    fast_llm = ChatOpenAI(model_name=FAST_LLM_MODEL, temperature=0) if QUERY_ROUTING and FAST_LLM_MODEL else None
+
+    response_cache.set_version(index.version)
+    if SEMANTIC_CACHE_PATH:
+        response_cache.load(SEMANTIC_CACHE_PATH, AgentResponse)
+
+
+def preload(snapshot: str | None = None) -> None:
+    """Initialize synchronously, before the server starts.
+
+    serve.py calls this in its master process, so forked workers start ready and share the loaded state.
+    """
+    global ready, startup_seconds
+    started = time.perf_counter()
+    initialize(snapshot)
+    startup_seconds = time.perf_counter() - started
+    ready = True
+    logging.info(f"Agent preloaded in {startup_seconds:.2f}s.")
+
+
+async def warm_up() -> None:
+    """Run initialize() off the event loop and flip the readiness flag when it is done"""
+    global ready, startup_seconds, startup_error
+    if ready:  # Preloaded by serve.py before this worker was forked
+        return
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(initialize)
+    except Exception as e:
+        startup_error = str(e)
+        logging.error("Agent initialization failed", exc_info=True)
+        return
+    startup_seconds = time.perf_counter() - started
+    ready = True
+    logging.info(f"Agent ready to take traffic after {startup_seconds:.2f}s of initialization.")
+
+
+def current_index() -> IndexState:
+    """The index version the current request started on (the active one outside requests)"""
+    return pinned_index.get() or index
+
+
+@contextmanager
+def pin_index():
+    """Serve the enclosed request from the active index version, even if a reload swaps in a new one meanwhile"""
+    state = index
+    previous = pinned_index.get()
+    pinned_index.set(state)
+    state.active_requests += 1
+    try:
+        yield state
+    finally:
+        state.active_requests -= 1
+        pinned_index.set(previous)
+
+
+def load_snapshot_state(snapshot: str, data: list[dict], compensation_table: dict) -> IndexState:
+    """Load a snapshot to be swapped in, refusing one embedded with another model than the queries"""
+    check_snapshot_embedding(snapshot, embedding.identity, LEGACY_EMBEDDING_IDENTITY)
+    vectorstore = SnapshotVectorStore(snapshot, embedding)
+    return build_index_state(vectorstore.version, vectorstore, compensation_table,
+                             build_compensation_stats(data, compensation_table))
+
+
+def swap_index(new: IndexState) -> IndexState:
+    """Make new the active index version and return the one it replaced.
+
+    One assignment on the event loop, so every request sees one version or the other, never a mix.
+    """
+    global index
+    old, index = index, new
+    retired_indexes.append(old)
+    response_cache.set_version(new.version)
+    inflight_queries.clear()  # Later identical queries must not join an execution on the old version
+    return old
+
+
+async def retire_index(old: IndexState, timeout: float) -> bool:
+    """Wait for the requests still running on a replaced version; False (and still draining) if some were left
+    after timeout"""
+    deadline = time.monotonic() + timeout
+    while old.active_requests and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    if old.active_requests:
+        return False
+    retired_indexes.remove(old)
+    return True
+
+
+async def reload_index() -> dict:
+    """Rebuild the index from the current corpus next to the active one and swap it in between requests.
+
+    The corpus is ingested into a staged copy of the Chroma index and exported as a new snapshot version, and
+    its retriever and tables are built before the swap, so no request waits on a cold index. All of that
+    runs off the event loop. Requests already running finish on the old version, which is removed afterwards.
+    """
+    started = time.perf_counter()
+    data = await asyncio.to_thread(load_corpus)
+    snapshot, staging = await asyncio.to_thread(stage_index, data, embedding)
+    version = os.path.basename(snapshot)
+    if version == index.version:
+        await asyncio.to_thread(shutil.rmtree, staging, True)
+        # The export is only worth keeping when the active index is served from it
+        keep = [version] if isinstance(index.vectorstore, SnapshotVectorStore) else []
+        await asyncio.to_thread(prune_snapshots, INDEX_SNAPSHOT_DIR, keep)
+        logging.info(f"Index unchanged ({version}), nothing to swap.")
+        return {"outcome": "unchanged", "version": version, "seconds": time.perf_counter() - started}
+
+    compensation_table = await asyncio.to_thread(build_compensation_table, data)
+    new = await asyncio.to_thread(load_snapshot_state, snapshot, data, compensation_table)
+    build_seconds = time.perf_counter() - started
+
+    old = swap_index(new)
+    logging.info(
+        f"Swapped index {old.version} -> {new.version} after {build_seconds:.1f}s of building, "
+        f"{old.active_requests} requests finishing on the old version."
+    )
+    drain_started = time.perf_counter()
+    while not await retire_index(old, RELOAD_DRAIN_TIMEOUT_SECONDS):
+        logging.warning(
+            f"{old.active_requests} requests still on index {old.version} after {time.perf_counter() - drain_started:.0f}s, "
+            f"keeping {PERSIST_DIR} until they finish."
+        )
+    if isinstance(old.vectorstore, Chroma):
+        old.vectorstore._client.close()
+    drain_seconds = time.perf_counter() - drain_started
+
+    # Only now that nothing reads the old index: replace it on disk, so restarts pick up the new version
+    await asyncio.to_thread(promote_index, staging, compensation_table)
+    await asyncio.to_thread(new.compensation_stats.save, STATS_FILE, TABLE_FILE)
+    await asyncio.to_thread(prune_snapshots, INDEX_SNAPSHOT_DIR, [new.version])
+    return {
+        "outcome": "swapped",
+        "previous_version": old.version,
+        "version": new.version,
+        "build_seconds": build_seconds,
+        "drain_seconds": drain_seconds,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+async def run_reload() -> None:
+    """reload_index() as a background task, recording its outcome for /admin/index"""
+    global last_reload
+    started_at = time.time()
+    try:
+        result = await reload_index()
+    except Exception as e:
+        logging.error("Index reload failed, still serving the previous version", exc_info=True)
+        result = {"outcome": "failed", "error": str(e)}
+    INDEX_RELOADS.inc(outcome=result["outcome"])
+    last_reload = {**result, "started_at": started_at, "finished_at": time.time()}
+
+
+def index_status() -> dict:
+    return {
+        "active_version": index.version,
+        "loaded_at": index.loaded_at,
+        "chunks": index.vectorstore._collection.count(),
+        "reloading": reload_task is not None and not reload_task.done(),
+        "draining": [{"version": state.version, "active_requests": state.active_requests} for state in retired_indexes],
+        "last_reload": last_reload,
+    }
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different spellings share one in-flight execution"""
+    return " ".join(query.lower().split())
+
+
+def source_topic_ids(source_docs: list[Document]) -> list[str]:
+    """Topic ids of the retrieved chunks, in retrieval order and without duplicates"""
+    topic_ids = []
+    for doc in source_docs:
+        topic_id = doc.metadata.get("topic_id")
+        if not topic_id:
+            # Indexes built before chunks carried metadata only have the id in the text
+            match = re.search(r"Topic ID: (\d+)|discuss/post/(\d+)", doc.page_content)
+            topic_id = next((g for g in match.groups() if g), None) if match else None
+        if topic_id and topic_id not in topic_ids:
+            topic_ids.append(str(topic_id))
+    return topic_ids
+
+
+@observe_stage("parse")
+def parse_agent_response(answer: str, source_docs: list[Document]) -> tuple[AgentResponse, bool]:
+    """Parse the LLM's JSON summary and attach cards for the retrieved posts, falling back to the raw answer.
+
+    The second element is False when the fallback was taken, so callers can avoid caching it.
+    """
+    parsed = False
+    summary = "Could not retrieve a summary."
+    off_topic = False
+
+    try:
+        # The entire LLM response should be a JSON object.
+        # First, find the JSON object in the response.
+        json_match = re.search(r'\{.*\}', answer, re.DOTALL)
+        if json_match:
+            json_str = json_match.group(0)
+            logging.info(f"Attempting to parse JSON from LLM output: {json_str[:300]}...")
+
+            parsed_json = json.loads(json_str)
+            summary = parsed_json.get("summary", summary)
+            off_topic = bool(parsed_json.get("off_topic", False))
+            parsed = True
+        else:
+            logging.warning(f"No JSON object found in LLM output: {answer}")
+            PARSE_FALLBACKS.inc(reason="no_json")
+            summary = answer # Fallback to returning the raw answer if parsing fails
+    except Exception as e:
+        logging.error(f"Failed to parse LLM output as JSON: {answer}", exc_info=True)
+        PARSE_FALLBACKS.inc(reason="invalid_json")
+        summary = answer # Fallback for safety
+
+    compensation_cards = [] if off_topic else build_compensation_cards(source_docs)
+    source_links = [card.url for card in compensation_cards if card.url]
+    if not off_topic:
+        source_links += [url for url in alternate_links(source_docs) if url not in source_links]
+
+    response = AgentResponse(
+        response=summary,
+        compensation_data=compensation_cards,
+        source_links=source_links[:10]
+    )
+    return response, parsed
+
+
+def alternate_links(source_docs: list[Document]) -> list[str]:
+    """URLs of near-duplicate posts that ingest collapsed into the retrieved ones"""
+    links = []
+    for doc in source_docs:
+        for url in (doc.metadata.get("alternate_urls") or "").split(", "):
+            if url and url not in links:
+                links.append(url)
+    return links
+
+
+def build_compensation_cards(source_docs: list[Document]) -> list[CompensationCard]:
+    """Cards for the retrieved posts that have compensation figures, from the ingest-time table"""
+    compensation_table = current_index().compensation_table
+    compensation_cards = []
+    for topic_id in source_topic_ids(source_docs):
+        record = compensation_table.get(topic_id)
+        if record is not None and record.has_compensation():
+            compensation_cards.append(CompensationCard(**record.to_card()))
+    logging.info(f"Assembled {len(compensation_cards)} compensation cards from the compensation table.")
+    return compensation_cards
+
+
+@observe_stage("stats")
+def answer_from_stats(query: str) -> AgentResponse | None:
+    """Answer an aggregate question from the compensation table, or None to fall through to the RAG chain"""
+    if not STATS_ROUTING:
+        return None
+    state = current_index()
+    params = parse_stats_query(query, state.compensation_stats.companies)
+    if params is None:
+        return None
+    result = state.compensation_stats.query(currency=STATS_CURRENCY, **params)
+    if result["count"] < STATS_MIN_SAMPLE:
+        logging.info(f"Aggregate question matched only {result['count']} posts, using the RAG chain instead.")
+        return None
+
+    logging.info(f"Answered aggregate question from {result['count']} posts in {result['elapsed_ms']:.1f} ms: {params}")
+    topic_ids = [topic_id for group in result["groups"] for topic_id in group["topic_ids"]]
+    compensation_cards = [CompensationCard(**state.compensation_table[topic_id].to_card()) for topic_id in topic_ids[:10]]
+    return AgentResponse(
+        response=summarize_stats(result),
+        compensation_data=compensation_cards,
+        source_links=[card.url for card in compensation_cards if card.url]
+    )
+
+
+def answer_lookup(query: str, source_docs: list[Document]) -> AgentResponse | None:
+    """List the retrieved posts that match every filter of a lookup question, or None if none of them do"""
+    state = current_index()
+    filters = extract_query_filters(query, state.compensation_stats.companies)
+    topic_ids = source_topic_ids([doc for doc in source_docs if matches_lookup(doc.metadata, filters)])
+    records = [state.compensation_table[topic_id] for topic_id in topic_ids if topic_id in state.compensation_table]
+    if not records:
+        return None
+    compensation_cards = [CompensationCard(**record.to_card()) for record in records if record.has_compensation()]
+    return AgentResponse(
+        response=summarize_lookup(filters, records),
+        compensation_data=compensation_cards,
+        source_links=[record.url for record in records if record.url][:10]
+    )
+
+
+def classify(query: str) -> tuple[str, str]:
+    """The route for a query and why; with QUERY_ROUTING off only aggregates are kept away from the LLM"""
+    if not QUERY_ROUTING:
+        return "stats", "routing off"
+    with observe_stage("route"):
+        return classify_query(query, current_index().compensation_stats.companies)
+
+
+def answer_without_llm(route: str, query: str, source_docs: list[Document] | None = None) -> AgentResponse | None:
+    """The response of the off_topic, stats or lookup route (lookups need the retrieved chunks), or None when
+    the LLM has to answer"""
+    if route == "off_topic":
+        return AgentResponse(response=OFF_TOPIC_REPLY)
+    if route == "stats":
+        return answer_from_stats(query)
+    if route == "lookup":
+        return answer_lookup(query, source_docs)
+    return None
+
+
+def settle_route(route: str, reason: str, response: AgentResponse | None) -> str:
+    """The route that answers the query: the classifier's, unless it had no answer and the LLM takes over"""
+    if response is None and route != "summarize":
+        route, reason = "summarize", f"nothing for the {route} route"
+    logging.info(f"Routed query to {route} ({reason}).")
+    return route
+
+
+async def route_query(query: str) -> tuple[str, AgentResponse | None]:
+    """Classify a query and answer it without the LLM when its route allows; the response is None otherwise"""
+    route, reason = classify(query)
+    source_docs = None
+    if route == "lookup":
+        with observe_stage("embed"):
+            query_embedding = await embedding.aembed_query(query)
+        source_docs = (await retrieve_many([query], [query_embedding]))[0]
+    response = answer_without_llm(route, query, source_docs)
+    return settle_route(route, reason, response), response
+
+
+def record_route(route: str, started: float) -> None:
+    QUERY_ROUTES.inc(route=route)
+    ROUTE_LATENCY.observe(time.perf_counter() - started, route=route)
+
+
+def check_queue_capacity() -> None:
+    """Reject immediately when every slot is busy and the wait queue is already full"""
+    if llm_slots.locked() and queued_queries >= MAX_QUEUED_QUERIES:
+        logging.warning(f"Rejecting query, {queued_queries} requests already queued.")
+        raise HTTPException(status_code=429, detail="Too many queued queries, please retry shortly.")
+
+
+@asynccontextmanager
+async def llm_slot():
+    """Hold one of the MAX_CONCURRENT_LLM_CALLS slots, waiting at most QUEUE_TIMEOUT_SECONDS for it"""
+    global queued_queries
+
+    check_queue_capacity()
+
+    queued_queries += 1
+    try:
+        await asyncio.wait_for(llm_slots.acquire(), timeout=QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logging.warning(f"Timed out after {QUEUE_TIMEOUT_SECONDS}s waiting for an LLM slot.")
+        raise HTTPException(
+            status_code=503,
+            detail="Agent is at capacity, please retry shortly.",
+            headers={"Retry-After": str(int(QUEUE_TIMEOUT_SECONDS))}
+        )
+    finally:
+        queued_queries -= 1
+
+    LLM_SLOTS_IN_USE.inc()
+    try:
+        yield
+    finally:
+        LLM_SLOTS_IN_USE.dec()
+        llm_slots.release()
+
+
+def record_llm_usage(messages: list, completion: str, usage: dict | None = None, model=None) -> None:
+    """Count prompt/completion tokens (as reported by the API, else with the local tokenizer) and their cost"""
+    model = model or llm
+    if usage:
+        prompt_tokens, completion_tokens = usage["input_tokens"], usage["output_tokens"]
+    else:
+        prompt_tokens = sum(token_counter.count(message.content) for message in messages)
+        completion_tokens = token_counter.count(completion)
+    if model is llm:
+        prompt_price, completion_price = LLM_PROMPT_COST_PER_1K, LLM_COMPLETION_COST_PER_1K
+    else:
+        prompt_price, completion_price = FAST_LLM_PROMPT_COST_PER_1K, FAST_LLM_COMPLETION_COST_PER_1K
+    LLM_PROMPT_TOKENS.inc(prompt_tokens, model=model.model_name)
+    LLM_COMPLETION_TOKENS.inc(completion_tokens, model=model.model_name)
+    LLM_COST.inc((prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000, model=model.model_name)
+
+
+def llm_stage(model) -> str:
+    return "llm" if model is llm else "llm_fast"
+
+
+async def invoke_llm(messages: list, model=None):
+    """model.ainvoke (GPT-4 by default) with latency, token and cost accounting"""
+    model = model or llm
+    with observe_stage(llm_stage(model)):
+        answer = await model.ainvoke(messages)
+    record_llm_usage(messages, answer.content, getattr(answer, "usage_metadata", None), model)
+    return answer
+
+
+async def llm_answer(messages: list) -> str:
+    """The answer text from the fast model, re-run on GPT-4 when it does not meet the response schema"""
+    if fast_llm is None:
+        return (await invoke_llm(messages)).content
+    answer = (await invoke_llm(messages, fast_llm)).content
+    problem = validate_answer(answer)
+    if problem is None:
+        return answer
+    logging.warning(f"{fast_llm.model_name} answer failed validation ({problem}), escalating to GPT-4: {answer[:200]}")
+    LLM_ESCALATIONS.inc(reason=problem)
+    return (await invoke_llm(messages)).content
+
+
+async def run_query(query: str, query_embedding: list[float]) -> tuple[AgentResponse, bool]:
+    """Retrieve, pack the context and run the LLM for one query under the LLM concurrency limit"""
+    async with llm_slot():
+        source_docs = (await retrieve_many([query], [query_embedding]))[0]
+        messages, packed_docs = build_prompt(query, source_docs, query_embedding)
+        logging.info("Invoking LLM...")
+        answer = await llm_answer(messages)
+    return parse_agent_response(answer, packed_docs)
+
+
+async def resolve_query(query: str, key: str) -> AgentResponse:
+    """Answer a query from the semantic cache if a similar one was answered, else run the chain and cache it"""
+    with observe_stage("embed"):
+        query_embedding = await embedding.aembed_query(query)
+    with observe_stage("cache"):
+        cached = response_cache.get_similar(query_embedding)
+    if cached is not None:
+        return cached
+
+    response, parsed = await run_query(query, query_embedding)
+    # An answer from an index version a reload has replaced must not outlive the swap in the cache
+    if parsed and current_index() is index:
+        response_cache.put(key, response, query_embedding)
+    return response
+
+
+def _forget_inflight(key: str, task: asyncio.Task) -> None:
+    """Drop a finished task from the in-flight map and mark its exception as retrieved"""
+    if inflight_queries.get(key) is task:
+        del inflight_queries[key]
+    if not task.cancelled():
+        task.exception()
+
+
+async def answer_query(query: str) -> AgentResponse:
+    """Answer a query through the cheapest route that can, recording the route and its latency"""
+    started = time.perf_counter()
+    route, response = await route_query(query)
+    if response is None:
+        response = await answer_with_llm(query)
+    record_route(route, started)
+    return response
+
+
+async def answer_with_llm(query: str) -> AgentResponse:
+    """Answer a query with the RAG chain, sharing a single execution between identical concurrent queries"""
+    key = normalize_query(query)
+    cached = response_cache.get_exact(key)
+    if cached is not None:
+        logging.info(f"Exact cache hit for query: {key}")
+        return cached
+
+    task = inflight_queries.get(key)
+    if task is None:
+        task = asyncio.ensure_future(resolve_query(query, key))
+        inflight_queries[key] = task
+        task.add_done_callback(lambda t: _forget_inflight(key, t))
+    else:
+        logging.info(f"Coalescing with in-flight execution of query: {key}")
+    # Shield so one caller disconnecting does not cancel the work the others are waiting on
+    return await asyncio.shield(task)
+
+
+def chunk_embeddings(source_docs: list[Document]) -> dict[str, list[float]]:
+    """Stored embeddings of the retrieved chunks, keyed by chunk id (for MMR)"""
+    ids = [doc.metadata.get("chunk_id") or doc.id for doc in source_docs]
+    stored = current_index().vectorstore._collection.get(ids=[chunk_id for chunk_id in ids if chunk_id], include=["embeddings"])
+    return dict(zip(stored["ids"], stored["embeddings"]))
+
+
+@observe_stage("pack")
+def build_prompt(query: str, source_docs: list[Document], query_embedding: list[float] | None = None) -> tuple[list, list[Document]]:
+    """Prompt messages over the packed context, and the retrieved chunks whose posts made it into the context"""
+    use_mmr = CONTEXT_MMR_LAMBDA is not None and query_embedding is not None
+    packed = pack_context(
+        source_docs,
+        token_counter,
+        CONTEXT_TOKEN_BUDGET,
+        query_embedding=query_embedding,
+        chunk_embeddings=chunk_embeddings(source_docs) if use_mmr else None,
+        mmr_lambda=CONTEXT_MMR_LAMBDA
+    )
+    messages = prompt.format_messages(context=packed["context"], question=query)
+    prompt_tokens = sum(token_counter.count(message.content) for message in messages)
+    logging.info(
+        f"Prompt tokens: {prompt_tokens} (context {packed['tokens']} tokens from {len(packed['topic_ids'])} "
+        f"of {packed['posts']} posts, {packed['chunks']} chunks retrieved)"
+    )
+    # Keyed like pack_context's posts, so packed chunks without a topic_id are kept too
+    rank = {key: i for i, key in enumerate(packed["topic_ids"])}
+    packed_docs = sorted((doc for doc in source_docs if post_key(doc) in rank), key=lambda doc: rank[post_key(doc)])
+    return messages, packed_docs
+
+
+async def retrieve_many(queries: list[str], query_embeddings: list[list[float]]) -> list[list[Document]]:
+    """Retrieve context for several queries with batched vector searches, off the event loop"""
+    state = current_index()
+    with observe_stage("retrieve"):
+        if isinstance(state.retriever, HybridRetriever):
+            results = await asyncio.to_thread(state.retriever.fuse_many, queries, query_embeddings)
+        else:
+            results = await asyncio.to_thread(dense_search_many, state.vectorstore, query_embeddings, RETRIEVAL_K)
+    for docs in results:
+        RETRIEVED_DOCUMENTS.observe(len(docs))
+    return results
+
+
+async def generate_answer(query: str, source_docs: list[Document], query_embedding: list[float],
+                          batch_slots: asyncio.Semaphore) -> tuple[AgentResponse, bool]:
+    """Run the LLM for one query over already-retrieved context, under the batch and global limits"""
+    async with batch_slots:
+        async with llm_slot():
+            messages, packed_docs = build_prompt(query, source_docs, query_embedding)
+            answer = await llm_answer(messages)
+    return parse_agent_response(answer, packed_docs)
+
+
+async def answer_batch(queries: list[str]) -> list[BatchQueryResult]:
+    """Answer many queries with one embedding call, batched retrieval and concurrent LLM calls.
+
+    Duplicate questions (after normalization) are answered once; results come back in input order,
+    with per-item errors instead of failing the whole batch. Lookups share the batched retrieval.
+    """
+    started = time.perf_counter()
+    keys = [normalize_query(query) for query in queries]
+    unique = {}  # key -> first query text with that key
+    for key, query in zip(keys, queries):
+        unique.setdefault(key, query)
+
+    outcomes: dict[str, AgentResponse | Exception] = {}
+    routes: dict[str, str] = {}  # key -> route, settled once the route has had its go
+    reasons: dict[str, str] = {}
+    for key, query in unique.items():
+        routes[key], reasons[key] = classify(query)
+        if routes[key] == "lookup":
+            continue  # Answered from the batched retrieval below
+        response = answer_without_llm(routes[key], query)
+        routes[key] = settle_route(routes[key], reasons[key], response)
+        if response is not None:
+            outcomes[key] = response
+            record_route(routes[key], started)
+            continue
+        cached = response_cache.get_exact(key)
+        if cached is not None:
+            outcomes[key] = cached
+            record_route(routes[key], started)
+
+    # One embedding request for every question not answered from the exact cache
+    misses = [key for key in unique if key not in outcomes]
+    with observe_stage("embed"):
+        query_embeddings = dict(zip(misses, await embedding.aembed_documents([unique[key] for key in misses]))) if misses else {}
+    with observe_stage("cache"):
+        for key in misses:
+            cached = response_cache.get_similar(query_embeddings[key]) if routes[key] != "lookup" else None
+            if cached is not None:
+                outcomes[key] = cached
+                record_route(routes[key], started)
+
+    to_run = [key for key in misses if key not in outcomes]
+    if to_run:
+        contexts = dict(zip(to_run, await retrieve_many([unique[key] for key in to_run], [query_embeddings[key] for key in to_run])))
+        for key in to_run:
+            if routes[key] == "lookup":
+                response = answer_without_llm("lookup", unique[key], contexts[key])
+                routes[key] = settle_route("lookup", reasons[key], response)
+                if response is not None:
+                    outcomes[key] = response
+                    record_route("lookup", started)
+        to_run = [key for key in to_run if key not in outcomes]
+    logging.info(
+        f"Batch of {len(queries)} queries: {len(unique)} unique, "
+        f"{len(unique) - len(to_run)} answered without the LLM or from the cache, {len(to_run)} to run."
+    )
+    if to_run:
+        batch_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+        answers = await asyncio.gather(
+            *(generate_answer(unique[key], contexts[key], query_embeddings[key], batch_slots) for key in to_run),
+            return_exceptions=True
+        )
+        for key, answer in zip(to_run, answers):
+            if isinstance(answer, BaseException):
+                outcomes[key] = answer
+                continue
+            response, parsed = answer
+            if parsed and current_index() is index:
+                response_cache.put(key, response, query_embeddings[key])
+            outcomes[key] = response
+            record_route(routes[key], started)
+
+    results = []
+    for key, query in zip(keys, queries):
+        outcome = outcomes[key]
+        if isinstance(outcome, HTTPException):
+            results.append(BatchQueryResult(query=query, status_code=outcome.status_code, error=str(outcome.detail)))
+        elif isinstance(outcome, BaseException):
+            logging.error(f"Batch item failed for query: '{query}'", exc_info=outcome)
+            results.append(BatchQueryResult(query=query, status_code=500, error=str(outcome) or type(outcome).__name__))
+        else:
+            results.append(BatchQueryResult(query=query, response=outcome))
+    return results
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def response_events(response: AgentResponse):
+    """Replay a complete (e.g. cached) response as the same event sequence /query/stream produces"""
+    yield sse_event("summary", {"summary": response.response})
+    for card in response.compensation_data:
+        yield sse_event("card", card.model_dump())
+    yield sse_event("sources", {"source_links": response.source_links})
+
+
+async def stream_query(query: str):
+    """Answer a query as server-sent events, as each piece becomes available.
+
+    Events: `token` (summary text as it is generated), `summary` (the complete summary), `card`
+    (one per compensation card), `sources` (always last) and `error` (if the query cannot be served,
+    which ends the stream). Cards are known as soon as retrieval finishes, so they go out once the
+    model has said the question is on topic (the prompt asks for 'off_topic' before 'summary'). A
+    fast-model answer that fails validation is replaced by GPT-4's if none of its summary has been sent yet.
+    """
+    try:
+        async for event in stream_events(query):
+            yield event
+    except HTTPException as e:
+        yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+    except Exception:
+        # The response has already started with a 200, so the client can only learn of the failure in-band
+        logging.error(f"An unexpected error occurred while streaming query: '{query}'", exc_info=True)
+        yield sse_event("error", {"status_code": 500, "detail": "Internal server error."})
+
+
+async def stream_events(query: str):
+    """The events of stream_query(); failures propagate to it"""
+    started = time.perf_counter()
+    route, routed = await route_query(query)
+    if routed is not None:
+        for event in response_events(routed):
+            yield event
+        record_route(route, started)
+        return
+
+    key = normalize_query(query)
+    cached = response_cache.get_exact(key)
+    query_embedding = None
+    if cached is None:
+        with observe_stage("embed"):
+            query_embedding = await embedding.aembed_query(query)
+        with observe_stage("cache"):
+            cached = response_cache.get_similar(query_embedding)
+    if cached is not None:
+        logging.info(f"Streaming cached response for query: {key}")
+        for event in response_events(cached):
+            yield event
+        record_route(route, started)
+        return
+
+    async with llm_slot():
+        source_docs = (await retrieve_many([query], [query_embedding]))[0]
+        logging.info(f"Retriever returned {len(source_docs)} source documents.")
+        messages, source_docs = build_prompt(query, source_docs, query_embedding)
+        compensation_cards = build_compensation_cards(source_docs)
+
+        summary_started = summary_sent = cards_sent = False
+        for model in ([fast_llm, llm] if fast_llm is not None else [llm]):
+            parser = StreamingJSONParser()
+            answer_parts = []
+            llm_started = time.perf_counter()
+            async for chunk in model.astream(messages):
+                if not answer_parts:
+                    record_stage(f"{llm_stage(model)}_first_token", time.perf_counter() - llm_started)
+                answer_parts.append(chunk.content)
+                if parser is None:
+                    continue
+                try:
+                    events = parser.feed(chunk.content)
+                except ValueError:
+                    logging.warning("Streamed LLM output is not valid JSON, falling back to parsing the full answer.")
+                    parser = None
+                    continue
+                for kind, field, value in events:
+                    if field == "summary" and kind == DELTA:
+                        summary_started = True
+                        yield sse_event("token", {"text": value})
+                    elif field == "summary" and kind == VALUE:
+                        summary_sent = True
+                        yield sse_event("summary", {"summary": value})
+                    elif field == "off_topic" and kind == VALUE and not cards_sent:
+                        cards_sent = True
+                        for card in ([] if value else compensation_cards):
+                            yield sse_event("card", card.model_dump())
+            record_stage(llm_stage(model), time.perf_counter() - llm_started)
+            record_llm_usage(messages, "".join(answer_parts), model=model)
+            problem = validate_answer("".join(answer_parts)) if model is not llm else None
+            if problem is None or summary_started or summary_sent:
+                break
+            logging.warning(f"Streamed {model.model_name} answer failed validation ({problem}), escalating to GPT-4.")
+            LLM_ESCALATIONS.inc(reason=problem)
+
+    # Whatever the incremental parser could not deliver comes from the full answer
+    response, parsed = parse_agent_response("".join(answer_parts), source_docs)
+    if not summary_sent:
+        yield sse_event("summary", {"summary": response.response})
+    if not cards_sent:
+        for card in response.compensation_data:
+            yield sse_event("card", card.model_dump())
+    yield sse_event("sources", {"source_links": response.source_links})
+    record_route(route, started)
+    if parsed and current_index() is index:
+        response_cache.put(key, response, query_embedding)
+
+
+async def pinned_events(events):
+    """Iterate a response stream with the index version pinned for as long as it is being sent"""
+    with pin_index():
+        async for event in events:
+            yield event
 
-# Remove extract_compensation_data and update /query endpoint to only use LLM JSON output
 
 @app.post("/query")
 async def query_endpoint(req: QueryRequest):
     logging.info(f"Received query: {req.query}")
+    if not ready:
+        raise HTTPException(status_code=503, detail="Agent is still starting up.", headers={"Retry-After": "5"})
     try:
-        logging.info("Invoking QA chain...")
-        result = qa_chain.invoke({"query": req.query})
-        answer = result["result"]
-        source_docs = result.get("source_documents", [])
-        logging.info(f"QA chain returned {len(source_docs)} source documents.")
-
-        import json
-        import re
-        
-        summary = "Could not retrieve a summary."
-        compensation_cards = []
-        source_links = []
-        
-        try:
-            # The entire LLM response should be a JSON object.
-            # First, find the JSON object in the response.
-            json_match = re.search(r'\{.*\}', answer, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                logging.info(f"Attempting to parse JSON from LLM output: {json_str[:300]}...")
-                
-                parsed_json = json.loads(json_str)
-                summary = parsed_json.get("summary", summary)
-                cards_data = parsed_json.get("compensation_cards", [])
-                
-                for card in cards_data:
-                    compensation_cards.append(CompensationCard(**card))
-                
-                source_links = [card.get("url", "") for card in cards_data if card.get("url")]
-                logging.info(f"Successfully parsed summary and {len(compensation_cards)} compensation cards.")
-            else:
-                logging.warning(f"No JSON object found in LLM output: {answer}")
-                summary = answer # Fallback to returning the raw answer if parsing fails
-        except Exception as e:
-            logging.error(f"Failed to parse LLM output as JSON: {answer}", exc_info=True)
-            summary = answer # Fallback for safety
-            compensation_cards = []
-            source_links = []
-
-        response = AgentResponse(
-            response=summary,
-            compensation_data=compensation_cards,
-            source_links=source_links[:10]
-        )
-        logging.info(f"Returning response with {len(compensation_cards)} cards and {len(source_links)} links.")
+        with pin_index():
+            response = await answer_query(req.query)
+        logging.info(f"Returning response with {len(response.compensation_data)} cards and {len(response.source_links)} links.")
         return response
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"An unexpected error occurred in /query endpoint for query: '{req.query}'", exc_info=True)
         # Re-raise the exception to be handled by FastAPI's default error handling
         raise
 
+@app.post("/stats")
+async def stats_endpoint(req: StatsRequest):
+    """Percentiles (p25/p50/p75/p90), counts and trends of one compensation metric, filtered and grouped,
+    computed from the numeric compensation table without calling the LLM"""
+    if not ready:
+        raise HTTPException(status_code=503, detail="Agent is still starting up.", headers={"Retry-After": "5"})
+    try:
+        return index.compensation_stats.query(
+            metric=req.metric,
+            currency=req.currency or STATS_CURRENCY,
+            company=req.company,
+            level=req.level,
+            location=req.location,
+            min_yoe=req.min_yoe,
+            max_yoe=req.max_yoe,
+            since=req.since,
+            until=req.until,
+            group_by=req.group_by,
+            trend=req.trend
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_batch_endpoint(req: BatchQueryRequest):
+    """Answer many questions in one call, sharing the embedding request and vector searches"""
+    logging.info(f"Received batch of {len(req.queries)} queries")
+    if not ready:
+        raise HTTPException(status_code=503, detail="Agent is still starting up.", headers={"Retry-After": "5"})
+    if not req.queries:
+        raise HTTPException(status_code=400, detail="No queries given.")
+    if len(req.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_QUERIES} queries per batch.")
+    with pin_index():
+        return BatchQueryResponse(results=await answer_batch(req.queries))
+
+@app.post("/query/stream")
+async def query_stream_endpoint(req: QueryRequest):
+    """Server-sent events version of /query: summary tokens and cards are sent as soon as they are produced"""
+    logging.info(f"Received streaming query: {req.query}")
+    if not ready:
+        raise HTTPException(status_code=503, detail="Agent is still starting up.", headers={"Retry-After": "5"})
+    # Push back with a proper status code before the stream starts; later failures become `error` events
+    check_queue_capacity()
+    return StreamingResponse(
+        pinned_events(stream_query(req.query)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: per-stage latency, LLM tokens and cost, retrieval sizes, parse fallbacks and in-flight gauges"""
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/health")
+async def health_endpoint():
+    """Liveness: the process is up, even if the index is still loading"""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready_endpoint():
+    """Readiness: 200 once the vectorstore, compensation table, retriever and LLM are loaded, 503 before that"""
+    if not ready:
+        raise HTTPException(
+            status_code=503,
+            detail={"status": "failed" if startup_error else "starting", "error": startup_error}
+        )
+    return {"status": "ready", "startup_seconds": startup_seconds, "index_version": response_cache.version}
+
+
+@app.get("/cache/stats")
+async def cache_stats_endpoint():
+    """Hit/miss counters for the semantic response cache, for tuning the similarity threshold"""
+    return response_cache.get_stats()
+
+
+@app.post("/cache/clear")
+async def cache_clear_endpoint():
+    """Drop every cached answer (e.g. before a benchmark run)"""
+    response_cache.clear()
+    return response_cache.get_stats()
+
+
+@app.get("/admin/index")
+async def admin_index_endpoint():
+    """The active index version, whether a reload is running, and the outcome of the last one"""
+    if not ready:
+        raise HTTPException(status_code=503, detail="Agent is still starting up.", headers={"Retry-After": "5"})
+    return index_status()
+
+
+@app.post("/admin/reload", status_code=202)
+async def admin_reload_endpoint():
+    """Rebuild the index from the current corpus in the background and swap it in without downtime"""
+    global reload_task
+    if not ready:
+        raise HTTPException(status_code=503, detail="Agent is still starting up.", headers={"Retry-After": "5"})
+    if reload_hook is not None:
+        reload_hook()  # Under serve.py the master rebuilds once and replaces every worker
+        return {**index_status(), "reloading": True}
+    if reload_task is None or reload_task.done():
+        reload_task = asyncio.create_task(run_reload())
+    return index_status()
+
 # Run the FastAPI app with Uvicorn if this script is executed directly
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,178 @@
+# semantic_cache.py
+# Response cache for the RAG agent. Answers are looked up by the normalized query text (exact hits)
+# and by cosine similarity of the query embedding (near hits), with LRU + TTL eviction,
+# optional persistence to disk and invalidation whenever the vectorstore contents change.
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Type
+
+import numpy as np
+from pydantic import BaseModel
+
+
+@dataclass
+class CacheEntry:
+    value: BaseModel  # The fully parsed response, so cache hits skip LLM output parsing too
+    embedding: Optional[np.ndarray]  # Unit-normalized query embedding, None for exact-only entries
+    created_at: float
+
+
+class SemanticCache:
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 86400, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.version: Optional[str] = None  # Fingerprint of the index the cached answers were built from
+
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None  # Stacked embeddings, rebuilt lazily after mutations
+        self._matrix_keys: List[str] = []
+
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _is_expired(self, entry: CacheEntry, now: float) -> bool:
+        return now - entry.created_at > self.ttl_seconds
+
+    def _remove(self, key: str) -> None:
+        del self._entries[key]
+        self._matrix = None
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        for key in [k for k, e in self._entries.items() if self._is_expired(e, now)]:
+            self._remove(key)
+            self.stats["evictions"] += 1
+
+    def get_exact(self, key: str) -> Optional[BaseModel]:
+        """Return the cached value for a normalized query, if present and fresh"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._is_expired(entry, time.time()):
+            self._remove(key)
+            self.stats["evictions"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["exact_hits"] += 1
+        return entry.value
+
+    def get_similar(self, embedding: List[float]) -> Optional[BaseModel]:
+        """Return the cached value whose query embedding is most similar, if above the threshold"""
+        self._purge_expired()
+        if self._matrix is None:
+            self._matrix_keys = [k for k, e in self._entries.items() if e.embedding is not None]
+            self._matrix = np.stack([self._entries[k].embedding for k in self._matrix_keys]) if self._matrix_keys else None
+
+        if self._matrix is not None:
+            scores = self._matrix @ _normalize(embedding)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                key = self._matrix_keys[best]
+                self._entries.move_to_end(key)
+                self.stats["semantic_hits"] += 1
+                logging.info(f"Semantic cache hit (similarity {scores[best]:.3f}) on cached query: {key}")
+                return self._entries[key].value
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, value: BaseModel, embedding: Optional[List[float]] = None) -> None:
+        """Store a value under a normalized query, evicting the least recently used entries if full"""
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CacheEntry(
+            value=value,
+            embedding=_normalize(embedding) if embedding is not None else None,
+            created_at=time.time()
+        )
+        self._matrix = None
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._matrix = None
+
+    def set_version(self, version: str) -> None:
+        """Record the current index fingerprint, dropping every entry if the index has changed"""
+        if self.version is not None and self.version != version and self._entries:
+            logging.info(f"Index changed ({self.version} -> {version}), invalidating {len(self._entries)} cached answers.")
+            self.clear()
+            self.stats["invalidations"] += 1
+        self.version = version
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats["exact_hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "similarity_threshold": self.similarity_threshold,
+            "version": self.version
+        }
+
+    def save(self, path: str) -> None:
+        """Persist the cache to a JSON file (written atomically)"""
+        self._purge_expired()
+        payload = {
+            "version": self.version,
+            "entries": [
+                {
+                    "key": key,
+                    "value": entry.value.model_dump(),
+                    "embedding": entry.embedding.tolist() if entry.embedding is not None else None,
+                    "created_at": entry.created_at
+                }
+                for key, entry in self._entries.items()
+            ]
+        }
+        tmp_path = f"{path}.tmp-{os.getpid()}"  # Worker processes of serve.py may save at the same time
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+        logging.info(f"Saved {len(self._entries)} cached answers to {path}.")
+
+    def load(self, path: str, model: Type[BaseModel]) -> None:
+        """Load a cache persisted by save(); entries built from a different index version are discarded"""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            logging.warning(f"Could not read semantic cache file {path}, starting empty.", exc_info=True)
+            return
+
+        if self.version is not None and payload.get("version") != self.version:
+            logging.info(f"Ignoring semantic cache at {path}: built for index version {payload.get('version')}.")
+            return
+
+        now = time.time()
+        for item in payload.get("entries", []):
+            entry = CacheEntry(
+                value=model(**item["value"]),
+                embedding=np.asarray(item["embedding"], dtype=np.float32) if item["embedding"] is not None else None,
+                created_at=item["created_at"]
+            )
+            if not self._is_expired(entry, now):
+                self._entries[item["key"]] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix = None
+        logging.info(f"Loaded {len(self._entries)} cached answers from {path}.")
+
+
+def _normalize(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
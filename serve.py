@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Production runner for the RAG agent: a pre-fork master with N uvicorn worker processes.
+
+The master
+  1. builds or refreshes the read-only index snapshot in a short-lived child process
+     (a Chroma client does not survive fork(), so the master never opens one),
+  2. loads the snapshot (memory-mapped), keyword index, compensation tables and models once, then freezes
+     them out of the garbage collector so the workers' reference counting does not unshare their pages,
+  3. binds the listening socket and forks the workers, which inherit all of that copy-on-write,
+  4. replaces workers as they exit: each one retires after --max-requests requests (plus jitter, so they
+     do not all restart at once), which bounds memory growth, and a crashed worker is restarted,
+  5. on SIGHUP (sent by a worker on POST /admin/reload) ingests the current corpus into a new snapshot version
+     in a child process, loads it, forks a fresh set of workers from it and then stops the old workers
+     gracefully: new connections go to the new workers while the old ones finish their in-flight requests,
+     and the old snapshot is removed once the last of them has exited,
+  6. on SIGTERM/SIGINT stops every worker gracefully, giving in-flight requests --graceful-timeout seconds.
+
+With --no-preload each worker initializes on its own after the fork (its own Chroma client and indexes),
+like running several `uvicorn rag_agent:app` copies.
+
+    python3 serve.py --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import importlib
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from index_snapshot import prune_snapshots
+
+
+def load_app(app_path: str):
+    module_name, attribute = app_path.split(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def start_snapshot_build(refresh: bool = False) -> tuple[int, int]:
+    """Fork a child that runs rag_agent.export_index_snapshot(refresh); returns its pid and the pipe it
+    writes the snapshot path to"""
+    import rag_agent
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        os.close(read_fd)
+        code = 1
+        try:
+            os.write(write_fd, rag_agent.export_index_snapshot(refresh).encode("utf-8"))
+            code = 0
+        except Exception:
+            logging.error("Building the index snapshot failed", exc_info=True)
+        finally:
+            os._exit(code)
+    os.close(write_fd)
+    return pid, read_fd
+
+
+def finish_snapshot_build(read_fd: int, status: int) -> str:
+    """The snapshot path from an exited build child"""
+    with os.fdopen(read_fd, "rb") as pipe:
+        path = pipe.read().decode("utf-8")
+    if os.waitstatus_to_exitcode(status) != 0 or not path:
+        raise RuntimeError("Could not build the index snapshot, see the log above.")
+    return path
+
+
+def build_snapshot() -> str:
+    """Run rag_agent.export_index_snapshot() in a child process and return the snapshot path"""
+    pid, read_fd = start_snapshot_build()
+    _, status = os.waitpid(pid, 0)
+    return finish_snapshot_build(read_fd, status)
+
+
+def request_reload() -> None:
+    """rag_agent's reload hook in the workers: have the master rebuild the index and replace the workers"""
+    os.kill(os.getppid(), signal.SIGHUP)
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, args) -> None:
+    """Serve on the inherited socket until max requests, a signal from the master, or a crash"""
+    max_requests = args.max_requests + random.randint(0, args.max_requests_jitter) if args.max_requests else None
+    config = uvicorn.Config(
+        app,
+        log_config=None,  # Keep rag_agent's logging setup
+        access_log=False,  # The observability middleware logs every request
+        limit_max_requests=max_requests,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        timeout_keep_alive=args.keep_alive,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Master:
+    """Fork workers and keep --workers of them running until told to stop"""
+
+    def __init__(self, app, sock: socket.socket, args, snapshot: str):
+        self.app = app
+        self.sock = sock
+        self.args = args
+        self.snapshot = snapshot
+        self.workers: dict[int, float] = {}  # pid -> start time
+        self.retiring: set[int] = set()  # Workers of the previous index version, finishing in-flight requests
+        self.builder: tuple[int, int] | None = None  # Pid and pipe of a running snapshot rebuild
+        self.reload_requested = False
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+                signal.signal(signum, signal.SIG_DFL)
+            random.seed()  # Different max-requests jitter in every worker
+            import rag_agent
+            rag_agent.reload_hook = request_reload
+            code = 0
+            try:
+                run_worker(self.app, self.sock, self.args)
+            except Exception:
+                logging.error("Worker crashed", exc_info=True)
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        logging.info(f"Started worker {pid} ({len(self.workers)}/{self.args.workers}).")
+
+    def stop(self, signum, frame) -> None:
+        if self.stopping:
+            return
+        self.stopping = True
+        logging.info(f"Received {signal.Signals(signum).name}, stopping {len(self.workers)} workers gracefully...")
+        for pid in self.workers:
+            os.kill(pid, signal.SIGTERM)
+        if self.builder is not None:
+            os.kill(self.builder[0], signal.SIGTERM)
+
+    def request_reload(self, signum, frame) -> None:
+        self.reload_requested = True
+
+    def start_reload(self) -> None:
+        self.reload_requested = False
+        if self.builder is not None:
+            logging.info("Index rebuild already running, ignoring the reload request.")
+            return
+        self.builder = start_snapshot_build(refresh=True)
+        logging.info(f"Rebuilding the index from the current corpus in process {self.builder[0]}...")
+
+    def finish_reload(self, status: int) -> None:
+        """Load the rebuilt snapshot, fork a new set of workers from it and retire the old ones"""
+        _, read_fd = self.builder
+        self.builder = None
+        try:
+            snapshot = finish_snapshot_build(read_fd, status)
+        except RuntimeError:
+            logging.error("Index rebuild failed, the current workers keep serving the previous version.")
+            return
+        if snapshot == self.snapshot:
+            logging.info("Index unchanged, keeping the current workers.")
+            return
+
+        if not self.args.no_preload:
+            import rag_agent
+            gc.unfreeze()  # Let the previous version's objects be collected once the old workers are gone
+            try:
+                rag_agent.preload(snapshot)
+            except RuntimeError:
+                logging.error("Could not load the rebuilt index snapshot, the current workers keep serving the "
+                              "previous version.", exc_info=True)
+                gc.freeze()
+                return
+            gc.collect()
+            gc.freeze()
+        self.snapshot = snapshot
+        old = list(self.workers)
+        for _ in range(self.args.workers):
+            self.spawn()
+        # The new workers already accept on the shared socket; the old ones finish their requests and exit
+        for pid in old:
+            self.retiring.add(pid)
+            os.kill(pid, signal.SIGTERM)
+        logging.info(f"Switched to index snapshot {os.path.basename(snapshot)}, retiring {len(old)} workers.")
+
+    def reap(self) -> None:
+        while self.workers or self.builder is not None:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            if self.builder is not None and pid == self.builder[0]:
+                if self.stopping:
+                    os.close(self.builder[1])
+                    self.builder = None
+                else:
+                    self.finish_reload(status)
+                continue
+            started = self.workers.pop(pid, None)
+            if started is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                if not self.retiring:
+                    prune_snapshots(os.path.dirname(self.snapshot), keep=[os.path.basename(self.snapshot)])
+                continue
+            if self.stopping:
+                continue
+            logging.info(f"Worker {pid} exited with code {code} after {time.monotonic() - started:.0f}s, replacing it.")
+            if code != 0 and time.monotonic() - started < 1:
+                time.sleep(1)  # Crashing on startup: do not fork in a tight loop
+            self.spawn()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, self.request_reload)
+        for _ in range(self.args.workers):
+            self.spawn()
+        deadline = None
+        while self.workers:
+            if self.reload_requested and not self.stopping:
+                self.start_reload()
+            self.reap()
+            if self.stopping and deadline is None:
+                deadline = time.monotonic() + self.args.graceful_timeout + 5
+            if deadline is not None and time.monotonic() > deadline:
+                logging.warning(f"Killing {len(self.workers)} workers that did not stop in time.")
+                for pid in self.workers:
+                    os.kill(pid, signal.SIGKILL)
+                deadline = float("inf")
+            time.sleep(0.1)
+        logging.info("All workers stopped.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the RAG agent from N pre-forked worker processes")
+    parser.add_argument("--app", default="rag_agent:app", help="ASGI app to serve (module:attribute)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    parser.add_argument("--max-requests", type=int, default=10000, help="Recycle a worker after this many requests (0: never)")
+    parser.add_argument("--max-requests-jitter", type=int, default=1000, help="Random extra requests per worker")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="Seconds in-flight requests get on shutdown")
+    parser.add_argument("--keep-alive", type=int, default=5, help="Idle keep-alive timeout in seconds")
+    parser.add_argument("--no-preload", action="store_true", help="Initialize in every worker instead of once in the master")
+    args = parser.parse_args()
+
+    # Workers must not inherit a tokenizer thread pool the master may have started
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    app = load_app(args.app)  # Also configures logging (rag_agent)
+    import rag_agent
+
+    started = time.perf_counter()
+    snapshot = build_snapshot()  # Also builds the Chroma index on first run, once rather than in every worker
+    if not args.no_preload:
+        rag_agent.preload(snapshot)
+        gc.collect()
+        gc.freeze()
+    logging.info(f"Master ready in {time.perf_counter() - started:.2f}s, forking {args.workers} workers.")
+
+    sock = bind_socket(args.host, args.port)
+    Master(app, sock, args, snapshot).run()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# stream_parser.py
+# Incremental parser for the LLM's JSON answer while it is still being generated.
+# Feed it token chunks as they arrive; it reports string deltas as soon as characters are decoded,
+# each top-level value as soon as it closes, and each element of a top-level array as soon as it closes.
+
+import json
+from typing import Any, Dict, List, Tuple
+
+WHITESPACE = " \t\r\n"
+
+# Event kinds returned by StreamingJSONParser.feed()
+DELTA = "delta"  # (DELTA, key, newly decoded text of a string value)
+VALUE = "value"  # (VALUE, key, completed value)
+ITEM = "item"    # (ITEM, key, completed element of an array value)
+
+
+class StreamingJSONParser:
+    """Push parser for a single flat JSON object, tolerant of any text before the opening brace.
+
+    Raises ValueError (json.JSONDecodeError) when a value turns out not to be valid JSON;
+    callers should then fall back to parsing the complete answer.
+    """
+
+    def __init__(self):
+        self.state = "start"
+        self.key = ""
+        self.raw = ""            # Raw (still escaped) text of the value being read
+        self.escape = False
+        self.in_string = False   # Inside a string nested in an object/array value
+        self.depth = 0
+        self.item_start = None   # Offset in raw where the current array element starts
+        self.decoded_length = 0  # Characters of the current string value already reported
+        self.values: Dict[str, Any] = {}
+
+    @property
+    def done(self) -> bool:
+        return self.state == "done"
+
+    def feed(self, text: str) -> List[Tuple[str, str, Any]]:
+        events = []
+        for ch in text:
+            self._step(ch, events)
+        if self.state == "string_value":
+            self._emit_delta(events)
+        return events
+
+    def _step(self, ch: str, events: list) -> None:
+        state = self.state
+        if state == "start":
+            if ch == "{":
+                self.state = "key_or_end"
+        elif state == "key_or_end":
+            if ch == '"':
+                self.key, self.escape, self.state = "", False, "key"
+            elif ch == "}":
+                self.state = "done"
+        elif state == "key":
+            if self.escape:
+                self.key += ch
+                self.escape = False
+            elif ch == "\\":
+                self.key += ch
+                self.escape = True
+            elif ch == '"':
+                self.key = json.loads(f'"{self.key}"')
+                self.state = "colon"
+            else:
+                self.key += ch
+        elif state == "colon":
+            if ch == ":":
+                self.state = "value_start"
+        elif state == "value_start":
+            if ch in WHITESPACE:
+                return
+            if ch == '"':
+                self.raw, self.escape, self.decoded_length, self.state = "", False, 0, "string_value"
+            elif ch in "{[":
+                self.raw, self.depth, self.in_string, self.escape, self.state = ch, 1, False, False, "nested"
+                self.item_start = 1 if ch == "[" else None
+            else:
+                self.raw, self.state = ch, "scalar"
+        elif state == "string_value":
+            if self.escape:
+                self.raw += ch
+                self.escape = False
+            elif ch == "\\":
+                self.raw += ch
+                self.escape = True
+            elif ch == '"':
+                self._emit_delta(events)
+                self._finish(json.loads(f'"{self.raw}"'), events)
+            else:
+                self.raw += ch
+        elif state == "nested":
+            self._step_nested(ch, events)
+        elif state == "scalar":
+            if ch in ",}":
+                self._finish(json.loads(self.raw.strip()), events)
+                if ch == "}":
+                    self.state = "done"
+            else:
+                self.raw += ch
+
+    def _step_nested(self, ch: str, events: list) -> None:
+        self.raw += ch
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif ch == "\\":
+                self.escape = True
+            elif ch == '"':
+                self.in_string = False
+            return
+        if ch == '"':
+            self.in_string = True
+        elif ch in "{[":
+            self.depth += 1
+        elif ch in "}]":
+            self.depth -= 1
+            if self.depth == 0:
+                if self.item_start is not None:
+                    self._emit_item(self.raw[self.item_start:-1], events)
+                self._finish(json.loads(self.raw), events)
+        elif ch == "," and self.depth == 1 and self.item_start is not None:
+            self._emit_item(self.raw[self.item_start:-1], events)
+            self.item_start = len(self.raw)
+
+    def _emit_item(self, raw_item: str, events: list) -> None:
+        if raw_item.strip():
+            events.append((ITEM, self.key, json.loads(raw_item)))
+
+    def _emit_delta(self, events: list) -> None:
+        # Decode the longest prefix that does not end inside an escape sequence (at most "\uXXXX")
+        for cut in range(len(self.raw), max(len(self.raw) - 6, 0) - 1, -1):
+            try:
+                decoded = json.loads(f'"{self.raw[:cut]}"')
+                break
+            except ValueError:
+                continue
+        else:
+            return
+        if len(decoded) > self.decoded_length:
+            events.append((DELTA, self.key, decoded[self.decoded_length:]))
+            self.decoded_length = len(decoded)
+
+    def _finish(self, value: Any, events: list) -> None:
+        self.values[self.key] = value
+        events.append((VALUE, self.key, value))
+        self.state = "key_or_end"
@@ -0,0 +1,22 @@
+import os
+import sys
+
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fake_agent  # noqa: E402,F401  Installs the offline OpenAI stand-ins before rag_agent is imported
+import rag_agent  # noqa: E402
+from context_packing import TokenCounter  # noqa: E402
+
+
+def test_packed_chunks_without_a_topic_id_are_kept(monkeypatch):
+    monkeypatch.setattr(rag_agent, "token_counter", TokenCounter("gpt-4"))
+    monkeypatch.setattr(rag_agent, "CONTEXT_MMR_LAMBDA", None)
+    legacy = Document(page_content="Title: Google L4\nContent: 45 LPA total\nTopic ID: 123", metadata={"title": "Google L4"})
+    current = Document(page_content="Amazon SDE2, 40 LPA", metadata={"topic_id": "456", "title": "Amazon SDE2"})
+
+    messages, packed_docs = rag_agent.build_prompt("Google L4 pay", [legacy, current])
+
+    assert "45 LPA total" in messages[-1].content
+    assert packed_docs == [legacy, current]
@@ -0,0 +1,67 @@
+from compensation_extractor import extract_compensation, parse_amount
+
+
+def post(content, title="Offer"):
+    return {"topic_id": 1, "title": title, "content": content, "tags": [], "url": "", "created_at": "2025-01-10"}
+
+
+def test_labels_inside_a_breakdown_are_not_fields():
+    record = extract_compensation(post(
+        "Role: SDE2\nCTC: 21LPA (20L base + 1L performance bonus)\nLocation: Bengaluru"
+    ))
+    assert record.total_compensation == 2_100_000
+    assert record.base_salary is None
+    assert record.bonus is None
+
+
+def test_total_with_bonus_in_its_note_is_not_a_bonus():
+    record = extract_compensation(post(
+        "Company: Amazon\nBase Salary: 45 LPA\nStocks: 45 lakhs\n"
+        "Total comp (Salary + Sign-on Bonus + Stock): ~68 L for the first year"
+    ))
+    assert record.total_compensation == 6_800_000
+    assert record.base_salary == 4_500_000
+    assert record.bonus is None
+
+
+def test_current_section_is_skipped_for_every_field():
+    record = extract_compensation(post(
+        "Current:\nCompany: Gojek\nRole: SSE\nLocation: Pune\nBase: 25\n\n"
+        "Offer:\nCompany: Mindbody\nRole: SDE2\nLocation: Bangalore\nBase: 57"
+    ))
+    assert (record.company, record.title, record.location) == ("Mindbody", "SDE2", "Bangalore")
+    assert record.base_salary == 5_700_000
+
+
+def test_current_value_line_skips_its_paragraph():
+    record = extract_compensation(post(
+        "YOE: 4\nCurrent CTC: 8.75LPA (8 base + 75k retention bonus)\nRole: SSE\n\n"
+        "Progress Offer\nRole: SDE2\nCTC: 21LPA"
+    ))
+    assert record.title == "SDE2"
+    assert record.total_compensation == 2_100_000
+
+
+def test_current_line_inside_the_offer_paragraph_skips_only_itself():
+    record = extract_compensation(post(
+        "Company: SentinelOne\nCurrent TC: 41LPA\nSalary: 35LPA\nJB: 7L"
+    ))
+    assert record.base_salary == 3_500_000
+    assert record.bonus == 700_000
+
+
+def test_table_cells():
+    record = extract_compensation(post("Component | Amount\nBase Salary | ₹44,00,000\nYear 1 Bonus | ₹18,00,000"))
+    assert record.base_salary == 4_400_000
+    assert record.bonus == 1_800_000
+
+
+def test_full_indian_grouped_amount_with_lpa_is_not_multiplied():
+    assert parse_amount("CTC: 47,60,000 LPA") == (4_760_000, "INR")
+    assert parse_amount("CTC: 47.6 LPA") == (4_760_000, "INR")
+
+
+def test_banglore_spelling_marks_bare_amounts_as_inr():
+    record = extract_compensation(post("Location: Banglore\nBase: 30\nTC: 42", title="Flipkart SDE2"))
+    assert record.base_salary_currency == "INR"
+    assert record.total_compensation == 4_200_000
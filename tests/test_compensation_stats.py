@@ -0,0 +1,67 @@
+from compensation_extractor import CompensationRecord, save_compensation_table
+from compensation_stats import CompensationStats, parse_stats_query
+
+
+def post(topic_id, content):
+    return {
+        "topic_id": topic_id,
+        "title": "Google | L4 | Bangalore",
+        "content": content,
+        "url": f"https://leetcode.com/discuss/post/{topic_id}",
+        "created_at": "2025-01-10T00:00:00",
+        "tags": [],
+    }
+
+
+def record(topic_id, total):
+    return CompensationRecord(
+        topic_id=str(topic_id), company="Google", title="L4", location="Bangalore",
+        total_compensation=total, total_compensation_currency="INR",
+        url=f"https://leetcode.com/discuss/post/{topic_id}", created_at="2025-01-10",
+    )
+
+
+def test_repeated_topic_id_counts_once():
+    data = [post(1, "Offer of 50 LPA at Google L4 in Bangalore"), post(2, "Google L4 Bangalore, 30 LPA total, 3 YOE"),
+            post(1, "Offer of 50 LPA at Google L4 in Bangalore")]
+    table = {"1": record(1, 5_000_000), "2": record(2, 3_000_000)}
+
+    stats = CompensationStats.from_corpus(data, table, dedup_threshold=None)
+
+    assert len(stats) == 2
+    result = stats.query(currency="INR")
+    assert result["count"] == 2
+
+
+def test_near_duplicate_posts_count_once():
+    text = "Google L4 Bangalore offer: base 40 LPA, stock 10 LPA per year, joining bonus 5 LPA, 4 years of experience"
+    data = [post(1, text), post(2, text + "."), post(3, "Amazon SDE 2 Hyderabad, 35 LPA total with 2 years of experience")]
+    table = {"1": record(1, 5_000_000), "2": record(2, 5_000_000), "3": record(3, 3_500_000)}
+
+    assert len(CompensationStats.from_corpus(data, table)) == 2
+    assert len(CompensationStats.from_corpus(data, table, dedup_threshold=None)) == 3
+
+
+def test_saved_stats_load_only_against_the_table_they_were_built_from(tmp_path):
+    data = [post(1, "Offer of 50 LPA at Google L4 in Bangalore"), post(2, "Google L4 Bangalore, 30 LPA total, 3 YOE")]
+    table = {"1": record(1, 5_000_000), "2": record(2, 3_000_000)}
+    table_path, stats_path = str(tmp_path / "table.json"), str(tmp_path / "stats.json")
+    save_compensation_table(table, table_path)
+    built = CompensationStats.from_corpus(data, table, dedup_threshold=None)
+    built.save(stats_path, table_path)
+
+    loaded = CompensationStats.load(stats_path, table_path)
+    assert loaded.query(currency="INR")["groups"] == built.query(currency="INR")["groups"]
+
+    save_compensation_table({"1": record(1, 5_000_000)}, table_path)
+    assert CompensationStats.load(stats_path, table_path) is None
+    assert CompensationStats.load(str(tmp_path / "missing.json"), table_path) is None
+
+
+def test_percentile_queries_are_aggregates_without_a_level_filter():
+    for query in ("p25 total comp at google", "p75 TC in Bangalore", "p90 total comp at google"):
+        params = parse_stats_query(query, {"google"})
+        assert params is not None, query
+        assert "level" not in params, query
+    assert parse_stats_query("p90 total comp at google", {"google"})["company"] == ["google"]
+    assert parse_stats_query("p75 TC in Bangalore", {"google"})["location"] == "bangalore"
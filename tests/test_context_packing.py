@@ -0,0 +1,43 @@
+from langchain_core.documents import Document
+
+from context_packing import TokenCounter, merge_chunks, pack_context
+
+COUNTER = TokenCounter("gpt-4")
+
+
+def chunk(topic_id, text, start=0):
+    return Document(page_content=text, metadata={"topic_id": topic_id, "title": f"Offer {topic_id}",
+                                                 "created_at": "2025-01-10", "start_index": start})
+
+
+def corpus(posts: int, words: int = 300):
+    return [chunk(str(i), f"Post {i}: " + " ".join(f"word{i}x{j}" for j in range(words))) for i in range(posts)]
+
+
+def test_context_stays_within_the_token_budget():
+    docs = corpus(12)
+    for budget in (100, 500, 1500, 4000):
+        packed = pack_context(docs, COUNTER, budget)
+        assert packed["tokens"] <= budget, budget
+        assert COUNTER.count(packed["context"]) <= budget, budget
+        assert packed["topic_ids"] == [str(i) for i in range(len(packed["topic_ids"]))]  # Rank order kept
+
+
+def test_last_passage_is_truncated_only_when_enough_budget_is_left():
+    docs = corpus(2)
+    whole = COUNTER.count(pack_context(docs[:1], COUNTER, 100_000)["context"])
+
+    packed = pack_context(docs, COUNTER, whole + 200)
+    assert packed["topic_ids"] == ["0", "1"] and packed["tokens"] <= whole + 200
+
+    packed = pack_context(docs, COUNTER, whole + 20)  # Below MIN_TRUNCATED_TOKENS for the second post
+    assert packed["topic_ids"] == ["0"]
+
+
+def test_overlapping_chunks_of_a_post_are_merged_once():
+    text = "Base 45 LPA. " * 40
+    first, second = text[:300], text[200:]
+    assert merge_chunks([chunk("1", second, 200), chunk("1", first, 0)]) == text
+    packed = pack_context([chunk("1", first, 0), chunk("2", "Amazon"), chunk("1", second, 200)], COUNTER, 10_000)
+    assert packed["topic_ids"] == ["1", "2"] and packed["posts"] == 2
+    assert packed["context"].count("Base 45 LPA.") == 40
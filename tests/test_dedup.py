@@ -0,0 +1,39 @@
+from dedup import deduplicate_posts, find_duplicate_clusters
+
+OFFER = (
+    "Company: Google. Title: SDE 2 (L4). Location: Bangalore. Years of experience: 4. "
+    "Base salary 45 LPA, stocks 60 lakhs over 4 years vesting 33/33/22/12, joining bonus 10 LPA, "
+    "relocation 2 LPA. Total first year comp about 72 LPA. Interview had 4 DSA rounds and one googlyness round. "
+    "Negotiated base from 40 to 45 with a competing Amazon offer. Should I accept or hold out for more stock?"
+)
+OTHER = (
+    "Company: Swiggy. Title: SDE 1. Location: Bangalore. Years of experience: 1. Base 24 LPA, ESOPs worth "
+    "8 lakhs over 4 years, no joining bonus. Total about 26 LPA. Moving from a service company, is this fair?"
+)
+
+
+def post(topic_id, content, created_at="2025-01-10"):
+    return {"topic_id": topic_id, "content": content, "url": f"https://leetcode.com/discuss/post/{topic_id}",
+            "created_at": created_at}
+
+
+def test_reposts_and_light_edits_are_grouped():
+    texts = [OFFER, OTHER, OFFER + " Thanks in advance!", OFFER.replace("Should I", "Should i")]
+    assert find_duplicate_clusters(texts) == [[0, 2, 3]]
+
+
+def test_distinct_posts_are_kept():
+    third = OTHER.replace("Swiggy", "Zomato").replace("24 LPA", "30 LPA").replace("8 lakhs", "20 lakhs")
+    assert find_duplicate_clusters([OFFER, OTHER, third], threshold=0.8) == []
+    assert find_duplicate_clusters(["", "", OFFER]) == []  # Empty posts are never duplicates of each other
+
+
+def test_canonical_post_keeps_the_alternate_urls():
+    posts = [post(1, OFFER, "2025-01-12"), post(2, OTHER), post(3, OFFER + " Edit: accepted it.", "2025-01-10")]
+
+    kept, report = deduplicate_posts(posts)
+
+    assert [p["topic_id"] for p in kept] == [2, 3]  # The longer repost is the more detailed one
+    assert kept[1]["duplicate_topic_ids"] == ["1"]
+    assert kept[1]["alternate_urls"] == ["https://leetcode.com/discuss/post/1"]
+    assert report["duplicates"] == 1 and report["clusters"] == 1
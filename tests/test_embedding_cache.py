@@ -0,0 +1,86 @@
+import asyncio
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from embedding_providers import CachedEmbeddings, EmbeddingCache  # noqa: E402
+from fakes import HashingEmbeddings  # noqa: E402
+
+DIMENSION = 8
+
+
+def vector_for(key: bytes) -> np.ndarray:
+    return np.frombuffer(key[:DIMENSION], dtype=np.uint8).astype(np.float32)
+
+
+def fill(cache_dir: str, worker: int, max_entries: int) -> None:
+    cache = EmbeddingCache(cache_dir, "fake:model", max_entries)
+    for batch in range(20):
+        keys = [cache.key(f"worker {worker} text {batch} {i}") for i in range(5)]
+        cache.put_many(keys, np.stack([vector_for(key) for key in keys]))
+    cache.flush()
+
+
+def test_processes_sharing_the_cache_never_mix_up_rows(tmp_path):
+    # Created up front, so the workers open the same memmapped files
+    cache = EmbeddingCache(str(tmp_path), "fake:model", 150)
+    cache.put_many([cache.key("seed")], vector_for(cache.key("seed"))[None, :])
+    cache.flush()
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=fill, args=(str(tmp_path), worker, 150)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    reopened = EmbeddingCache(str(tmp_path), "fake:model", 150)
+    assert len(reopened) == 150  # 401 distinct texts through a 150-row cache: full, no row claimed twice
+    for key, slot in reopened.slots.items():
+        assert np.array_equal(reopened.vectors[slot], vector_for(key))
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    def __init__(self, fail: bool = False):
+        super().__init__(size=DIMENSION, latency=0.05)
+        self.fail = fail
+        self.calls = 0
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("provider unavailable")
+        return await super().aembed_documents(texts)
+
+
+def cached(tmp_path, provider) -> CachedEmbeddings:
+    return CachedEmbeddings(provider, EmbeddingCache(str(tmp_path), "fake:model", 100))
+
+
+def test_concurrent_query_misses_share_one_provider_call(tmp_path):
+    provider = CountingEmbeddings()
+    embeddings = cached(tmp_path, provider)
+
+    async def scenario():
+        first = asyncio.ensure_future(embeddings.aembed_query("google l4"))
+        await asyncio.sleep(0.01)  # The first call is now in flight, the rest queue behind it
+        rest = await asyncio.gather(*(embeddings.aembed_query(f"query {i}") for i in range(5)))
+        return [await first] + rest
+
+    vectors = asyncio.run(scenario())
+    assert len(vectors) == 6 and provider.calls == 2
+    assert not embeddings._flush_tasks
+    assert len(embeddings.cache) == 6
+
+
+def test_provider_failure_reaches_the_waiting_queries(tmp_path):
+    embeddings = cached(tmp_path, CountingEmbeddings(fail=True))
+    with pytest.raises(ConnectionError):
+        asyncio.run(embeddings.aembed_query("google l4"))
+    assert not embeddings._flush_tasks
@@ -0,0 +1,71 @@
+from hybrid_retrieval import (
+    extract_level, extract_query_filters, filterable_companies, normalize_company, normalize_location, relaxations,
+    weak_filters
+)
+
+COMPANIES = {"google", "meta", "amazon"}
+
+
+def test_us_in_ordinary_text_is_not_a_location():
+    assert normalize_location("Can you tell us about Google offers?") == ""
+    assert "location" not in extract_query_filters("Can you tell us about Google offers?", COMPANIES)
+
+
+def test_short_aliases_match_in_location_context():
+    assert normalize_location("Google offers in the us") == "usa"
+    assert normalize_location("Google L5 US") == "usa"
+    assert normalize_location("Meta E5 offer from sf") == "san francisco"
+    assert normalize_location("Amazon SDE 2 Bengaluru") == "bangalore"
+
+
+def test_weak_location_is_relaxed_first():
+    query = "Google L5 offers in the US"
+    filters = extract_query_filters(query, COMPANIES)
+    assert weak_filters(query) == ["location"]
+    assert [sorted(step) for step in relaxations(filters, weak_filters(query))] == [
+        ["company", "level", "location"], ["company", "level"], ["company"], [],
+    ]
+
+
+def test_named_location_keeps_default_order():
+    query = "Amazon SDE 2 Bangalore"
+    filters = extract_query_filters(query, COMPANIES)
+    assert weak_filters(query) == []
+    assert [sorted(step) for step in relaxations(filters)] == [
+        ["company", "level", "location"], ["company", "location"], ["company"], [],
+    ]
+
+
+def test_company_keys_drop_level_and_location_suffixes():
+    assert normalize_company("Google L4") == "google"
+    assert normalize_company("Meta E4") == "meta"
+    assert normalize_company("Microsoft Bangalore") == "microsoft"
+    assert normalize_company("Google L4 Bangalore Offer") == "google"
+    assert normalize_company("Visa Inc.") == "visa"
+
+
+def test_junk_company_keys_are_rejected():
+    for name in ("Python", "Behavioral Interview", "United States", "Need Advice"):
+        assert normalize_company(name) == ""
+
+
+def test_one_off_company_keys_are_not_filterable():
+    assert filterable_companies(["google", "google", "my uber", ""]) == {"google"}
+
+
+def test_common_word_companies_need_capitals():
+    companies = COMPANIES | {"target", "even"}
+    assert "company" not in extract_query_filters("Is this offer even good for my target CTC?", companies)
+    assert extract_query_filters("Target L5 offers", companies)["company"] == ["target"]
+
+
+def test_words_and_percentiles_are_not_levels():
+    for text in ("I 3 offers, which one?", "p50 TC in Bangalore", "p90 total comp at google", "i 10 years"):
+        assert extract_level(text) == "", text
+    assert "level" not in extract_query_filters("p75 TC for Google", COMPANIES)
+
+
+def test_attached_and_ladder_levels_are_kept():
+    assert extract_level("Meta i3 offer") == "i3"
+    assert extract_level("IC 3 at Uber") == "ic3"
+    assert extract_level("Atlassian P40 offer") == "p40"
@@ -0,0 +1,122 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fake_agent  # noqa: E402,F401  Installs the offline OpenAI stand-ins before rag_agent is imported
+import rag_agent  # noqa: E402
+from index_snapshot import (  # noqa: E402
+    SnapshotCollection, check_snapshot_embedding, export_snapshot, prune_snapshots, snapshot_path,
+)
+
+ADA = "OpenAIEmbeddings:text-embedding-ada-002"
+LOCAL = "LocalONNXEmbeddings:all-MiniLM-L6-v2"
+
+
+class StubCollection:
+    """The part of a Chroma collection export_snapshot() reads"""
+
+    def __init__(self, count: int, vectors=None, metadatas=None):
+        self.ids = [f"chunk-{i}" for i in range(count)]
+        self.vectors = vectors if vectors is not None else [[float(n), 1.0] for n in range(count)]
+        self.metadatas = metadatas if metadatas is not None else [{"topic_id": i} for i in self.ids]
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def get(self, limit, offset, include):
+        page = slice(offset, offset + limit)
+        return {"ids": self.ids[page], "documents": [f"text of {i}" for i in self.ids[page]],
+                "metadatas": self.metadatas[page], "embeddings": self.vectors[page]}
+
+
+def export(tmp_path, embedding: str, count: int = 3) -> str:
+    return export_snapshot(SimpleNamespace(_collection=StubCollection(count)), str(tmp_path), "v1", embedding)
+
+
+def test_snapshot_from_the_configured_model_is_accepted(tmp_path):
+    check_snapshot_embedding(export(tmp_path, ADA), ADA)
+
+
+def test_snapshot_from_another_model_is_refused(tmp_path):
+    with pytest.raises(RuntimeError, match="embedded with OpenAIEmbeddings"):
+        check_snapshot_embedding(export(tmp_path, ADA), LOCAL)
+
+
+def test_snapshot_without_a_recorded_model_counts_as_the_default(tmp_path):
+    path = export(tmp_path, "")
+    check_snapshot_embedding(path, ADA, default=ADA)
+    with pytest.raises(RuntimeError):
+        check_snapshot_embedding(path, LOCAL, default=ADA)
+
+
+def test_empty_or_incomplete_snapshots(tmp_path):
+    check_snapshot_embedding(export(tmp_path, ADA, count=0), LOCAL)
+    with pytest.raises(RuntimeError, match="not a complete index snapshot"):
+        check_snapshot_embedding(str(tmp_path / "missing"), ADA)
+
+
+def test_reload_refuses_to_stage_a_snapshot_from_another_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_agent, "embedding", SimpleNamespace(identity=LOCAL))
+    with pytest.raises(RuntimeError, match="configured embedding model is " + LOCAL):
+        rag_agent.load_snapshot_state(export(tmp_path, ADA), [], {})
+
+
+def random_snapshot(tmp_path, count: int = 200) -> SnapshotCollection:
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(count, 8)).astype(np.float32).tolist()
+    metadatas = [{"topic_id": str(i // 4), "company": ["google", "amazon", "swiggy"][i % 3],
+                  "level": ["l4", "l5"][i % 2]} for i in range(count)]
+    collection = StubCollection(count, vectors, metadatas)
+    return SnapshotCollection(export_snapshot(SimpleNamespace(_collection=collection), str(tmp_path), "v1", ADA))
+
+
+def nearest(snapshot: SnapshotCollection, query, k: int, positions=None):
+    positions = np.arange(snapshot.count()) if positions is None else np.asarray(positions)
+    distances = ((np.asarray(snapshot.vectors)[positions] - query) ** 2).sum(axis=1)
+    return [snapshot.ids[i] for i in positions[np.argsort(distances, kind="stable")[:k]]]
+
+
+def test_query_returns_the_exact_nearest_neighbours(tmp_path):
+    snapshot = random_snapshot(tmp_path)
+    queries = np.random.default_rng(8).normal(size=(3, 8)).astype(np.float32)
+
+    result = snapshot.query(queries.tolist(), n_results=5)
+
+    for query, ids, distances in zip(queries, result["ids"], result["distances"]):
+        assert ids == nearest(snapshot, query, 5)
+        assert distances == sorted(distances)
+        expected = ((np.asarray(snapshot.vectors)[[snapshot.positions[i] for i in ids]] - query) ** 2).sum(axis=1)
+        assert np.allclose(distances, expected, atol=1e-4)
+
+
+def test_query_and_get_apply_where_filters(tmp_path):
+    snapshot = random_snapshot(tmp_path)
+    query = np.random.default_rng(9).normal(size=8).astype(np.float32)
+    where = {"$and": [{"company": {"$in": ["google", "amazon"]}}, {"$or": [{"level": "l5"}, {"topic_id": "0"}]}]}
+    allowed = [i for i, m in enumerate(snapshot.metadatas)
+               if m["company"] in ("google", "amazon") and (m["level"] == "l5" or m["topic_id"] == "0")]
+
+    result = snapshot.query([query.tolist()], n_results=4, where=where)
+    assert result["ids"][0] == nearest(snapshot, query, 4, allowed)
+    assert snapshot.get(where=where, include=[])["ids"] == [snapshot.ids[i] for i in allowed]
+    assert snapshot.get(where={"company": {"$eq": "swiggy"}}, limit=2, offset=1)["ids"] == ["chunk-5", "chunk-8"]
+    by_id = snapshot.get(ids=["chunk-3", "missing", "chunk-1"])
+    assert by_id["metadatas"] == [snapshot.metadatas[3], snapshot.metadatas[1]]
+    with pytest.raises(ValueError, match="Unsupported where operator"):
+        snapshot.get(where={"level": {"$ne": "l4"}})
+
+
+def test_prune_keeps_live_versions_and_exports_in_progress(tmp_path):
+    for version in ("v1", "v2", "v3"):
+        export_snapshot(SimpleNamespace(_collection=StubCollection(2)), str(tmp_path), version, ADA)
+    os.makedirs(str(tmp_path / "v4.tmp-123"))
+
+    prune_snapshots(str(tmp_path), ["v2", "v3"])
+
+    assert sorted(os.listdir(tmp_path)) == ["v2", "v3", "v4.tmp-123"]
+    assert SnapshotCollection(snapshot_path(str(tmp_path), "v3")).count() == 2
@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from embedding_providers import CachedEmbeddings, EmbeddingCache, embedding_identity  # noqa: E402
+from fakes import HashingEmbeddings  # noqa: E402
+from ingest import chunk_documents, build_documents, ingest, read_manifest  # noqa: E402
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    def __init__(self):
+        super().__init__(size=32)
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return super().embed_documents(texts)
+
+
+def post(topic_id, content):
+    return {"topic_id": topic_id, "title": f"Offer {topic_id}", "author": "someone", "created_at": "2025-01-10",
+            "updated_at": "2025-01-10", "content": content, "summary": "", "tags": ["compensation"],
+            "url": f"https://leetcode.com/discuss/post/{topic_id}"}
+
+
+CORPUS = [
+    post(1, "Google L4 Bangalore, base 45 LPA, stock 60 lakhs over 4 years. " * 30),
+    post(2, "Amazon SDE 2 Hyderabad, base 35 LPA, joining bonus 10 LPA."),
+    post(3, "Microsoft SDE 2 Hyderabad, base 40 LPA, stock 25k USD per year."),
+]
+
+
+def run(tmp_path, provider, data):
+    cache = EmbeddingCache(str(tmp_path / "cache"), embedding_identity(provider), 1000)
+    vectorstore = ingest(data, CachedEmbeddings(provider, cache), str(tmp_path / "index"), dedup_threshold=None)
+    vectorstore._client.close()
+    return read_manifest(str(tmp_path / "index"))
+
+
+def test_unchanged_corpus_embeds_nothing(tmp_path):
+    first = run(tmp_path, CountingEmbeddings(), CORPUS)
+    assert first["added"] == first["total"] == len(chunk_documents(build_documents(CORPUS)))
+
+    provider = CountingEmbeddings()
+    again = run(tmp_path, provider, CORPUS)
+    assert again["added"] == again["deleted"] == 0
+    assert again["version"] == first["version"]
+    assert provider.texts == []
+
+
+def test_edited_post_re_embeds_only_its_chunks(tmp_path):
+    first = run(tmp_path, CountingEmbeddings(), CORPUS)
+    edited = CORPUS[:2] + [post(3, "Microsoft SDE 2 Hyderabad, base 42 LPA after negotiation, stock 25k USD per year.")]
+
+    provider = CountingEmbeddings()
+    manifest = run(tmp_path, provider, edited)
+
+    assert manifest["added"] == 1 and manifest["deleted"] == 1
+    assert manifest["total"] == first["total"] and manifest["version"] != first["version"]
+    assert len(provider.texts) == 1 and "42 LPA" in provider.texts[0]
+    assert manifest["embedding"] == embedding_identity(provider)
@@ -0,0 +1,11 @@
+import asyncio
+
+import pytest
+
+from leetcode_scraper import LeetCodeCompensationScraper
+
+
+def test_incremental_crawl_refuses_an_order_that_is_not_newest_first():
+    scraper = LeetCodeCompensationScraper(base_url="http://127.0.0.1:9/graphql/", order_by="HOT")
+    with pytest.raises(ValueError, match="newest-first"):
+        asyncio.run(scraper.scrape_all_compensation_data(incremental=True, known={}))
@@ -0,0 +1,31 @@
+import asyncio
+import os
+import sys
+
+from langchain_core.messages import HumanMessage
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fake_agent  # noqa: E402,F401  Installs the offline OpenAI stand-ins before rag_agent is imported
+import rag_agent  # noqa: E402
+from fakes import FakeChatModel  # noqa: E402
+
+VALID = '{"off_topic": false, "summary": "Google L4 pays about 45 LPA."}'
+GPT4_ANSWER = '{"off_topic": false, "summary": "From GPT-4."}'
+
+
+def models(monkeypatch, fast_answer: str):
+    fast = FakeChatModel(answer=fast_answer, model_name="fake-fast", first_token_latency=0)
+    gpt4 = FakeChatModel(answer=GPT4_ANSWER, first_token_latency=0)
+    monkeypatch.setattr(rag_agent, "fast_llm", fast)
+    monkeypatch.setattr(rag_agent, "llm", gpt4)
+
+
+def test_valid_fast_answer_is_not_escalated(monkeypatch):
+    models(monkeypatch, VALID)
+    assert asyncio.run(rag_agent.llm_answer([HumanMessage(content="Google L4 pay?")])) == VALID
+
+
+def test_invalid_fast_answer_is_escalated_to_gpt4(monkeypatch):
+    models(monkeypatch, "Google L4 pays about 45 LPA.")
+    assert asyncio.run(rag_agent.llm_answer([HumanMessage(content="Google L4 pay?")])) == GPT4_ANSWER
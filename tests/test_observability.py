@@ -0,0 +1,64 @@
+import pytest
+
+import observability
+from observability import Counter, Gauge, Histogram, RequestContext, render_metrics
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(observability, "_registry", [])
+
+
+def test_counter_renders_help_type_and_escaped_labels():
+    counter = Counter("rag_test_total", "Test events", ["route"])
+    counter.inc(route="lookup")
+    counter.inc(2, route="lookup")
+    counter.inc(0.5, route='say "hi"\\\n')
+
+    assert render_metrics().splitlines() == [
+        "# HELP rag_test_total Test events",
+        "# TYPE rag_test_total counter",
+        'rag_test_total{route="lookup"} 3',
+        'rag_test_total{route="say \\"hi\\"\\\\\\n"} 0.5',
+    ]
+    with pytest.raises(ValueError):
+        counter.inc(stage="lookup")
+
+
+def test_histogram_buckets_are_cumulative_with_inf_sum_and_count():
+    histogram = Histogram("rag_test_seconds", "Test latency", ["stage"], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, stage="llm")
+
+    assert histogram.render().splitlines()[2:] == [
+        'rag_test_seconds_bucket{stage="llm",le="0.1"} 1',
+        'rag_test_seconds_bucket{stage="llm",le="1"} 3',
+        'rag_test_seconds_bucket{stage="llm",le="+Inf"} 4',
+        'rag_test_seconds_sum{stage="llm"} 4.05',
+        'rag_test_seconds_count{stage="llm"} 4',
+    ]
+
+
+def test_gauges_track_in_progress_and_read_functions_at_scrape_time():
+    in_progress = Gauge("rag_test_in_progress", "Test requests in progress")
+    size = [3]
+    Gauge("rag_test_cache_entries", "Test cache size", function=lambda: size[0])
+
+    with in_progress.track():
+        assert "rag_test_in_progress 1\n" in render_metrics()
+    size[0] = 7
+    text = render_metrics()
+    assert "rag_test_in_progress 0\n" in text and "rag_test_cache_entries 7\n" in text
+    assert text.endswith("\n") and text.count("# TYPE") == 2
+
+
+def test_request_context_continues_a_valid_traceparent_only():
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    context = RequestContext.from_headers({"traceparent": f"00-{trace_id}-00f067aa0ba902b7-00",
+                                           "x-request-id": "gw-123"})
+    assert (context.trace_id, context.trace_flags, context.request_id) == (trace_id, "00", "gw-123")
+    assert context.traceparent.startswith(f"00-{trace_id}-") and context.traceparent.endswith("-00")
+
+    fresh = RequestContext.from_headers({"traceparent": "garbage", "x-request-id": "bad id with spaces"})
+    assert fresh.trace_id != trace_id and len(fresh.trace_id) == 32
+    assert fresh.request_id != "bad id with spaces"
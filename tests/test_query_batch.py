@@ -0,0 +1,52 @@
+import asyncio
+import os
+import sys
+
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fake_agent  # noqa: E402,F401  Installs the offline OpenAI stand-ins before rag_agent is imported
+import rag_agent  # noqa: E402
+from semantic_cache import SemanticCache  # noqa: E402
+
+
+class StubEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    async def aembed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_batch_shares_one_embedding_and_retrieval_call(monkeypatch):
+    embeddings = StubEmbeddings()
+    retrievals, generated = [], []
+
+    async def retrieve_many(queries, query_embeddings):
+        retrievals.append(list(queries))
+        return [[] for _ in queries]
+
+    async def generate_answer(query, source_docs, query_embedding, batch_slots):
+        generated.append(query)
+        if "fail" in query:
+            raise HTTPException(status_code=503, detail="Agent is at capacity, please retry shortly.")
+        return rag_agent.AgentResponse(response=f"answer to {query}"), True
+
+    monkeypatch.setattr(rag_agent, "embedding", embeddings)
+    monkeypatch.setattr(rag_agent, "classify", lambda query: ("summarize", "needs a written answer"))
+    monkeypatch.setattr(rag_agent, "answer_without_llm", lambda route, query, source_docs=None: None)
+    monkeypatch.setattr(rag_agent, "retrieve_many", retrieve_many)
+    monkeypatch.setattr(rag_agent, "generate_answer", generate_answer)
+    monkeypatch.setattr(rag_agent, "response_cache", SemanticCache(similarity_threshold=2))
+
+    queries = ["Google L4 pay", "Amazon SDE2 pay", "google l4  PAY", "please fail"]
+    results = asyncio.run(rag_agent.answer_batch(queries))
+
+    assert embeddings.calls == [["Google L4 pay", "Amazon SDE2 pay", "please fail"]]
+    assert retrievals == [["Google L4 pay", "Amazon SDE2 pay", "please fail"]]
+    assert sorted(generated) == ["Amazon SDE2 pay", "Google L4 pay", "please fail"]
+    assert [result.query for result in results] == queries
+    assert results[0].response.response == results[2].response.response == "answer to Google L4 pay"
+    assert results[3].status_code == 503 and results[3].response is None
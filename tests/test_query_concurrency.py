@@ -0,0 +1,85 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fake_agent  # noqa: E402,F401  Installs the offline OpenAI stand-ins before rag_agent is imported
+import rag_agent  # noqa: E402
+from semantic_cache import SemanticCache  # noqa: E402
+
+
+def limits(monkeypatch, slots: int, queued: int, timeout: float) -> None:
+    monkeypatch.setattr(rag_agent, "llm_slots", asyncio.Semaphore(slots))
+    monkeypatch.setattr(rag_agent, "MAX_QUEUED_QUERIES", queued)
+    monkeypatch.setattr(rag_agent, "QUEUE_TIMEOUT_SECONDS", timeout)
+
+
+async def hold_slot(release: asyncio.Event) -> None:
+    async with rag_agent.llm_slot():
+        await release.wait()
+
+
+def test_full_queue_is_rejected_with_429(monkeypatch):
+    async def scenario():
+        limits(monkeypatch, slots=1, queued=1, timeout=5)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold_slot(release))
+        waiter = asyncio.create_task(hold_slot(release))
+        await asyncio.sleep(0.01)  # One request runs, one waits for its slot
+        with pytest.raises(HTTPException) as rejected:
+            async with rag_agent.llm_slot():
+                pass
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.status_code == 429
+    assert rag_agent.queued_queries == 0
+
+
+def test_waiting_past_the_queue_timeout_is_rejected_with_503(monkeypatch):
+    async def scenario():
+        limits(monkeypatch, slots=1, queued=4, timeout=0.05)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold_slot(release))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as timed_out:
+            async with rag_agent.llm_slot():
+                pass
+        release.set()
+        await holder
+        return timed_out.value
+
+    timed_out = asyncio.run(scenario())
+    assert timed_out.status_code == 503
+    assert "Retry-After" in timed_out.headers
+
+
+def test_identical_in_flight_queries_share_one_execution(monkeypatch):
+    calls = []
+
+    async def resolve_query(query, key):
+        calls.append(key)
+        await asyncio.sleep(0.05)
+        return rag_agent.AgentResponse(response=f"answer to {key}")
+
+    monkeypatch.setattr(rag_agent, "resolve_query", resolve_query)
+    monkeypatch.setattr(rag_agent, "response_cache", SemanticCache())
+    monkeypatch.setattr(rag_agent, "inflight_queries", {})
+
+    async def scenario():
+        return await asyncio.gather(
+            rag_agent.answer_with_llm("Google L4 pay"),
+            rag_agent.answer_with_llm("  google   l4 PAY "),
+            rag_agent.answer_with_llm("Amazon SDE2 pay"),
+        )
+
+    first, same, other = asyncio.run(scenario())
+    assert sorted(calls) == ["amazon sde2 pay", "google l4 pay"]
+    assert first is same and other.response == "answer to amazon sde2 pay"
+    assert rag_agent.inflight_queries == {}
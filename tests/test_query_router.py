@@ -0,0 +1,40 @@
+from compensation_extractor import CompensationRecord
+from query_router import classify_query, summarize_lookup, validate_answer
+
+
+def test_lookup_rows_keep_their_own_currency():
+    records = [
+        CompensationRecord(topic_id="1", company="Google", total_compensation=250_000, total_compensation_currency="USD"),
+        CompensationRecord(topic_id="2", company="Google", total_compensation=4_500_000, total_compensation_currency="INR"),
+        CompensationRecord(topic_id="3", company="Google", base_salary=180_000),
+    ]
+    summary = summarize_lookup({"company": ["google"]}, records)
+    assert "total $250K" in summary
+    assert "total ₹45.0 L" in summary
+    assert "base 180K" in summary and "₹1.8 L" not in summary
+
+
+COMPANIES = {"google", "amazon", "doordash", "flipkart", "walmart"}
+
+
+def test_questions_are_routed_by_what_they_ask():
+    cases = {
+        "What's the capital of France?": "off_topic",
+        "Write a poem about the ocean": "off_topic",
+        "median TC for SDE2 in Bangalore": "stats",
+        "p75 total comp at Google": "stats",
+        "show me Doordash E4 India posts": "lookup",
+        "Flipkart SDE 2 posts": "lookup",
+        "Show me the bonus amounts for SDE II at Google posted after February 2024.": "summarize",
+        "Should I accept the Amazon offer or wait for Flipkart?": "summarize",
+    }
+    for query, route in cases.items():
+        assert classify_query(query, COMPANIES)[0] == route, query
+
+
+def test_answers_that_miss_the_schema_are_flagged_for_escalation():
+    assert validate_answer('{"off_topic": false, "summary": "Google L4 pays ~45 LPA."}') is None
+    assert validate_answer("Google L4 pays about 45 LPA.") == "no_json"
+    assert validate_answer('{"off_topic": false, "summary": "cut off') == "no_json"
+    assert validate_answer('{"off_topic": "no", "summary": "x"}') == "bad_off_topic"
+    assert validate_answer('{"off_topic": false, "summary": "  "}') == "bad_summary"
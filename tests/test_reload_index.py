@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fake_agent  # noqa: E402,F401  Installs the offline OpenAI stand-ins before rag_agent is imported
+import rag_agent  # noqa: E402
+
+
+class StubVectorStore:
+    pass
+
+
+class StubStats:
+    def save(self, path, table_path):
+        pass
+
+
+def state(version: str) -> rag_agent.IndexState:
+    return rag_agent.IndexState(version, StubVectorStore(), None, {}, StubStats())
+
+
+def stub_reload(monkeypatch, tmp_path, new_version: str) -> list:
+    """Stand-ins for the corpus, staging and disk steps of reload_index(); returns the log of disk steps"""
+    steps = []
+    snapshot = str(tmp_path / new_version)
+    monkeypatch.setattr(rag_agent, "load_corpus", lambda: [])
+    monkeypatch.setattr(rag_agent, "stage_index", lambda data, embedding: (snapshot, str(tmp_path / "staging")))
+    monkeypatch.setattr(rag_agent, "build_compensation_table", lambda data: {})
+    monkeypatch.setattr(rag_agent, "load_snapshot_state", lambda path, data, table: state(os.path.basename(path)))
+    monkeypatch.setattr(rag_agent, "promote_index", lambda staging, table: steps.append("promote"))
+    monkeypatch.setattr(rag_agent, "prune_snapshots", lambda directory, keep: steps.append(("prune", keep)))
+    return steps
+
+
+def test_index_is_not_promoted_while_a_pinned_request_runs_past_the_drain_timeout(monkeypatch, tmp_path):
+    steps = stub_reload(monkeypatch, tmp_path, "v2")
+    monkeypatch.setattr(rag_agent, "index", state("v1"))
+    monkeypatch.setattr(rag_agent, "retired_indexes", [])
+    monkeypatch.setattr(rag_agent, "RELOAD_DRAIN_TIMEOUT_SECONDS", 0.1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def pinned_request():
+            with rag_agent.pin_index() as pinned:
+                await release.wait()
+                return pinned.version
+
+        request = asyncio.create_task(pinned_request())
+        await asyncio.sleep(0)
+        reload = asyncio.create_task(rag_agent.reload_index())
+        await asyncio.sleep(0.4)  # Several drain timeouts
+        assert rag_agent.index.version == "v2"
+        assert [retired.version for retired in rag_agent.retired_indexes] == ["v1"]
+        assert steps == []
+        release.set()
+        return await request, await reload
+
+    served_by, result = asyncio.run(scenario())
+    assert served_by == "v1"
+    assert result["outcome"] == "swapped"
+    assert steps == ["promote", ("prune", ["v2"])]
+    assert rag_agent.retired_indexes == []
+
+
+def test_unchanged_reload_removes_its_unused_snapshot(monkeypatch, tmp_path):
+    steps = stub_reload(monkeypatch, tmp_path, "v1")
+    monkeypatch.setattr(rag_agent, "index", state("v1"))
+
+    result = asyncio.run(rag_agent.reload_index())
+
+    assert result["outcome"] == "unchanged"
+    assert steps == [("prune", [])]
@@ -0,0 +1,71 @@
+import math
+
+from pydantic import BaseModel
+
+import semantic_cache
+from semantic_cache import SemanticCache
+
+
+class Answer(BaseModel):
+    summary: str
+
+
+def unit(angle_degrees: float) -> list:
+    """A 2-d unit vector whose cosine similarity with [1, 0] is cos(angle)"""
+    angle = math.radians(angle_degrees)
+    return [math.cos(angle), math.sin(angle)]
+
+
+def test_near_hit_at_the_threshold_and_miss_below_it():
+    cache = SemanticCache(similarity_threshold=0.95)
+    cache.put("google l4 pay", Answer(summary="L4 answer"), unit(0))
+
+    assert cache.get_similar(unit(17)).summary == "L4 answer"  # cos 17° ≈ 0.956
+    assert cache.get_similar(unit(20)) is None  # cos 20° ≈ 0.940
+    assert cache.stats["semantic_hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now[0])
+    cache = SemanticCache(ttl_seconds=60)
+    cache.put("google l4 pay", Answer(summary="L4 answer"), unit(0))
+
+    now[0] += 59
+    assert cache.get_exact("google l4 pay").summary == "L4 answer"
+    now[0] += 2
+    assert cache.get_exact("google l4 pay") is None
+    assert cache.get_similar(unit(0)) is None
+    assert len(cache) == 0
+
+
+def test_index_version_change_invalidates_every_entry():
+    cache = SemanticCache()
+    cache.set_version("v1")
+    cache.put("google l4 pay", Answer(summary="L4 answer"), unit(0))
+
+    cache.set_version("v1")
+    assert cache.get_exact("google l4 pay") is not None
+
+    cache.set_version("v2")
+    assert cache.get_exact("google l4 pay") is None
+    assert cache.get_similar(unit(0)) is None
+    assert cache.stats["invalidations"] == 1
+
+
+def test_saved_cache_is_ignored_for_another_index_version(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = SemanticCache()
+    cache.set_version("v1")
+    cache.put("google l4 pay", Answer(summary="L4 answer"), unit(0))
+    cache.save(path)
+
+    same = SemanticCache()
+    same.set_version("v1")
+    same.load(path, Answer)
+    assert same.get_similar(unit(5)).summary == "L4 answer"
+
+    other = SemanticCache()
+    other.set_version("v2")
+    other.load(path, Answer)
+    assert len(other) == 0
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from stream_parser import DELTA, ITEM, VALUE, StreamingJSONParser
+
+ANSWER = {
+    "off_topic": False,
+    "summary": 'Google L4 "total comp" is ~45 LPA \\ café ☕\nsee posts',
+    "sources": [{"id": "1", "note": "a, b"}, {"id": "2"}],
+}
+
+
+def feed_in_chunks(text: str, size: int):
+    parser = StreamingJSONParser()
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return parser, events
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_any_chunking_yields_the_same_values_and_text(size):
+    text = "Here is the answer: " + json.dumps(ANSWER, ensure_ascii=True)
+    parser, events = feed_in_chunks(text, size)
+
+    assert parser.done
+    assert parser.values == ANSWER
+    assert "".join(value for kind, key, value in events if kind == DELTA and key == "summary") == ANSWER["summary"]
+    assert [value for kind, key, value in events if kind == ITEM] == ANSWER["sources"]
+    assert [key for kind, key, _ in events if kind == VALUE] == ["off_topic", "summary", "sources"]
+
+
+def test_escaped_quote_split_across_chunks_does_not_end_the_string():
+    parser = StreamingJSONParser()
+    events = parser.feed('{"summary": "He said \\')
+    events += parser.feed('"hi\\')
+    events += parser.feed('" and left"}')
+
+    assert parser.values == {"summary": 'He said "hi" and left'}
+    assert "".join(value for kind, _, value in events if kind == DELTA) == 'He said "hi" and left'
+
+
+def test_unicode_escape_split_across_chunks_is_decoded_once_complete():
+    parser = StreamingJSONParser()
+    first = parser.feed('{"summary": "caf\\u00')
+    assert [value for kind, _, value in first if kind == DELTA] == ["caf"]
+    rest = parser.feed('e9"}')
+    assert [value for kind, _, value in rest if kind == DELTA] == ["é"]
+
+
+def test_invalid_value_raises():
+    parser = StreamingJSONParser()
+    with pytest.raises(ValueError):
+        parser.feed('{"off_topic": maybe}')
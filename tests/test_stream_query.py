@@ -0,0 +1,55 @@
+import asyncio
+import json
+import os
+import sys
+
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fake_agent  # noqa: E402,F401  Installs the offline OpenAI stand-ins before rag_agent is imported
+import rag_agent  # noqa: E402
+from fakes import FakeChatModel, HashingEmbeddings  # noqa: E402
+
+
+class FailingChatModel(FakeChatModel):
+    """Streams the start of an answer, then loses the connection to the provider"""
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        yield ChatGenerationChunk(message=AIMessageChunk(content='{"off_topic": false, "summary": "Google pays'))
+        raise ConnectionError("Connection reset by peer")
+
+
+def parse_events(stream: str) -> list:
+    events = []
+    for block in stream.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+async def collect(query: str) -> str:
+    return "".join([event async for event in rag_agent.stream_query(query)])
+
+
+def test_llm_failing_mid_stream_ends_with_an_error_event(monkeypatch):
+    async def route_query(query):
+        return "summarize", None
+
+    async def retrieve_many(queries, query_embeddings):
+        return [[] for _ in queries]
+
+    monkeypatch.setattr(rag_agent, "llm", FailingChatModel(first_token_latency=0))
+    monkeypatch.setattr(rag_agent, "fast_llm", None)
+    monkeypatch.setattr(rag_agent, "embedding", HashingEmbeddings())
+    monkeypatch.setattr(rag_agent, "route_query", route_query)
+    monkeypatch.setattr(rag_agent, "retrieve_many", retrieve_many)
+    monkeypatch.setattr(rag_agent, "build_prompt", lambda query, docs, embedding: ([HumanMessage(query)], docs))
+    monkeypatch.setattr(rag_agent, "build_compensation_cards", lambda docs: [])
+
+    events = parse_events(asyncio.run(collect("How much does Google pay an L4 in Bangalore?")))
+
+    assert events[0] == ("token", {"text": "Google pays"})
+    assert events[-1] == ("error", {"status_code": 500, "detail": "Internal server error."})
+    assert "sources" not in [event for event, _ in events]